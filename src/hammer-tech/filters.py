@@ -13,8 +13,7 @@ from typing import TYPE_CHECKING, Any, Callable, List
 from library_filter import LibraryFilter
 
 if TYPE_CHECKING:
-    # grumble grumble, we need a better Library class generator
-    from library_filter import Library
+    from hammer_tech import Library
 
 
 class LibraryFilterHolder:
@@ -6,15 +6,16 @@
 #
 #  See LICENSE for licence details.
 
+import fnmatch
 import json
 import os
+import re
 import subprocess
 from abc import ABCMeta, abstractmethod
-from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple, Dict
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple, Dict
 from decimal import Decimal
 
 import hammer_config
-import python_jsonschema_objects  # type: ignore
 
 from hammer_config import load_yaml
 from hammer_logging import HammerVLSILoggingContext
@@ -24,21 +25,14 @@ from hammer_utils import (LEFUtils, add_lists, deeplist, get_or_else,
 
 from library_filter import LibraryFilter
 from filters import LibraryFilterHolder
-from stackup import RoutingDirection, WidthSpacingTuple, Metal, Stackup
+from stackup import RoutingDirection, WidthSpacingTuple, Metal, MetalGrid, Stackup
 from specialcells import CellType, SpecialCell
+from schema_records import SchemaRecord, build_record_classes
 
 # Holds the list of pre-implemented filters.
 # Access it like hammer_tech.filters.lef_filter
 filters = LibraryFilterHolder()
 
-builder = python_jsonschema_objects.ObjectBuilder(json.loads(open(os.path.dirname(__file__) + "/schema.json").read()))
-ns = builder.build_classes()
-
-# Pull definitions from the autoconstructed classes.
-TechJSON = ns.Techjson
-# Semiconductor IP library
-Library = ns.Library
-
 
 class LibraryPrefix(metaclass=ABCMeta):
     """
@@ -122,49 +116,56 @@ class PathPrefix(LibraryPrefix):
         return os.path.join(self.path, rest_of_path)
 
 
-def _add_extra_prefixes() -> None:
-    # Add extra_prefixes to Library.
-    # Monkey-patch over the autogenerated classes for now.
-    # See https://github.com/ucb-bar/hammer/issues/165
-    # https://stackoverflow.com/a/36158137
+class _LibraryRecord(SchemaRecord):
+    """
+    Base class of the generated Library record which adds extra_prefixes.
+    extra_prefixes are not part of the tech JSON and are therefore not serialized.
+    """
+    __slots__ = ('_extra_prefixes',)
 
-    # Define getters and setters
-    def get_extra_prefixes(self: Library) -> List[LibraryPrefix]:
-        internal_list = getattr(self, "__donttouch_extra_prefixes", [])
-        assert isinstance(internal_list, list)
-        return deeplist(internal_list)
+    @property
+    def extra_prefixes(self) -> List[LibraryPrefix]:
+        return deeplist(getattr(self, "_extra_prefixes", []))
 
-    def set_extra_prefixes(self: Library, value: List[LibraryPrefix]) -> None:
+    @extra_prefixes.setter
+    def extra_prefixes(self, value: List[LibraryPrefix]) -> None:
         assert isinstance(value, list)
-        setattr(self, "__donttouch_extra_prefixes", deeplist(value))
-
-    # Set them in the class
-    setattr(Library, 'extra_prefixes', property(get_extra_prefixes, set_extra_prefixes))
-
-    # Autogenerated classes override __setattr__ which prevents the setter above
-    # from working, so we need to special case setattr...
-    # Yes, this is incredibly ugly, and will be replaced when autogenerated classes are gone.
-
-    # Keep a reference to the old __setattr__ (which we will be wrapping)
-    __old_setattr = Library.__setattr__
-
-    # Define a new __setattr__ that calls our setter if users try to set our new property.
-    def __new_setattr(self: Library, name: str, value: Any) -> None:
-        if name == "extra_prefixes":
-            set_extra_prefixes(self, value)
-        else:
-            __old_setattr(self, name, value)
-
-    setattr(Library, "__setattr__", __new_setattr)
-
+        object.__setattr__(self, "_extra_prefixes", deeplist(value))
+
+
+# Generate native record classes from the tech JSON schema.
+with open(os.path.join(os.path.dirname(__file__), "schema.json")) as schema_file:
+    _schema_records = build_record_classes(json.load(schema_file), bases={"Library": _LibraryRecord})
+
+if TYPE_CHECKING:
+    # The record classes are generated at import time, so give the type checker
+    # stand-ins whose schema fields are typed as Any.
+    class TechJSON(SchemaRecord):
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]) -> "TechJSON": ...
+        @classmethod
+        def from_json(cls, json_str: str) -> "TechJSON": ...
+        def __getattr__(self, name: str) -> Any: ...
+        def copy(self) -> "TechJSON": ...
+        def _replace(self, **changes: Any) -> "TechJSON": ...
+
+    class Library(_LibraryRecord):
+        @classmethod
+        def from_dict(cls, d: Dict[str, Any]) -> "Library": ...
+        @classmethod
+        def from_json(cls, json_str: str) -> "Library": ...
+        def __getattr__(self, name: str) -> Any: ...
+        def copy(self) -> "Library": ...
+        def _replace(self, **changes: Any) -> "Library": ...
+else:
+    TechJSON = _schema_records["TechJSON"]
+    # Semiconductor IP library
+    Library = _schema_records["Library"]
 
-_add_extra_prefixes()
 
-
-# TODO(edwardw): deprecate these functions once Library is no longer auto-generated.
 def copy_library(lib: Library) -> Library:
-    """Perform a deep copy of a Library."""
-    return Library.from_json(lib.serialize())
+    """Copy a Library. Libraries are immutable, so this is cheap."""
+    return lib.copy()
 
 
 def library_from_json(json: str) -> Library:
@@ -265,7 +266,99 @@ class MacroSize(NamedTuple('MacroSize', [
         )
 
 
+class LibraryCellIndex:
+    """
+    Index of the cells provided by a set of IP libraries.
+    Used to resolve cell name patterns (e.g. dont_use entries) against the cells
+    that actually exist instead of deferring the lookup to the CAD tool.
+    """
+
+    def __init__(self, cells: Iterable[Tuple[str, str]]) -> None:
+        """
+        Create a new index.
+
+        :param cells: Iterable of (library name, cell name) pairs.
+        """
+        self._libraries = {}  # type: Dict[str, List[str]]
+        self._cell_names = []  # type: List[str]
+        self._cell_set = set()  # type: Set[str]
+        for library, cell in cells:
+            self._libraries.setdefault(library, []).append(cell)
+            if cell not in self._cell_set:
+                self._cell_set.add(cell)
+                self._cell_names.append(cell)
+
+    @staticmethod
+    def from_macro_sizes(sizes: Iterable[MacroSize]) -> "LibraryCellIndex":
+        return LibraryCellIndex(map(lambda s: (s.library, s.name), sizes))
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self._cell_names) == 0
+
+    @property
+    def cells(self) -> List[str]:
+        """
+        Get all unique cell names in the index, in the order they were first seen.
+        """
+        return list(self._cell_names)
+
+    def match(self, pattern: str) -> List[str]:
+        """
+        Get the cells matching the given pattern.
+        Patterns are either "CELL" or "LIB/CELL" where both parts may contain shell-style
+        wildcards (e.g. "*/DLY*"). Matching is case-sensitive.
+
+        :param pattern: Cell pattern to resolve.
+        :return: List of matching cell names, in index order. Cells matched by a pattern which names
+                 libraries (i.e. other than "*/") are qualified as "LIB/CELL", since the cell may also
+                 exist in other libraries.
+        """
+        if "/" in pattern:
+            lib_pattern, cell_pattern = pattern.split("/", 1)
+        else:
+            lib_pattern, cell_pattern = "*", pattern
+
+        if lib_pattern == "*":
+            if not any(c in cell_pattern for c in "*?["):
+                # Plain cell name - no need to scan every cell.
+                return [cell_pattern] if cell_pattern in self._cell_set else []
+            candidates = self._cell_names  # type: List[str]
+        else:
+            lib_regex = re.compile(fnmatch.translate(lib_pattern))
+            cell_regex = re.compile(fnmatch.translate(cell_pattern))
+            qualified = []  # type: List[str]
+            for library, library_cells in self._libraries.items():
+                if lib_regex.match(library):
+                    qualified.extend(library + "/" + cell for cell in library_cells if cell_regex.match(cell))
+            in_place_unique(qualified)
+            return qualified
+
+        cell_regex = re.compile(fnmatch.translate(cell_pattern))
+        return [cell for cell in candidates if cell_regex.match(cell)]
+
+    def expand(self, patterns: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Resolve a list of cell patterns against the index.
+
+        :param patterns: Cell patterns to resolve (see match()).
+        :return: Tuple of (unique matching cell names as returned by match(), patterns which matched nothing).
+        """
+        matched = []  # type: List[str]
+        unmatched = []  # type: List[str]
+        for pattern in patterns:
+            cells = self.match(pattern)
+            if len(cells) == 0:
+                unmatched.append(pattern)
+            matched.extend(cells)
+        in_place_unique(matched)
+        return matched, unmatched
+
+
 class HammerTechnology:
+    # Library cell index and the database state (id, version) it was built from.
+    _lib_cell_index_cache = None  # type: Optional[Tuple[Tuple[int, int], LibraryCellIndex]]
+
     # Properties.
     @property
     def cache_dir(self) -> str:
@@ -401,9 +494,7 @@ class HammerTechnology:
         if dont_use_list_raw is None:
             return None
         else:
-            # Work around the weird objects implemented by the jsonschema generator.
-            dont_use_list = list(map(lambda x: str(x), list(dont_use_list_raw)))
-            return dont_use_list
+            return list(dont_use_list_raw)
 
     @property
     def additional_drc_text(self) -> str:
@@ -452,8 +543,7 @@ class HammerTechnology:
         if not isinstance(lib, dict):
             raise TypeError("lib must be a dict")
 
-        # Convert the dict to JSON...
-        return Library.from_json(json.dumps(lib))
+        return Library.from_dict(lib)
 
     @property
     def tech_defined_libraries(self) -> List[Library]:
@@ -487,7 +577,7 @@ class HammerTechnology:
         """
 
         # Enhance lef_filter to also extract the name of the library.
-        def extraction_func(lib: "Library", paths: List[str]) -> List[str]:
+        def extraction_func(lib: Library, paths: List[str]) -> List[str]:
             assert len(paths) == 1, "paths_func above returns only one item"
             # For type checker
             lib_name = lib.name  # type: ignore
@@ -535,6 +625,27 @@ class HammerTechnology:
         """
         return self.get_extra_macro_sizes() + self.get_tech_macro_sizes()
 
+    def get_lib_cell_index(self) -> LibraryCellIndex:
+        """
+        Build an index of the cells available in the selected libraries, using the
+        macros found in their LEF files as well as any extra macro sizes.
+        If some LEF files cannot be read, an empty index is returned.
+        The index is reused until the settings database changes.
+        :return: Cell index of the selected libraries.
+        """
+        state = (id(self._database), self._database.version)
+        cached = self._lib_cell_index_cache
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        try:
+            sizes = self.get_macro_sizes()
+        except ValueError as e:
+            self.logger.warning("Unable to build library cell index: {e}".format(e=e))
+            sizes = []
+        index = LibraryCellIndex.from_macro_sizes(sizes)
+        self._lib_cell_index_cache = (state, index)
+        return index
+
     def prepend_dir_path(self, path: str, lib: Optional[Library] = None) -> str:
         """
         Prepend the appropriate path (either from tarballs or installs) to the given library item.
@@ -658,7 +769,8 @@ class HammerTechnology:
                                pre_filts: List[Callable[[Library], bool]],
                                output_func: Callable[[str, LibraryFilter], List[str]],
                                must_exist: bool = True,
-                               uniquify: bool = True) -> List[str]:
+                               uniquify: bool = True,
+                               libraries: Optional[List[Library]] = None) -> List[str]:
         """
         Process the given library filter and return a list of items from that library filter with any extra
         post-processing.
@@ -674,21 +786,25 @@ class HammerTechnology:
                             which generated it.
         :param must_exist: Must each library item actually exist? Default: True (yes, they must exist)
         :param uniquify: Must uniqify the list of output files. Default: True
+        :param libraries: Libraries to consider. Default: all available libraries (see get_available_libraries)
         :return: Resultant items from the filter and post-processed. (e.g. --timing foo.db --timing bar.db)
         """
 
         # First, filter the list of available libraries with pre_filts and the library itself.
         lib_filters = pre_filts + get_or_else(optional_map(filt.filter_func, lambda x: [x]), [])
 
+        if libraries is None:
+            libraries = self.get_available_libraries()
+
         filtered_libs = list(reduce_named(
             sequence=lib_filters,
-            initial=self.get_available_libraries(),
+            initial=libraries,
             function=lambda libs, func: filter(func, libs)
         ))  # type: List[Library]
 
         # Next, sort the list of libraries if a sort function exists.
         if filt.sort_func is not None:
-            filtered_libs = sorted(filtered_libs, key=filt.sort_func)
+            filtered_libs = sorted(filtered_libs, key=filt.sort_func)  # type: ignore
 
         # Next, extract paths and prepend them to get the real paths.
         def get_and_prepend_path(lib: Library) -> Tuple[Library, List[str]]:
@@ -714,7 +830,7 @@ class HammerTechnology:
 
         # If no extraction function was specified, use the identity extraction
         # function.
-        def identity_extraction_func(lib: "Library", paths: List[str]) -> List[str]:
+        def identity_extraction_func(lib: Library, paths: List[str]) -> List[str]:
             return paths
         extraction_func = get_or_else(filt.extraction_func, identity_extraction_func)
 
@@ -750,7 +866,8 @@ class HammerTechnology:
 
     def read_libs(self, library_types: Iterable[LibraryFilter], output_func: Callable[[str, LibraryFilter], List[str]],
                   extra_pre_filters: Optional[List[Callable[[Library], bool]]] = None,
-                  must_exist: bool = True) -> List[str]:
+                  must_exist: bool = True,
+                  libraries: Optional[List[Library]] = None) -> List[str]:
         """
         Read the given libraries and return a list of strings according to some output format.
 
@@ -759,6 +876,7 @@ class HammerTechnology:
                             which generated it.
         :param extra_pre_filters: List of additional filter functions to use to filter the list of libraries.
         :param must_exist: Must each library item actually exist? Default: True (yes, they must exist)
+        :param libraries: Libraries to consider. Default: all available libraries (see get_available_libraries)
         :return: List of filtered libraries processed according output_func.
         """
 
@@ -767,10 +885,15 @@ class HammerTechnology:
             assert isinstance(extra_pre_filters, List)
             pre_filts += extra_pre_filters
 
+        if libraries is None:
+            # Only gather the available libraries once for all filters.
+            libraries = self.get_available_libraries()
+
         return reduce_list_str(
             add_lists,
             map(
-                lambda lib: self.process_library_filter(pre_filts=pre_filts, filt=lib, output_func=output_func, must_exist=must_exist),
+                lambda lib: self.process_library_filter(pre_filts=pre_filts, filt=lib, output_func=output_func,
+                                                        must_exist=must_exist, libraries=libraries),
                 library_types
             )
         )
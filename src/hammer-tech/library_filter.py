@@ -12,20 +12,7 @@ from typing import TYPE_CHECKING, Any, Callable, List, NamedTuple, Optional, Tup
 from hammer_utils import get_or_else, assert_function_type
 
 if TYPE_CHECKING:
-    # grumble grumble, we need a better Library class generator
-    # Here is a stub class for type checking purposes only
-    from hammer_tech import LibraryPrefix
-    class Library:
-        @property
-        def extra_prefixes(self) -> List[LibraryPrefix]: pass
-        @property
-        def ecsm_liberty_file(self) -> Optional[str]: pass
-        @property
-        def gds_file(self) -> Optional[str]: pass
-        @property
-        def spice_file(self) -> Optional[str]: pass
-        @property
-        def verilog_synth(self) -> Optional[str]: pass
+    from hammer_tech import Library
 
 PathsFunctionType = Callable[["Library"], List[str]]
 
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  schema_records.py
+#  Native, slotted record classes generated from a JSON schema (e.g. the
+#  technology schema in schema.json).
+#
+#  See LICENSE for licence details.
+
+import copy
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+
+__all__ = ['FrozenList', 'SchemaField', 'SchemaRecord', 'build_record_classes']
+
+
+class FrozenList(tuple):
+    """
+    Immutable list used to hold array values inside records.
+    Compares equal to a list with the same contents.
+    """
+    __slots__ = ()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, list):
+            return list(self) == other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self.__eq__(other)
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+# Description of a single property of a record.
+# name: Python attribute name (e.g. "lef_file")
+# key: JSON key (e.g. "lef file")
+# type: JSON schema type of the property, or None if unspecified
+# record: Record class for "object" properties
+# items: Field describing the items of "array" properties
+SchemaField = NamedTuple('SchemaField', [
+    ('name', str),
+    ('key', str),
+    ('type', Optional[str]),
+    ('record', Optional[type]),
+    ('items', Optional[Any])
+])
+
+
+def _convert(field: SchemaField, value: Any, path: str) -> Any:
+    """
+    Check the given value against the field and convert it into its record form.
+
+    :param field: Field to check against.
+    :param value: Value to check (None means unset).
+    :param path: Location of the value in the source document, for error messages.
+    :return: Converted value.
+    """
+    if value is None:
+        return None
+
+    def error(expected: str) -> ValueError:
+        return ValueError("{path}: expected {expected}, got {value!r}".format(
+            path=path, expected=expected, value=value))
+
+    field_type = field.type
+    if field_type == "string":
+        if not isinstance(value, str):
+            raise error("a string")
+        return value
+    elif field_type == "number":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise error("a number")
+        return value
+    elif field_type == "integer":
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise error("an integer")
+        return value
+    elif field_type == "boolean":
+        if not isinstance(value, bool):
+            raise error("a boolean")
+        return value
+    elif field_type == "array":
+        if isinstance(value, FrozenList):
+            # Already converted.
+            return value
+        if not isinstance(value, (list, tuple)):
+            raise error("an array")
+        items = field.items  # type: Optional[SchemaField]
+        if items is None:
+            return FrozenList(value)
+        return FrozenList(_convert(items, item, "{path}[{i}]".format(path=path, i=i)) for i, item in enumerate(value))
+    elif field_type == "object":
+        record = field.record  # type: Optional[Type[SchemaRecord]]
+        if record is None:
+            if not isinstance(value, dict):
+                raise error("an object")
+            return value
+        if isinstance(value, record):
+            return value
+        if not isinstance(value, dict):
+            raise error("an object")
+        return record._from_dict(value, path)
+    else:
+        return value
+
+
+class SchemaRecord:
+    """
+    Base class for records generated by build_record_classes().
+
+    Records are immutable: schema properties are exposed as attributes (spaces in JSON keys are
+    replaced by underscores, e.g. "lef file" -> lef_file) and unset properties are None.
+    Use _replace() to derive a modified record. Properties not described by the schema are
+    kept as-is so that to_dict()/serialize() round-trip the original JSON.
+    """
+    __slots__ = ('_extra',)
+
+    # Filled in by build_record_classes().
+    _fields = ()  # type: Tuple[SchemaField, ...]
+    _fields_by_key = {}  # type: Dict[str, SchemaField]
+    _fields_by_name = {}  # type: Dict[str, SchemaField]
+    _all_slots = ()  # type: Tuple[str, ...]
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Create a new record from attribute names, e.g. Library(name="foo", lef_file="foo.lef").
+        Values are checked against the schema.
+        """
+        unknown = [name for name in kwargs if name not in self._fields_by_name]
+        if len(unknown) > 0:
+            raise TypeError("Unknown properties for {cls}: {names}".format(
+                cls=type(self).__name__, names=", ".join(sorted(unknown))))
+        for field in self._fields:
+            path = "{cls}.{name}".format(cls=type(self).__name__, name=field.name)
+            object.__setattr__(self, field.name, _convert(field, kwargs.get(field.name), path))
+        object.__setattr__(self, "_extra", {})
+
+    @classmethod
+    def _from_dict(cls, d: Dict[str, Any], path: str) -> "SchemaRecord":
+        record = cls.__new__(cls)
+        extra = {}  # type: Dict[str, Any]
+        values = {}  # type: Dict[str, Any]
+        for key, value in d.items():
+            # Accept both the JSON key and the attribute name (e.g. "lef file" and "lef_file").
+            field = cls._fields_by_key.get(key, cls._fields_by_name.get(key))
+            if field is None:
+                extra[key] = value
+            else:
+                values[field.name] = _convert(field, value, "{path}.{key}".format(path=path, key=key))
+        for field in cls._fields:
+            object.__setattr__(record, field.name, values.get(field.name))
+        object.__setattr__(record, "_extra", extra)
+        return record
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "SchemaRecord":
+        """
+        Create a new record from a JSON-style dictionary, validating it against the schema.
+
+        :param d: Dictionary using the JSON keys of the schema.
+        :return: Validated record.
+        """
+        if not isinstance(d, dict):
+            raise ValueError("{cls}: expected an object, got {d!r}".format(cls=cls.__name__, d=d))
+        return cls._from_dict(d, cls.__name__)
+
+    @classmethod
+    def from_json(cls, json_str: str) -> "SchemaRecord":
+        """
+        Create a new record from a JSON string, validating it against the schema.
+        """
+        return cls.from_dict(json.loads(json_str))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Export this record as a JSON-style dictionary. Unset properties are omitted.
+        """
+
+        def export(value: Any) -> Any:
+            if isinstance(value, SchemaRecord):
+                return value.to_dict()
+            elif isinstance(value, FrozenList):
+                return list(map(export, value))
+            else:
+                return value
+
+        output = {}  # type: Dict[str, Any]
+        for field in self._fields:
+            value = getattr(self, field.name)
+            if value is not None:
+                output[field.key] = export(value)
+        output.update(copy.deepcopy(self._extra))
+        return output
+
+    def serialize(self) -> str:
+        """
+        Export this record as a JSON string.
+        """
+        return json.dumps(self.to_dict())
+
+    def copy(self) -> "SchemaRecord":
+        """
+        Make a copy of this record. Since records are immutable, nested values are shared.
+        """
+        new = self.__class__.__new__(self.__class__)
+        for slot in self._all_slots:
+            if hasattr(self, slot):
+                object.__setattr__(new, slot, getattr(self, slot))
+        return new
+
+    def _replace(self, **changes: Any) -> "SchemaRecord":
+        """
+        Make a copy of this record with the given properties (by attribute name) changed.
+        """
+        new = self.copy()
+        for name, value in changes.items():
+            field = self._fields_by_name.get(name)
+            if field is None:
+                raise TypeError("Unknown property for {cls}: {name}".format(cls=type(self).__name__, name=name))
+            path = "{cls}.{name}".format(cls=type(self).__name__, name=name)
+            object.__setattr__(new, name, _convert(field, value, path))
+        return new
+
+    def __copy__(self) -> "SchemaRecord":
+        return self.copy()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "SchemaRecord":
+        return self.copy()
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return self.__class__.from_dict, (self.to_dict(),)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self._fields_by_name or name == "_extra":
+            raise AttributeError("{cls} is immutable; use _replace() to change {name}".format(
+                cls=type(self).__name__, name=name))
+        object.__setattr__(self, name, value)
+
+    def __getitem__(self, key: str) -> Any:
+        field = self._fields_by_key.get(key, self._fields_by_name.get(key))
+        if field is not None:
+            return getattr(self, field.name)
+        return self._extra[key]
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            return self[key] is not None
+        except KeyError:
+            return False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __eq__(self, other: Any) -> bool:
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, f.name) == getattr(other, f.name) for f in self._fields) and \
+               self._extra == other._extra
+
+    def __ne__(self, other: Any) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        args = ["{name}={value!r}".format(name=f.name, value=getattr(self, f.name))
+                for f in self._fields if getattr(self, f.name) is not None]
+        return "{cls}({args})".format(cls=type(self).__name__, args=", ".join(args))
+
+
+def build_record_classes(schema: Dict[str, Any],
+                         bases: Optional[Dict[str, Type[SchemaRecord]]] = None) -> Dict[str, Type[SchemaRecord]]:
+    """
+    Generate record classes for every titled object in the given JSON schema.
+
+    :param schema: JSON schema (as parsed JSON).
+    :param bases: Optional map of title -> base class (which must derive from SchemaRecord) to use for
+                  that record, e.g. to add extra non-schema attributes.
+    :return: Map of schema title -> generated record class.
+    """
+    bases_dict = bases if bases is not None else {}  # type: Dict[str, Type[SchemaRecord]]
+    classes = {}  # type: Dict[str, Type[SchemaRecord]]
+
+    def make_field(key: str, prop: Dict[str, Any], parent: str) -> SchemaField:
+        prop_type = prop.get("type")  # type: Optional[str]
+        record = None  # type: Optional[type]
+        items = None  # type: Optional[SchemaField]
+        if prop_type == "object" and "properties" in prop:
+            record = make_record(prop, default_title=parent + "_" + key)
+        elif prop_type == "array" and isinstance(prop.get("items"), dict):
+            items = make_field(key, prop["items"], parent)
+        return SchemaField(name=key.replace(" ", "_"), key=key, type=prop_type, record=record, items=items)
+
+    def make_record(obj: Dict[str, Any], default_title: str) -> Type[SchemaRecord]:
+        title = str(obj.get("title", default_title))
+        fields = tuple(make_field(key, prop, title) for key, prop in obj.get("properties", {}).items())
+
+        existing = classes.get(title)
+        if existing is not None:
+            if tuple(f.key for f in existing._fields) != tuple(f.key for f in fields):
+                raise ValueError("Schema defines conflicting objects titled {t}".format(t=title))
+            return existing
+
+        base = bases_dict.get(title, SchemaRecord)
+        for field in fields:
+            if hasattr(base, field.name):
+                raise ValueError("Property {k} of {t} clashes with a record attribute".format(k=field.key, t=title))
+        cls = type(title, (base,), {
+            "__slots__": tuple(f.name for f in fields),
+            "__module__": base.__module__,
+            "_fields": fields,
+            "_fields_by_key": {f.key: f for f in fields},
+            "_fields_by_name": {f.name: f for f in fields},
+        })  # type: Type[SchemaRecord]
+        all_slots = []  # type: List[str]
+        for klass in cls.__mro__:
+            all_slots.extend(getattr(klass, "__slots__", ()))
+        cls._all_slots = tuple(all_slots)
+        classes[title] = cls
+        return cls
+
+    make_record(schema, default_title="Root")
+    return classes
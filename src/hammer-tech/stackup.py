@@ -8,9 +8,9 @@
 
 from enum import Enum
 from typing import List, NamedTuple, Tuple, Dict
-from hammer_utils import reverse_dict, coerce_to_grid
+from hammer_utils import reverse_dict, coerce_to_grid, to_grid_units, from_grid_units
 from decimal import Decimal
-from functools import partial
+from functools import lru_cache, partial
 
 class RoutingDirection(Enum):
     """
@@ -148,6 +148,33 @@ class Metal(NamedTuple('Metal', [
             power_strap_widths_and_spacings=WidthSpacingTuple.from_list(grid_unit, d["power_strap_widths_and_spacings"])
         )
 
+    @property
+    def grid(self) -> "MetalGrid":
+        """
+        Get this metal layer in integer grid units.
+        Use this directly when doing many calculations on the same layer (e.g. sweeping strap parameters).
+        """
+        return _metal_grid(self.grid_unit, self.name, self.min_width, self.pitch, self.offset,
+                           tuple(self.power_strap_widths_and_spacings))
+
+    def to_grid_units(self, value: Decimal) -> int:
+        """
+        Convert a length on this layer's grid into integer grid units.
+
+        :param value: Length (e.g. 0.09)
+        :return: Length in grid units (e.g. 90 for a 0.001 grid)
+        """
+        return to_grid_units(value, self.grid_unit)
+
+    def from_grid_units(self, units: int) -> Decimal:
+        """
+        Convert integer grid units into an exact length on this layer's grid.
+
+        :param units: Length in grid units (e.g. 90)
+        :return: Length (e.g. 0.090 for a 0.001 grid)
+        """
+        return from_grid_units(units, self.grid_unit)
+
     def get_spacing_for_width(self, width: Decimal) -> Decimal:
         """
         Get the minimum spacing for a provided width.
@@ -155,48 +182,19 @@ class Metal(NamedTuple('Metal', [
         :param width: Width to calculate minimum spacing for.
         :return: Minimum spacing for `width`
         """
-        spacing = Decimal(0)
-        for wst in self.power_strap_widths_and_spacings:
-            if width >= wst.width_at_least:
-                spacing = max(spacing, wst.min_spacing)
-            else:
-                # The list is sorted so we can early-out
-                return spacing
-        return spacing
+        return self.from_grid_units(self.grid.get_spacing_for_width(self.to_grid_units(width)))
 
     def min_spacing_and_max_width_from_pitch(self, pitch: Decimal) -> Tuple[Decimal, Decimal]:
         """
         Derive the minimum spacing and maximally-sized wire for a
         desired pitch.
-
-        Use this when the wire width is unknown, but you know the pitch.
-        This calculation essentially plots the wire width on the X axis
-        and the minimum pitch on the Y axis.
-
-        You'll see discontinuites at the width-spacing table entries.
-        If the desired pitch falls on a sloped line (i.e. > min width for
-        entry N but less than min width for entry N+1), pick that spacing.
-        If the desired pitch falls on a vertical line, pick the maximum width
-        entry for N, which is the entry for N+1 minus delta (2 grid units),
-        and then the spacing will be larger than the min spacing.
+        See MetalGrid.min_spacing_and_max_width_from_pitch for details.
 
         :param pitch: Desired pitch
         :return: Tuple of (minimum spacing, maximally-sized wire)
         """
-        widths_and_spacings = self.power_strap_widths_and_spacings
-        spacing = widths_and_spacings[0].min_spacing
-        for first, second in zip(widths_and_spacings[:-1], widths_and_spacings[1:]):
-            if pitch >= (second.min_spacing + second.width_at_least):
-                spacing = second.min_spacing
-            elif pitch >= (first.min_spacing + second.width_at_least):
-                # we are asking for a pitch that is width-constrained
-                width = second.width_at_least - (self.grid_unit*2)
-                spacing = pitch - width
-
-        width = pitch - spacing
-        if width < 0:
-            raise ValueError("Desired pitch {pitch} is illegal".format(pitch=pitch))
-        return spacing, pitch - spacing
+        spacing, width = self.grid.min_spacing_and_max_width_from_pitch(self.to_grid_units(pitch))
+        return self.from_grid_units(spacing), self.from_grid_units(width)
 
     def min_spacing_from_pitch(self, pitch: Decimal) -> Decimal:
         """
@@ -221,6 +219,102 @@ class Metal(NamedTuple('Metal', [
         return self.min_spacing_and_max_width_from_pitch(pitch)[1]
 
     def get_width_spacing_start_twt(self, tracks: int) -> Tuple[Decimal, Decimal, Decimal]:
+        """
+        This method will return the maximum width a wire can be in order
+        to consume a given number of routing tracks.
+        See MetalGrid.get_width_spacing_start_twt for details.
+
+        :param tracks: Number of routing tracks to consume
+        :return: Returns tuple of (width, spacing, start)
+        """
+        width, spacing, start = self.grid.get_width_spacing_start_twt(tracks)
+        return self.from_grid_units(width), self.from_grid_units(spacing), self.from_grid_units(start)
+
+    def get_width_spacing_start_twwt(self, tracks: int, force_even: bool = False) -> Tuple[Decimal, Decimal, Decimal]:
+        """
+        This method will return the maximum width a wire can be in order
+        to consume a given number of routing tracks.
+        See MetalGrid.get_width_spacing_start_twwt for details.
+
+        :param tracks: Number of routing tracks to consume
+        :param force_even: Forces the width of the wire to be an even multiple of the unit grid
+        :return: Returns tuple of (width, spacing, start)
+        """
+        width, spacing, start = self.grid.get_width_spacing_start_twwt(tracks, force_even)
+        return self.from_grid_units(width), self.from_grid_units(spacing), self.from_grid_units(start)
+
+
+class MetalGrid(NamedTuple('MetalGrid', [
+        ('name', str),
+        ('min_width', int),
+        ('pitch', int),
+        ('offset', int),
+        ('widths_and_spacings', Tuple[Tuple[int, int], ...])
+])):
+    """
+    A metal layer with all lengths in integer grid units (e.g. 1 = 1nm for a 0.001 grid unit).
+    All calculations are exact integer arithmetic; use Metal.grid to get one and
+    Metal.from_grid_units to convert results back.
+
+    name: Metal layer name (e.g. M1, M2), for error messages.
+    min_width: The minimum wire width for this layer.
+    pitch: The minimum cross-mask pitch for this layer.
+    offset: The routing track offset from the origin for the first track in this layer.
+    widths_and_spacings: Tuple of (width_at_least, min_spacing) pairs, sorted by width_at_least.
+    """
+    __slots__ = ()
+
+    def get_spacing_for_width(self, width: int) -> int:
+        """
+        Get the minimum spacing for a provided width.
+
+        :param width: Width to calculate minimum spacing for.
+        :return: Minimum spacing for `width`
+        """
+        spacing = 0
+        for width_at_least, min_spacing in self.widths_and_spacings:
+            if width >= width_at_least:
+                spacing = max(spacing, min_spacing)
+            else:
+                # The list is sorted so we can early-out
+                return spacing
+        return spacing
+
+    def min_spacing_and_max_width_from_pitch(self, pitch: int) -> Tuple[int, int]:
+        """
+        Derive the minimum spacing and maximally-sized wire for a
+        desired pitch.
+
+        Use this when the wire width is unknown, but you know the pitch.
+        This calculation essentially plots the wire width on the X axis
+        and the minimum pitch on the Y axis.
+
+        You'll see discontinuites at the width-spacing table entries.
+        If the desired pitch falls on a sloped line (i.e. > min width for
+        entry N but less than min width for entry N+1), pick that spacing.
+        If the desired pitch falls on a vertical line, pick the maximum width
+        entry for N, which is the entry for N+1 minus delta (2 grid units),
+        and then the spacing will be larger than the min spacing.
+
+        :param pitch: Desired pitch
+        :return: Tuple of (minimum spacing, maximally-sized wire)
+        """
+        widths_and_spacings = self.widths_and_spacings
+        spacing = widths_and_spacings[0][1]
+        for first, second in zip(widths_and_spacings[:-1], widths_and_spacings[1:]):
+            if pitch >= (second[1] + second[0]):
+                spacing = second[1]
+            elif pitch >= (first[1] + second[0]):
+                # we are asking for a pitch that is width-constrained
+                width = second[0] - 2
+                spacing = pitch - width
+
+        width = pitch - spacing
+        if width < 0:
+            raise ValueError("Desired pitch of {pitch} grid units is illegal on {name}".format(pitch=pitch, name=self.name))
+        return spacing, width
+
+    def get_width_spacing_start_twt(self, tracks: int) -> Tuple[int, int, int]:
         """
         This method will return the maximum width a wire can be in order
         to consume a given number of routing tracks.
@@ -233,37 +327,37 @@ class Metal(NamedTuple('Metal', [
         :param tracks: Number of routing tracks to consume
         :return: Returns tuple of (width, spacing, start)
         """
-        widths_and_spacings = self.power_strap_widths_and_spacings
-        spacing = widths_and_spacings[0].min_spacing
+        widths_and_spacings = self.widths_and_spacings
+        spacing = widths_and_spacings[0][1]
         # the T W T pattern contains one wires (W) and 2 spaces (S2)
         s2w = (tracks + 1) * self.pitch - self.min_width
 
-        assert int(s2w / self.grid_unit) % 2 == 0, "This calculation should always produce an even s2w"
+        assert s2w % 2 == 0, "This calculation should always produce an even s2w"
 
         width = s2w - spacing*2
         for first, second in zip(widths_and_spacings[:-1], widths_and_spacings[1:]):
-            if s2w >= second.min_spacing * 2 + second.width_at_least:
-                spacing = second.min_spacing
+            if s2w >= second[1] * 2 + second[0]:
+                spacing = second[1]
                 width = s2w - spacing * 2
-            elif s2w >= first.min_spacing * 2 + second.width_at_least:
+            elif s2w >= first[1] * 2 + second[0]:
                 # we are asking for a pitch that is width-constrained
-                if int(second.width_at_least / self.grid_unit) % 2 == 0:
+                if second[0] % 2 == 0:
                     # even
-                    width = second.width_at_least - (self.grid_unit * 2)
+                    width = second[0] - 2
                 else:
                     # odd
-                    width = second.width_at_least - self.grid_unit
-                spacing = (s2w - width) / 2
+                    width = second[0] - 1
+                spacing = (s2w - width) // 2
 
-        assert int(self.min_width / self.grid_unit) % 2 == 0, (
+        assert self.min_width % 2 == 0, (
             "Assuming all min widths are even here, if not fix me")
-        assert int(width / self.grid_unit) % 2 == 0, (
+        assert width % 2 == 0, (
             "This calculation should always produce an even width")
 
-        start = self.min_width / 2 + spacing
+        start = self.min_width // 2 + spacing
         return (width, spacing, start)
 
-    def get_width_spacing_start_twwt(self, tracks: int, force_even: bool = False) -> Tuple[Decimal, Decimal, Decimal]:
+    def get_width_spacing_start_twwt(self, tracks: int, force_even: bool = False) -> Tuple[int, int, int]:
         """
         This method will return the maximum width a wire can be in order
         to consume a given number of routing tracks.
@@ -272,35 +366,51 @@ class Metal(NamedTuple('Metal', [
         T = thin / min-width
         W = wide
         See min_spacing_and_max_width_from_pitch for an explanation of the calculation.
+        Widths and spacings which do not divide evenly are rounded down onto the grid,
+        which never introduces a spacing violation.
 
         :param tracks: Number of routing tracks to consume
         :param force_even: Forces the width of the wire to be an even multiple of the unit grid
         :return: Returns tuple of (width, spacing, start)
         """
-        widths_and_spacings = self.power_strap_widths_and_spacings
-        spacing = widths_and_spacings[0].min_spacing
+        widths_and_spacings = self.widths_and_spacings
+        spacing = widths_and_spacings[0][1]
         assert self.pitch - self.min_width == spacing, "Tech plugin is malformed for metal {}, the minimum spacing in the width-spacing list must be the same as (pitch - min_width).".format(self.name)
         # the T W W T pattern contains two wires (W2) and 3 spaces (S3)
         s3w2 = ((2 * tracks) + 1) * self.pitch - self.min_width
-        width = (s3w2 - spacing * 3) / 2
+        width = (s3w2 - spacing * 3) // 2
         for first, second in zip(widths_and_spacings[:-1], widths_and_spacings[1:]):
-            if s3w2 >= second.min_spacing * 3 + second.width_at_least * 2:
-                spacing = second.min_spacing
-                width = (s3w2 - spacing * 3) / 2
-            elif s3w2 >= first.min_spacing * 3 + second.width_at_least * 2:
+            if s3w2 >= second[1] * 3 + second[0] * 2:
+                spacing = second[1]
+                width = (s3w2 - spacing * 3) // 2
+            elif s3w2 >= first[1] * 3 + second[0] * 2:
                 # we are asking for a pitch that is width-constrained
-                width = second.width_at_least - (self.grid_unit * 1)
-                spacing = (s3w2 - width * 2) / 3
-        assert int(self.min_width / self.grid_unit) % 2 == 0, "Assuming all min widths are even here, if not fix me"
-        start = self.min_width / 2 + spacing
-        if force_even and int(width / self.grid_unit) % 2 == 1:
-            width = width - self.grid_unit
-            start = start + self.grid_unit
+                width = second[0] - 1
+                spacing = (s3w2 - width * 2) // 3
+        assert self.min_width % 2 == 0, "Assuming all min widths are even here, if not fix me"
+        start = self.min_width // 2 + spacing
+        if force_even and width % 2 == 1:
+            width = width - 1
+            start = start + 1
         return (width, spacing, start)
 
     # TODO implement M W X* W M style wires, where X is slightly narrower than W and centered on-grid
 
 
+@lru_cache(maxsize=256)
+def _metal_grid(grid_unit: Decimal, name: str, min_width: Decimal, pitch: Decimal, offset: Decimal,
+                widths_and_spacings: Tuple[WidthSpacingTuple, ...]) -> MetalGrid:
+    """Convert (and cache) a metal layer into integer grid units. See Metal.grid."""
+    return MetalGrid(
+        name=name,
+        min_width=to_grid_units(min_width, grid_unit),
+        pitch=to_grid_units(pitch, grid_unit),
+        offset=to_grid_units(offset, grid_unit),
+        widths_and_spacings=tuple((to_grid_units(wst.width_at_least, grid_unit),
+                                   to_grid_units(wst.min_spacing, grid_unit)) for wst in widths_and_spacings)
+    )
+
+
 class Stackup(NamedTuple('Stackup', [
         ('grid_unit', Decimal),
         ('name', str),
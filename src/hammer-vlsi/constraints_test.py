@@ -5,11 +5,17 @@
 #
 #  See LICENSE for licence details.
 
+import os
+import tempfile
+
 import hammer_config
-from hammer_vlsi import DelayConstraint, ClockPort, DummyHammerTool
+from hammer_vlsi import (DelayConstraint, ClockPort, DummyHammerTool, BumpAssignment,
+                         BumpAssignments, read_bump_map_csv, PlacementConstraint,
+                         PlacementConstraintIndex)
 from hammer_vlsi.units import TimeValue
 
 import unittest
+from decimal import Decimal
 
 
 class ClockConstraintTest(unittest.TestCase):
@@ -167,5 +173,133 @@ class DelayConstraintTest(unittest.TestCase):
             })
 
 
+class BumpAssignmentsTest(unittest.TestCase):
+    def test_grid(self) -> None:
+        """
+        Test that bump assignments are stored and looked up by position.
+        """
+        bumps = BumpAssignments(x=4, y=3)
+        self.assertEqual(len(bumps), 0)
+        self.assertFalse(bumps.add(BumpAssignment(name="VDD", no_connect=False, x=Decimal(2), y=Decimal(1), custom_cell=None)))
+        self.assertFalse(bumps.add(BumpAssignment(name="VSS", no_connect=False, x=Decimal(4), y=Decimal(3), custom_cell="BIG_BUMP")))
+        self.assertFalse(bumps.add(BumpAssignment(name=None, no_connect=True, x=Decimal(1), y=Decimal(2), custom_cell=None)))
+        self.assertEqual(len(bumps), 3)
+        self.assertEqual(bumps.get(4, 3), BumpAssignment(name="VSS", no_connect=False, x=Decimal(4), y=Decimal(3), custom_cell="BIG_BUMP"))
+        self.assertIsNone(bumps.get(1, 1))
+        # Iteration is in grid order.
+        self.assertEqual([(b.x, b.y) for b in bumps], [(2, 1), (1, 2), (4, 3)])
+
+        # Duplicates replace the previous assignment.
+        self.assertTrue(bumps.add(BumpAssignment(name="VDD", no_connect=False, x=Decimal(4), y=Decimal(3), custom_cell=None)))
+        self.assertEqual(len(bumps), 3)
+        self.assertEqual(bumps.get(4, 3), BumpAssignment(name="VDD", no_connect=False, x=Decimal(4), y=Decimal(3), custom_cell=None))
+        self.assertEqual(bumps.names, ["VDD", "VSS"])
+
+        # Bumps outside of the grid are rejected.
+        for x, y in [("0", "1"), ("5", "1"), ("1", "4"), ("4.5", "1")]:
+            with self.assertRaises(ValueError):
+                bumps.add(BumpAssignment(name="VDD", no_connect=False, x=Decimal(x), y=Decimal(y), custom_cell=None))
+
+    def test_off_grid(self) -> None:
+        """
+        Test that bumps at fractional coordinates are kept as given.
+        """
+        bumps = BumpAssignments(x=4, y=3)
+        staggered = BumpAssignment(name="VDD", no_connect=False, x=Decimal("1.5"), y=Decimal("2"), custom_cell=None)
+        self.assertFalse(bumps.add(BumpAssignment(name="VSS", no_connect=False, x=Decimal(2), y=Decimal(2),
+                                                  custom_cell=None)))
+        self.assertFalse(bumps.add(staggered))
+        self.assertFalse(bumps.add(BumpAssignment(name="IO", no_connect=False, x=Decimal("3.5"), y=Decimal("1"),
+                                                  custom_cell=None)))
+        self.assertEqual(len(bumps), 3)
+        self.assertEqual(bumps.get(Decimal("1.5"), 2), staggered)
+        self.assertEqual(bumps.names, ["VSS", "VDD", "IO"])
+        # Iteration is in grid order, with the fractional bumps in between.
+        self.assertEqual([(b.x, b.y) for b in bumps], [(Decimal("3.5"), 1), (Decimal("1.5"), 2), (2, 2)])
+        self.assertTrue(bumps.add(staggered._replace(name="VDDA")))
+        self.assertEqual(len(bumps), 3)
+
+    def test_read_csv(self) -> None:
+        """
+        Test that bump maps can be read from CSV files.
+        """
+        fd, path = tempfile.mkstemp(".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("VDD,VSS@BIG_BUMP,\n!,,reset\n\n")
+        try:
+            assignments = read_bump_map_csv(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(assignments, [
+            BumpAssignment(name="VDD", no_connect=False, x=Decimal(1), y=Decimal(2), custom_cell=None),
+            BumpAssignment(name="VSS", no_connect=False, x=Decimal(2), y=Decimal(2), custom_cell="BIG_BUMP"),
+            BumpAssignment(name=None, no_connect=True, x=Decimal(1), y=Decimal(1), custom_cell=None),
+            BumpAssignment(name="reset", no_connect=False, x=Decimal(3), y=Decimal(1), custom_cell=None)
+        ])
+
+
+class PlacementConstraintIndexTest(unittest.TestCase):
+    @staticmethod
+    def constraint(path: str, constraint_type: str, x: float, y: float, width: float, height: float,
+                   **kwargs) -> PlacementConstraint:
+        d = {"path": path, "type": constraint_type, "x": x, "y": y, "width": width, "height": height}
+        if constraint_type == "toplevel":
+            d["margins"] = {"left": 0, "bottom": 0, "right": 0, "top": 0}
+        d.update(kwargs)
+        return PlacementConstraint.from_dict(d)
+
+    def test_query(self) -> None:
+        """
+        Test that region and point queries find the right constraints.
+        """
+        macros = [self.constraint("top/m{}".format(i), "hardmacro", 10 * i, 0, 10, 10) for i in range(10)]
+        index = PlacementConstraintIndex(macros)
+        self.assertEqual(index.query(15, 5, 10, 1), macros[1:3])
+        # Touching edges do not overlap.
+        self.assertEqual(index.query(20, 0, 10, 10), [macros[2]])
+        self.assertEqual(index.query(500, 500, 10, 10), [])
+        self.assertEqual(index.query_point(20, 5), macros[1:3])
+        self.assertEqual(list(index.overlapping_pairs()), [])
+
+    def test_check(self) -> None:
+        """
+        Test that problems with placement constraints are found.
+        """
+        constraints = [
+            self.constraint("top", "toplevel", 0, 0, 100, 100),
+            self.constraint("top/a", "hardmacro", 0, 0, 20, 20),
+            self.constraint("top/b", "hierarchical", 10, 10, 20, 20),
+            self.constraint("top/c", "hardmacro", 90, 90, 20, 20),
+            self.constraint("top/d", "placement", 50, 50, 10, 10),
+            self.constraint("top/obs", "obstruction", 55, 55, 10, 10, obs_types=["place"]),
+            self.constraint("top/route_obs", "obstruction", 0, 0, 100, 100, obs_types=["route"]),
+            self.constraint("top/dummy", "dummy", 0, 0, 1000, 1000)
+        ]
+        problems = PlacementConstraintIndex(constraints, cell_size=7).check()
+        self.assertEqual(sorted(problems), sorted([
+            "Placement constraint top/c (hardmacro) is not inside the toplevel top",
+            "Placement constraints top/a (hardmacro) and top/b (hierarchical) overlap",
+            "Placement obstruction top/obs overlaps placement constraint top/d"
+        ]))
+        self.assertEqual(PlacementConstraintIndex(constraints[:2]).check(), [])
+
+    def test_mixed_sizes(self) -> None:
+        """
+        Test that one large block among many small macros does not blow up the index.
+        """
+        macros = [self.constraint("top/m{}".format(i), "hardmacro", 2 * i, 5000, 1, 1) for i in range(100)]
+        block = self.constraint("top/block", "hierarchical", 0, 0, 3000, 3000)
+        inside = self.constraint("top/inside", "hardmacro", 1000, 1000, 1, 1)
+        index = PlacementConstraintIndex(macros + [block, inside])
+        self.assertEqual(index.cell_size, 1.0)
+        # Each small macro touches at most four cells; the block is not filed in the grid.
+        self.assertLessEqual(len(index._cells), 4 * 101)
+        self.assertEqual(index.query(999, 999, 2, 2), [block, inside])
+        self.assertEqual(index.query(0, 4000, 10000, 2000), macros)
+        self.assertEqual(index.query_point(1000.5, 1000.5), [block, inside])
+        self.assertEqual(index.check(), [
+            "Placement constraints top/block (hierarchical) and top/inside (hardmacro) overlap"])
+
+
 if __name__ == '__main__':
     unittest.main()
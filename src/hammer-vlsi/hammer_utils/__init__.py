@@ -99,15 +99,38 @@ def in_place_unique(items: List[Any]) -> None:
             i += 1
 
 
-def coerce_to_grid(num: float, grid: Decimal) -> Decimal:
+def coerce_to_grid(num: Union[float, Decimal, str], grid: Decimal) -> Decimal:
     """
     Coerce a floating-point number to the nearest multiple of the provided grid
 
-    :param num: The input floating-point number
+    :param num: The input floating-point number (or an exact Decimal/string number)
     :param grid: The decimal grid value to which num should be coerced
     :return: A decimal number on-grid
     """
-    return Decimal(round(num / float(grid))) * grid
+    return from_grid_units(to_grid_units(num, grid), grid)
+
+def to_grid_units(num: Union[float, Decimal, str], grid: Decimal) -> int:
+    """
+    Convert a number to the nearest integer number of grid units (e.g. 0.09 on a 0.001 grid -> 90).
+    Decimal and string inputs are converted exactly; floats are rounded as in coerce_to_grid.
+
+    :param num: The input number
+    :param grid: The decimal grid value
+    :return: The number of grid units
+    """
+    if isinstance(num, float):
+        return int(round(num / float(grid)))
+    return int((Decimal(num) / grid).to_integral_value())
+
+def from_grid_units(units: int, grid: Decimal) -> Decimal:
+    """
+    Convert an integer number of grid units back to an exact decimal number (e.g. 90 on a 0.001 grid -> 0.090).
+
+    :param units: The number of grid units
+    :param grid: The decimal grid value
+    :return: A decimal number on-grid
+    """
+    return Decimal(units) * grid
 
 def check_on_grid(num: Union[float, Decimal], grid: Decimal) -> bool:
     """
@@ -18,6 +18,18 @@ from .hammer_tool import *
 
 from .constraints import *
 
+from .placement_index import *
+
+from .power_straps import *
+
+from .ir_drop import *
+
+from .step_cache import *
+
+from .step_timing import *
+
+from .process_monitor import *
+
 from .driver import *
 
 from .cli_driver import CLIDriver
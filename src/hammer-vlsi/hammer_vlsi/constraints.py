@@ -8,16 +8,19 @@
 
 # pylint: disable=bad-continuation
 
+from array import array
+import csv
+import itertools
 from enum import Enum
-from typing import Dict, NamedTuple, Optional, List, Any
+from typing import Dict, Iterator, NamedTuple, Optional, List, Any, Tuple
 
 from hammer_utils import reverse_dict
-from .units import TimeValue, VoltageValue, TemperatureValue
+from .units import TimeValue, TimeValueArray, VoltageValue, TemperatureValue
 
 from decimal import Decimal
 
 __all__ = ['ILMStruct', 'SRAMParameters', 'Supply', 'PinAssignment',
-           'BumpAssignment', 'BumpsDefinition', 'ClockPort',
+           'BumpAssignment', 'BumpAssignments', 'read_bump_map_csv', 'BumpsDefinition', 'ClockPort',
            'OutputLoadConstraint', 'DelayConstraint', 'ObstructionType',
            'PlacementConstraintType', 'Margins', 'PlacementConstraint',
            'MMMCCornerType', 'MMMCCorner']
@@ -104,12 +107,187 @@ BumpAssignment = NamedTuple('BumpAssignment', [
     ('custom_cell', Optional[str])
 ])
 
+
+
+class BumpAssignments:
+    """
+    Bump assignments on a rectangular x by y bump grid (numbered from 1,1 in the lower left).
+
+    Rather than one BumpAssignment per bump, this stores flat row-major arrays over the grid:
+    an index into a table of net names, a no-connect mask and an index into a table of custom
+    bump cells. Lookup by (x, y) is constant time and duplicate assignments are detected as
+    they are added. Bumps at fractional coordinates within the grid (e.g. staggered or half-pitch
+    bumps) are kept as given in a separate dictionary.
+    Iterating gives the BumpAssignments in grid order (by y, then x), so this can be used
+    wherever a list of BumpAssignments is expected.
+    """
+    __slots__ = ('x', 'y', '_assigned', '_no_connect', '_name_index', '_names', '_name_ids',
+                 '_cell_index', '_cells', '_cell_ids', '_count', '_off_grid')
+
+    def __init__(self, x: int, y: int) -> None:
+        """
+        Create an empty bump grid.
+
+        :param x: Number of bumps in the x dimension.
+        :param y: Number of bumps in the y dimension.
+        """
+        self.x = int(x)  # type: int
+        self.y = int(y)  # type: int
+        size = max(self.x, 0) * max(self.y, 0)
+        self._assigned = bytearray(size)  # type: bytearray
+        self._no_connect = bytearray(size)  # type: bytearray
+        self._name_index = array('l', [-1]) * size  # type: array
+        self._names = []  # type: List[str]
+        self._name_ids = {}  # type: Dict[str, int]
+        self._cell_index = array('l', [-1]) * size  # type: array
+        self._cells = []  # type: List[str]
+        self._cell_ids = {}  # type: Dict[str, int]
+        self._count = 0  # type: int
+        # Bumps at fractional coordinates, by (x, y)
+        self._off_grid = {}  # type: Dict[Tuple[Decimal, Decimal], BumpAssignment]
+
+    def _offset(self, x: Any, y: Any) -> Optional[int]:
+        """
+        Get the array offset of the bump at (x, y), or None if it is at fractional coordinates.
+        Raises ValueError if (x, y) is outside of the grid.
+        """
+        xd, yd = Decimal(str(x)), Decimal(str(y))
+        if not (1 <= xd <= self.x and 1 <= yd <= self.y):
+            raise ValueError("Bump {x},{y} is outside of the {gx}x{gy} bump grid".format(x=x, y=y, gx=self.x, gy=self.y))
+        if xd != xd.to_integral_value() or yd != yd.to_integral_value():
+            return None
+        return (int(yd) - 1) * self.x + (int(xd) - 1)
+
+    @staticmethod
+    def _intern(value: Optional[str], table: List[str], ids: Dict[str, int]) -> int:
+        if value is None:
+            return -1
+        index = ids.get(value)
+        if index is None:
+            index = len(table)
+            table.append(value)
+            ids[value] = index
+        return index
+
+    def add(self, assignment: BumpAssignment) -> bool:
+        """
+        Add a bump assignment, replacing any previous assignment of the same bump.
+
+        :param assignment: Bump assignment to add.
+        :return: True if the bump was already assigned (i.e. this is a duplicate).
+        """
+        offset = self._offset(assignment.x, assignment.y)
+        if offset is None:
+            key = (Decimal(str(assignment.x)), Decimal(str(assignment.y)))
+            duplicate = key in self._off_grid
+            self._intern(assignment.name, self._names, self._name_ids)
+            self._off_grid[key] = assignment
+            return duplicate
+        duplicate = bool(self._assigned[offset])
+        if not duplicate:
+            self._assigned[offset] = 1
+            self._count += 1
+        self._no_connect[offset] = 1 if assignment.no_connect else 0
+        self._name_index[offset] = self._intern(assignment.name, self._names, self._name_ids)
+        self._cell_index[offset] = self._intern(assignment.custom_cell, self._cells, self._cell_ids)
+        return duplicate
+
+    def _assignment_at(self, offset: int) -> BumpAssignment:
+        name_index = self._name_index[offset]
+        cell_index = self._cell_index[offset]
+        return BumpAssignment(
+            name=None if name_index < 0 else self._names[name_index],
+            no_connect=bool(self._no_connect[offset]),
+            x=Decimal(offset % self.x + 1),
+            y=Decimal(offset // self.x + 1),
+            custom_cell=None if cell_index < 0 else self._cells[cell_index]
+        )
+
+    def get(self, x: Any, y: Any) -> Optional[BumpAssignment]:
+        """
+        Get the assignment of the bump at (x, y).
+
+        :return: The bump assignment, or None if the bump is unassigned.
+        """
+        offset = self._offset(x, y)
+        if offset is None:
+            return self._off_grid.get((Decimal(str(x)), Decimal(str(y))))
+        if not self._assigned[offset]:
+            return None
+        return self._assignment_at(offset)
+
+    @property
+    def names(self) -> List[str]:
+        """Get the distinct net names assigned to bumps, in order of first assignment."""
+        return list(self._names)
+
+    def __len__(self) -> int:
+        """Get the number of assigned bumps."""
+        return self._count + len(self._off_grid)
+
+    def _grid_assignments(self) -> Iterator[BumpAssignment]:
+        assigned = self._assigned
+        for offset in range(len(assigned)):
+            if assigned[offset]:
+                yield self._assignment_at(offset)
+
+    def __iter__(self) -> Iterator[BumpAssignment]:
+        if len(self._off_grid) == 0:
+            return self._grid_assignments()
+        return iter(sorted(itertools.chain(self._grid_assignments(), self._off_grid.values()),
+                           key=lambda b: (Decimal(str(b.y)), Decimal(str(b.x)))))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BumpAssignments):
+            return NotImplemented
+        return (self.x, self.y) == (other.x, other.y) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return "BumpAssignments(x={x}, y={y}, assigned={n})".format(x=self.x, y=self.y, n=self._count)
+
+
+def read_bump_map_csv(path: str) -> List[BumpAssignment]:
+    """
+    Read bump assignments from a CSV bump map file.
+
+    The file is a picture of the bump grid: the first row is the top row of bumps (y = number of rows)
+    and the first column is x = 1. Each entry is one of:
+     - empty: the bump is unassigned
+     - NAME: the bump is assigned to net NAME
+     - !: the bump is present but unconnected (!NAME is also accepted, as no_connect with a name)
+    Any entry may be followed by @CELL to use a custom bump cell, e.g. "VDD@MY_BUMP_CELL".
+
+    :param path: Path to the CSV file.
+    :return: List of bump assignments.
+    """
+    with open(path, "r", newline="") as f:
+        rows = list(csv.reader(f))
+    # Ignore trailing blank lines.
+    while len(rows) > 0 and all(entry.strip() == "" for entry in rows[-1]):
+        rows.pop()
+    assignments = []  # type: List[BumpAssignment]
+    for row_index, row in enumerate(rows):
+        y = len(rows) - row_index
+        for column_index, entry in enumerate(row):
+            entry = entry.strip()
+            if entry == "":
+                continue
+            name, _, cell = entry.partition("@")
+            no_connect = name.startswith("!")
+            if no_connect:
+                name = name[1:]
+            assignments.append(BumpAssignment(name=name if name != "" else None, no_connect=no_connect,
+                                              x=Decimal(column_index + 1), y=Decimal(y),
+                                              custom_cell=cell if cell != "" else None))
+    return assignments
+
+
 BumpsDefinition = NamedTuple('BumpsDefinition', [
     ('x', int),
     ('y', int),
     ('pitch', float),
     ('cell', str),
-    ('assignments', List[BumpAssignment])
+    ('assignments', BumpAssignments)
 ])
 
 ClockPort = NamedTuple('ClockPort', [
@@ -154,6 +332,32 @@ class DelayConstraint(NamedTuple('DelayConstraint', [
             delay=TimeValue(delay_src["delay"])
         )
 
+    @staticmethod
+    def from_dicts(delay_srcs: List[Dict[str, Any]]) -> List["DelayConstraint"]:
+        """
+        Create delay constraints from a list of dicts, parsing all the delays in one pass.
+        """
+        return DelayConstraint.from_dicts_with_array(delay_srcs)[0]
+
+    @staticmethod
+    def from_dicts_with_array(delay_srcs: List[Dict[str, Any]]) -> Tuple[List["DelayConstraint"], TimeValueArray]:
+        """
+        Create delay constraints from a list of dicts, parsing all the delays in one pass.
+
+        :param delay_srcs: List of delay constraint dicts.
+        :return: Tuple of (delay constraints, array of their delays in the same order).
+        """
+        delays = TimeValueArray(str(delay_src["delay"]) for delay_src in delay_srcs)
+        output = []  # type: List[DelayConstraint]
+        for delay_src, delay in zip(delay_srcs, delays):
+            output.append(DelayConstraint(
+                name=str(delay_src["name"]),
+                clock=str(delay_src["clock"]),
+                direction=str(delay_src["direction"]),
+                delay=delay
+            ))
+        return output, delays
+
     def to_dict(self) -> dict:
         return {
             "name": self.name,
@@ -580,6 +580,10 @@ class HammerDriver:
                 hooks_to_use = hook_actions
             else:
                 hooks_to_use = hook_actions + self.post_custom_par_tool_hooks
+        if not self.par_tool.check_placement_constraints():
+            self.log.error("Placement constraints for {top} have errors; not running place and route.".format(
+                top=self.par_tool.top_module))
+            return False, {}
         # TODO: get place and route working
         run_succeeded = self.par_tool.run(hooks_to_use)
         if not run_succeeded:
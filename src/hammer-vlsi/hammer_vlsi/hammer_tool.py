@@ -7,12 +7,16 @@
 #  See LICENSE for licence details.
 
 import inspect
+import json
 import os
 import re
 import shlex
 from abc import ABCMeta, abstractmethod
-from functools import reduce
-from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, cast
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from decimal import Decimal
+from functools import reduce, wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar, cast
 
 import hammer_config
 import hammer_tech
@@ -25,16 +29,21 @@ from .constraints import *
 from .hammer_vlsi_impl import HammerToolPauseException, HierarchicalMode
 from .hooks import (HammerStepFunction, HammerToolHookAction, HammerToolStep,
                     HookLocation)
+from .step_cache import StepCache, StepRecording
+from .step_timing import StepTimer, StepTiming
 from .submit_command import HammerSubmitCommand
-from .units import TemperatureValue, TimeValue, VoltageValue
+from .units import TemperatureValue, TimeValue, TimeValueArray, VoltageValue
 
-__all__ = ['HammerTool']
+__all__ = ['HammerTool', 'cached_by_database']
 
+T = TypeVar('T')
 
-def make_raw_hammer_tool_step(func: HammerStepFunction, name: str) -> HammerToolStep:
+
+def make_raw_hammer_tool_step(func: HammerStepFunction, name: str,
+                              depends_on: Optional[Iterable[str]] = None) -> HammerToolStep:
     # Check the type of the HammerStepFunction
     check_hammer_step_function(func)
-    return HammerToolStep(func, name)
+    return HammerToolStep(func, name, None if depends_on is None else tuple(depends_on))
 
 
 def check_hammer_step_function(func: HammerStepFunction) -> None:
@@ -42,7 +51,51 @@ def check_hammer_step_function(func: HammerStepFunction) -> None:
     assert_function_type(func, args=[HammerTool], return_type=bool)
 
 
+def cached_by_database(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Decorator for HammerTool methods which derive values from settings (e.g. get_clock_ports).
+    The result is computed once per set of (hashable) arguments and reused until the tool's database
+    or technology changes (see HammerDatabase.version).
+    Lists and dicts are returned as shallow copies so that callers can modify them.
+    Do not use this for methods which read files or have side effects other than logging.
+    """
+    @wraps(func)
+    def wrapper(self: "HammerTool", *args: Any) -> T:
+        try:
+            database = self._database
+        except AttributeError:
+            # No database yet: let the method report it.
+            return func(self, *args)
+        state = (id(database), database.version, id(getattr(self, "_technology", None)))
+        # Use a local reference, since steps running on other threads may replace the cache at any time.
+        cache = self._derived_settings_cache
+        if self._derived_settings_state != state:
+            cache = {}
+            self._derived_settings_cache = cache
+            self._derived_settings_state = state
+        key = (func.__name__,) + args
+        try:
+            value = cache[key]
+        except KeyError:
+            value = func(self, *args)
+            cache[key] = value
+        if isinstance(value, list):
+            return cast(T, list(value))
+        elif isinstance(value, dict):
+            return cast(T, value.copy())
+        return value
+    return wrapper
+
+
 class HammerTool(metaclass=ABCMeta):
+    # Values derived from settings by cached_by_database methods, and the database state they were derived from.
+    _derived_settings_cache = {}  # type: Dict[Tuple[Any, ...], Any]
+    _derived_settings_state = None  # type: Optional[Tuple[int, int, int]]
+    # What the running step reads and writes, in incremental mode.
+    _step_recording = None  # type: Optional[StepRecording]
+    # Timings of the steps of the last run.
+    _step_timer = None  # type: Optional[StepTimer]
+
     # Interface methods.
     @property
     def env_vars(self) -> Dict[str, str]:
@@ -126,6 +179,29 @@ class HammerTool(metaclass=ABCMeta):
         """
         pass
 
+    @property
+    def step_timings(self) -> List[StepTiming]:
+        """
+        Wall clock, CPU time and peak memory of each step and hook of the last run, in the order they ran.
+        They are also exported to the output config (e.g. synthesis.outputs.step_timings) and written to
+        hammer-trace.json in the run_dir as Chrome trace events.
+        """
+        return [] if self._step_timer is None else list(self._step_timer.timings)
+
+    def step_timings_output(self) -> List[Dict[str, Any]]:
+        """
+        Get step_timings in a form suitable for an output config.
+        """
+        return [] if self._step_timer is None else self._step_timer.to_dicts()
+
+    def process_telemetry_output(self) -> List[Dict[str, Any]]:
+        """
+        Get summaries of the processes (e.g. CAD tools) launched by the steps of the last run, for an output config.
+        Only steps which launched processes are included; see vlsi.core.process_sample_interval.
+        The sampled time series are written to hammer-telemetry.json in the run_dir.
+        """
+        return [] if self._step_timer is None else self._step_timer.process_telemetry()
+
     def do_pre_steps(self, first_step: HammerToolStep) -> bool:
         """
         Function to run before the list of steps executes.
@@ -414,23 +490,40 @@ class HammerTool(metaclass=ABCMeta):
                     break
             assert step_id != -1
 
+            # Hook steps without declared dependencies take their place in the dependencies of the target step,
+            # so that steps with declared dependencies keep running concurrently around them.
+            target = new_steps[step_id]
             if action.location == HookLocation.ReplaceStep:
                 assert action.step is not None, "ReplaceStep requires a step"
                 assert action.target_name == action.step.name, "Replacement step should have the same name"
-                new_steps[step_id] = action.step
+                new_step = action.step
+                if new_step.depends_on is None:
+                    new_step = new_step._replace(depends_on=target.depends_on)
+                new_steps[step_id] = new_step
             elif action.location == HookLocation.InsertPreStep:
                 assert action.step is not None, "InsertPreStep requires a step"
                 if has_step(action.step.name):
                     self.logger.error("New step '{step}' already exists".format(step=action.step.name))
                     return False
-                new_steps.insert(step_id, action.step)
+                new_step = action.step
+                if new_step.depends_on is None and target.depends_on is not None:
+                    new_step = new_step._replace(depends_on=target.depends_on)
+                    new_steps[step_id] = target._replace(depends_on=target.depends_on + (new_step.name,))
+                new_steps.insert(step_id, new_step)
                 names.add(action.step.name)
             elif action.location == HookLocation.InsertPostStep:
                 assert action.step is not None, "InsertPostStep requires a step"
                 if has_step(action.step.name):
                     self.logger.error("New step '{step}' already exists".format(step=action.step.name))
                     return False
-                new_steps.insert(step_id + 1, action.step)
+                new_step = action.step
+                if new_step.depends_on is None and target.depends_on is not None:
+                    new_step = new_step._replace(depends_on=(target.name,))
+                    for i in range(step_id + 1, len(new_steps)):
+                        depends_on = new_steps[i].depends_on
+                        if depends_on is not None and target.name in depends_on:
+                            new_steps[i] = new_steps[i]._replace(depends_on=depends_on + (new_step.name,))
+                new_steps.insert(step_id + 1, new_step)
                 names.add(action.step.name)
             elif action.location == HookLocation.ResumePreStep or action.location == HookLocation.ResumePostStep:
                 if resume_step is not None:
@@ -449,6 +542,172 @@ class HammerTool(metaclass=ABCMeta):
                 # Cajole the type checker into accepting that step is a HammerToolStep
                 step = cast(HammerToolStep, step)
                 check_hammer_step_function(step.func)
+        dependencies = self.get_step_dependencies(new_steps)
+
+        # In incremental mode, skip steps which ran before with the same inputs and outputs.
+        try:
+            incremental = bool(self.get_setting("vlsi.core.incremental_steps"))
+        except KeyError:
+            incremental = False
+        step_cache = None  # type: Optional[StepCache]
+        if incremental:
+            step_cache = StepCache(os.path.join(self.run_dir, "hammer-steps.json"),
+                                   "{module}.{cls}".format(module=type(self).__module__, cls=type(self).__qualname__))
+
+        # Run steps which declare their dependencies concurrently, if allowed.
+        try:
+            max_threads = int(self.get_setting("vlsi.core.max_threads"))
+        except KeyError:
+            max_threads = 1
+        parallel = max_threads > 1 and any(step.depends_on is not None for step in new_steps)
+        if parallel and step_cache is not None:
+            self.logger.info("Running steps sequentially since vlsi.core.incremental_steps is set")
+            parallel = False
+
+        # Time every step and hook, and sample the processes launched by steps.
+        try:
+            sample_interval = self.get_setting("vlsi.core.process_sample_interval")  # type: Optional[float]
+        except KeyError:
+            sample_interval = None
+        if sample_interval is not None and float(sample_interval) <= 0:
+            sample_interval = None
+        timer = StepTimer(None if sample_interval is None else float(sample_interval))
+        self._step_timer = timer
+        try:
+            if parallel:
+                return self._run_parallel_steps(new_steps, dependencies, resume_step, resume_step_pre, max_threads,
+                                                timer)
+            else:
+                return self._run_checked_steps(new_steps, resume_step, resume_step_pre, step_cache, timer)
+        finally:
+            # Do not let a failure to write the reports hide the outcome of the steps.
+            try:
+                timer.write_chrome_trace(os.path.join(self.run_dir, "hammer-trace.json"),
+                                         "{cls} ({run_dir})".format(cls=type(self).__name__, run_dir=self.run_dir))
+                series = [s.to_dict() for s in timer.process_series if s.summary().peak_processes > 0]
+                if len(series) > 0:
+                    with open(os.path.join(self.run_dir, "hammer-telemetry.json"), "w") as f:
+                        json.dump(series, f)
+            except OSError as e:
+                self.logger.warning("Unable to write the step trace and telemetry: {e}".format(e=e))
+
+    @staticmethod
+    def get_step_dependencies(steps: List[HammerToolStep]) -> Dict[str, Set[str]]:
+        """
+        Get the steps which each step must wait for.
+        A step without declared dependencies waits for every earlier step, and every later step waits for it.
+        A step with declared dependencies waits for those and for the last earlier step without declared dependencies.
+
+        :param steps: List of steps, in the order in which they would run sequentially.
+        :return: Dictionary of step name to the names of the steps it waits for.
+        """
+        dependencies = {}  # type: Dict[str, Set[str]]
+        earlier = []  # type: List[str]
+        barrier = None  # type: Optional[str]
+        for step in steps:
+            if step.depends_on is None:
+                dependencies[step.name] = set(earlier)
+                barrier = step.name
+            else:
+                for name in step.depends_on:
+                    if name not in earlier:
+                        raise ValueError("Step '{step}' depends on '{dep}', which is not an earlier step".format(
+                            step=step.name, dep=name))
+                dependencies[step.name] = set(step.depends_on) | (set() if barrier is None else {barrier})
+            earlier.append(step.name)
+        return dependencies
+
+    def _run_timed_step(self, step: HammerToolStep, timer: StepTimer) -> bool:
+        with timer.measure(step.name):
+            func_out = step.func(self)  # type: bool
+        assert isinstance(func_out, bool)
+        return func_out
+
+    def _run_parallel_steps(self, steps: List[HammerToolStep], dependencies: Dict[str, Set[str]],
+                            resume_step: Optional[str], resume_step_pre: bool, max_threads: int,
+                            timer: StepTimer) -> bool:
+        """
+        Run the steps after hooks were applied by run_steps, starting each step on a thread pool
+        as soon as the steps it depends on finished.
+        Steps before a resume hook are skipped as in sequential execution. When a step fails or a pause step
+        is reached, no more steps are started, but the running ones are allowed to finish.
+        """
+        done = set()  # type: Set[str]
+        pending = []  # type: List[HammerToolStep]
+        for step in steps:
+            if resume_step is not None:
+                if resume_step_pre and resume_step == step.name:
+                    self.logger.info("Resuming before '{step}' due to resume hook".format(step=step.name))
+                    resume_step = None
+                else:
+                    self.logger.info("Sub-step '{step}' skipped due to resume hook".format(step=step.name))
+                    done.add(step.name)
+                    if not resume_step_pre and resume_step == step.name:
+                        self.logger.info("Resuming after '{step}' due to resume hook".format(step=step.name))
+                        resume_step = None
+                    continue
+            pending.append(step)
+
+        prev_step = None  # type: Optional[HammerToolStep]
+        running = {}  # type: Dict[Future, HammerToolStep]
+        stop = False
+        failed = False
+        error = None  # type: Optional[BaseException]
+        with ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="hammer-step") as pool:
+            while len(running) > 0 or (not stop and len(pending) > 0):
+                if not stop:
+                    for step in list(pending):
+                        if len(running) >= max_threads:
+                            break
+                        if not dependencies[step.name] <= done:
+                            continue
+                        pending.remove(step)
+                        if prev_step is None:
+                            # Run pre-step hook.
+                            with timer.measure("pre_steps", "hook"):
+                                self.do_pre_steps(step)
+                        elif step.name != "pause":
+                            with timer.measure("between_steps", "hook"):
+                                self.do_between_steps(prev_step, step)
+                        self.logger.debug("Running sub-step '{step}'".format(step=step.name))
+                        running[pool.submit(self._run_timed_step, step, timer)] = step
+                        prev_step = step
+                if len(running) == 0:
+                    break
+                finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        if future.result():
+                            done.add(step.name)
+                        else:
+                            failed = True
+                            stop = True
+                    except HammerToolPauseException:
+                        self.logger.info("Sub-step '{step}' paused the tool execution".format(step=step.name))
+                        stop = True
+                    except BaseException as e:  # pylint: disable=broad-except
+                        if error is None:
+                            error = e
+                        stop = True
+        if error is not None:
+            raise error
+        if failed:
+            return False
+
+        # Run post-steps hook.
+        with timer.measure("post_steps", "hook"):
+            self.do_post_steps()
+
+        return True
+
+    def _run_checked_steps(self, new_steps: List[HammerToolStep], resume_step: Optional[str], resume_step_pre: bool,
+                           step_cache: Optional[StepCache], timer: StepTimer) -> bool:
+        """
+        Run the steps after hooks were applied by run_steps.
+        """
+        # Fingerprint of the last step, or None if it is unknown.
+        fingerprint = None if step_cache is None else step_cache.initial_fingerprint  # type: Optional[str]
 
         # Run steps.
         prev_step = None  # type: Optional[HammerToolStep]
@@ -473,28 +732,50 @@ class HammerTool(metaclass=ABCMeta):
                 else:
                     self.logger.info("Sub-step '{step}' skipped due to resume hook".format(step=step.name))
                     do_step = False
+                if not do_step and step_cache is not None:
+                    fingerprint = step_cache.fingerprint_of(step.name)
+
+            if do_step and step_cache is not None and fingerprint is not None:
+                cached = step_cache.check(fingerprint, step.name, self._incremental_step_setting)
+                if cached is not None:
+                    self.logger.info("Sub-step '{step}' skipped since its inputs and outputs did not change".format(step=step.name))
+                    fingerprint = cached
+                    do_step = False
 
             if do_step:
+                if step_cache is not None:
+                    self._step_recording = StepRecording(step.name)
+                    # Make sure that settings read through cached getters get recorded.
+                    self._derived_settings_state = None
                 try:
                     if prev_step is None:
                         # Run pre-step hook.
-                        self.do_pre_steps(step)
+                        with timer.measure("pre_steps", "hook"):
+                            self.do_pre_steps(step)
                     else:
                         # TODO: find a cleaner way of detecting a pause hook
                         if step.name == "pause":
                             # Don't include "pause" for do_between_steps
                             if step_index + 1 < len(new_steps):
-                                self.do_between_steps(prev_step, new_steps[step_index + 1])
+                                with timer.measure("between_steps", "hook"):
+                                    self.do_between_steps(prev_step, new_steps[step_index + 1])
                         else:
-                            self.do_between_steps(prev_step, step)
-                    func_out = step.func(self)  # type: bool
+                            with timer.measure("between_steps", "hook"):
+                                self.do_between_steps(prev_step, step)
+                    with timer.measure(step.name):
+                        func_out = step.func(self)  # type: bool
                     prev_step = step
                 except HammerToolPauseException:
                     self.logger.info("Sub-step '{step}' paused the tool execution".format(step=step.name))
                     break
+                finally:
+                    recording = self._step_recording
+                    self._step_recording = None
                 assert isinstance(func_out, bool)
                 if not func_out:
                     return False
+                if step_cache is not None and recording is not None:
+                    fingerprint = None if fingerprint is None else step_cache.finish(fingerprint, recording)
 
             if resume_step is not None:
                 if not resume_step_pre and resume_step == step.name:
@@ -502,17 +783,20 @@ class HammerTool(metaclass=ABCMeta):
                     resume_step = None
 
         # Run post-steps hook.
-        self.do_post_steps()
+        with timer.measure("post_steps", "hook"):
+            self.do_post_steps()
 
         return True
 
     @staticmethod
-    def make_step_from_method(func: Callable[[], bool], name: str = "") -> HammerToolStep:
+    def make_step_from_method(func: Callable[[], bool], name: str = "",
+                              depends_on: Optional[Iterable[str]] = None) -> HammerToolStep:
         """
         Create a HammerToolStep from a method.
 
         :param func: Method for the given substep (e.g. self.elaborate)
         :param name: Name of the hook. If unspecified, defaults to func.__name__.
+        :param depends_on: Names of the earlier steps this step needs. If unspecified, it needs every earlier step.
         :return: A HammerToolStep defining this step.
         """
         if not callable(func):
@@ -529,7 +813,7 @@ class HammerTool(metaclass=ABCMeta):
 
         if name == "":
             name = func.__name__
-        return make_raw_hammer_tool_step(func=wrapper, name=name)
+        return make_raw_hammer_tool_step(func=wrapper, name=name, depends_on=depends_on)
 
     @staticmethod
     def make_steps_from_methods(funcs: List[Callable[[], bool]]) -> List[HammerToolStep]:
@@ -542,19 +826,21 @@ class HammerTool(metaclass=ABCMeta):
         return list(map(lambda x: HammerTool.make_step_from_method(x), funcs))
 
     @staticmethod
-    def make_step_from_function(func: HammerStepFunction, name: str = "") -> HammerToolStep:
+    def make_step_from_function(func: HammerStepFunction, name: str = "",
+                                depends_on: Optional[Iterable[str]] = None) -> HammerToolStep:
         """
         Create a HammerToolStep from a function.
 
         :param func: Class function for the given substep
         :param name: Name of the hook. If unspecified, defaults to func.__name__.
+        :param depends_on: Names of the earlier steps this step needs. If unspecified, it needs every earlier step.
         :return: A HammerToolStep defining this step.
         """
         if hasattr(func, "__self__"):
             raise ValueError("This function does not take bound methods")
         if name == "":
             name = func.__name__
-        return make_raw_hammer_tool_step(func=func, name=name)
+        return make_raw_hammer_tool_step(func=func, name=name, depends_on=depends_on)
 
     @staticmethod
     def make_pause_function() -> HammerStepFunction:
@@ -722,9 +1008,46 @@ class HammerTool(metaclass=ABCMeta):
         :param nullvalue: Value to return in case of null (leave as None to use the default).
         """
         try:
-            return self._database.get_setting(key, nullvalue)
+            database = self._database
         except AttributeError:
             raise ValueError("Internal error: no database set by hammer-vlsi")
+        recording = self._step_recording
+        if recording is None:
+            return database.get_setting(key, nullvalue)
+        try:
+            value = database.get_setting(key, nullvalue)
+        except KeyError:
+            recording.record_missing_setting(key)
+            raise
+        recording.record_setting(key, value)
+        return value
+
+    def add_step_input_files(self, paths: Iterable[str]) -> None:
+        """
+        Declare files (or directories) that the running step reads, for incremental runs (see vlsi.core.incremental_steps).
+        Settings read by the step are recorded automatically.
+
+        :param paths: Paths of the input files.
+        """
+        if self._step_recording is not None:
+            self._step_recording.inputs.extend(paths)
+
+    def add_step_output_files(self, paths: Iterable[str]) -> None:
+        """
+        Declare files (or directories) that the running step writes, for incremental runs (see vlsi.core.incremental_steps).
+        Only steps with declared outputs can be skipped, so only declare them for steps whose results are entirely
+        in files (and not e.g. in commands collected in memory for a later step).
+
+        :param paths: Paths of the output files.
+        """
+        if self._step_recording is not None:
+            self._step_recording.outputs.extend(paths)
+
+    def _incremental_step_setting(self, key: str) -> Tuple[bool, Any]:
+        try:
+            return True, self._database.get_setting(key)
+        except KeyError:
+            return False, None
 
     def set_setting(self, key: str, value: Any) -> None:
         """
@@ -777,26 +1100,83 @@ class HammerTool(metaclass=ABCMeta):
                 error = True
         return not error
 
-    def filter_for_mmmc(self, voltage: VoltageValue, temp: TemperatureValue) -> Callable[[hammer_tech.Library],bool]:
+    @staticmethod
+    def mmmc_corner_key(voltage: VoltageValue, temp: TemperatureValue) -> Tuple[float, float]:
+        """
+        Get a hashable key for the given operating conditions.
+        Two conditions have the same key if and only if their values compare equal.
+
+        :param voltage: Supply voltage.
+        :param temp: Temperature.
+        :return: (voltage, temperature) key.
+        """
+        return voltage.value_in_units(voltage.default_prefix), temp.value_in_units(temp.default_prefix)
+
+    @staticmethod
+    def library_mmmc_corner_key(lib: hammer_tech.Library) -> Optional[Tuple[float, float]]:
+        """
+        Get the (voltage, temperature) key of the given library (see mmmc_corner_key).
+
+        :param lib: Library to check.
+        :return: Key of the library, or None if the library is not annotated with a corner and supplies.
+        """
+        if lib.corner is None or lib.corner.temperature is None:
+            return None
+        if lib.supplies is None or lib.supplies.VDD is None:
+            return None
+        return HammerTool.mmmc_corner_key(VoltageValue(str(lib.supplies.VDD)),
+                                          TemperatureValue(str(lib.corner.temperature)))
+
+    def filter_for_mmmc(self, voltage: VoltageValue, temp: TemperatureValue) -> Callable[[hammer_tech.Library], bool]:
         """
         Selecting libraries that match given temp and voltage.
         """
+        corner_key = self.mmmc_corner_key(voltage, temp)
+
         def extraction_func(lib: hammer_tech.Library) -> bool:
-            if lib.corner is None or lib.corner.temperature is None:
-                return False
-            if lib.supplies is None or lib.supplies.VDD is None:
-                return False
-            lib_temperature = TemperatureValue(str(lib.corner.temperature))
-            lib_VDD = VoltageValue(str(lib.supplies.VDD))
-            if lib_temperature == temp:
-                if lib_VDD == voltage:
-                    return True
-                else:
-                    return False
-            else:
-                return False
+            return self.library_mmmc_corner_key(lib) == corner_key
         return extraction_func
 
+    def get_mmmc_library_table(self) -> Dict[Tuple[float, float], List[hammer_tech.Library]]:
+        """
+        Build a table of all available libraries keyed by their operating conditions (see mmmc_corner_key).
+        Libraries without corner and supply annotations are not included.
+
+        :return: Map of (voltage, temperature) key -> libraries with those conditions.
+        """
+        table = {}  # type: Dict[Tuple[float, float], List[hammer_tech.Library]]
+        for lib in self.technology.get_available_libraries():
+            key = self.library_mmmc_corner_key(lib)
+            if key is not None:
+                table.setdefault(key, []).append(lib)
+        return table
+
+    def read_libs_for_mmmc_corners(self, corners: List[MMMCCorner], library_types: Iterable[LibraryFilter],
+                                   output_func: Callable[[str, LibraryFilter], List[str]],
+                                   must_exist: bool = True) -> List[List[str]]:
+        """
+        Read the given libraries for several MMMC corners at once.
+        The available libraries are bucketed by operating conditions once, and corners sharing the
+        same conditions (e.g. a setup and a hold corner) are only processed once.
+
+        :param corners: Corners to read libraries for.
+        :param library_types: List of libraries to filter, specified as a list of LibraryFilter elements.
+        :param output_func: Function which processes the outputs (see HammerTechnology.read_libs).
+        :param must_exist: Must each library item actually exist? Default: True (yes, they must exist)
+        :return: List of read_libs results, one per corner in the order given.
+        """
+        library_types = list(library_types)
+        table = self.get_mmmc_library_table()
+        results = {}  # type: Dict[Tuple[float, float], List[str]]
+        output = []  # type: List[List[str]]
+        for corner in corners:
+            key = self.mmmc_corner_key(corner.voltage, corner.temp)
+            if key not in results:
+                results[key] = self.technology.read_libs(library_types, output_func, must_exist=must_exist,
+                                                         libraries=table.get(key, []))
+            output.append(list(results[key]))
+        return output
+
     @staticmethod
     def replace_tcl_set(variable: str, value: str, tcl_path: str, quotes: bool = True) -> None:
         """
@@ -832,12 +1212,37 @@ class HammerTool(metaclass=ABCMeta):
 
         :param args: Command-line to run; each item in the list is one token. The first token should be the command to run.
         :param cwd: Working directory (leave as None to use the current working directory).
+        :return: Output from the command or an error message.
+                 Only the end of long outputs is returned (see vlsi.submit.output_tail_bytes);
+                 the whole output is in a log file in the run_dir.
+        """
+
+        return self._output_logging_submit_command().submit(args, self._subprocess_env, self.logger, cwd)
+
+    async def run_executable_async(self, args: List[str], cwd: str = None, timeout: Optional[float] = None) -> str:
+        """
+        Run an executable like run_executable, but as a coroutine so that several can run concurrently
+        (see HammerSubmitCommand.submit_async).
+
+        :param args: Command-line to run; each item in the list is one token. The first token should be the command to run.
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :param timeout: Time in seconds after which to terminate the executable (leave as None to wait forever).
         :return: Output from the command or an error message.
         """
+        return await self._output_logging_submit_command().submit_async(args, self._subprocess_env, self.logger,
+                                                                         cwd, timeout)
 
-        return self.submit_command.submit(args, self._subprocess_env, self.logger, cwd)
+    def _output_logging_submit_command(self) -> HammerSubmitCommand:
+        """
+        Get the submit command, with the output logs of commands going to the run_dir unless vlsi.submit.log_dir is set.
+        """
+        submit_command = self.submit_command
+        if submit_command.log_dir is None:
+            submit_command.log_dir = self.run_dir
+        return submit_command
 
     # TODO: these helper functions might get a bit out of hand, put them somewhere more organized?
+    @cached_by_database
     def get_clock_ports(self) -> List[ClockPort]:
         """
         Get the clock ports of the top-level module, as specified in vlsi.inputs.clocks.
@@ -865,6 +1270,7 @@ class HammerTool(metaclass=ABCMeta):
             output.append(clock)
         return output
 
+    @cached_by_database
     def get_all_supplies(self, key: str) -> List[Supply]:
         supplies = self.get_setting(key)
         output = []  # type: List[Supply]
@@ -899,27 +1305,50 @@ class HammerTool(metaclass=ABCMeta):
             self.logger.error("Invalid bumps_mode:{m}, only empty or manual supported. Assuming empty.".format(
                 m=bumps_mode))
             return None
-        assignments = []  # type: List[BumpAssignment]
+        raw_assignments = []  # type: List[BumpAssignment]
         for raw_assign in self.get_setting("vlsi.inputs.bumps.assignments"):
             name = None if not "name" in raw_assign else raw_assign["name"]
             no_con = False if not "no_connect" in raw_assign else raw_assign["no_connect"]
-            x = raw_assign["x"]
-            y = raw_assign["y"]
+            x = Decimal(str(raw_assign["x"]))
+            y = Decimal(str(raw_assign["y"]))
             cell = None if not "custom_cell" in raw_assign else raw_assign["custom_cell"]
-            if name is None and not no_con:
+            raw_assignments.append(BumpAssignment(name=name, no_connect=no_con, x=x, y=y, custom_cell=cell))
+        try:
+            assignments_file = self.get_setting("vlsi.inputs.bumps.assignments_file")  # type: Optional[str]
+        except KeyError:
+            assignments_file = None
+        if assignments_file is not None:
+            raw_assignments.extend(read_bump_map_csv(assignments_file))
+
+        assignments = BumpAssignments(x=self.get_setting("vlsi.inputs.bumps.x"), y=self.get_setting("vlsi.inputs.bumps.y"))
+        duplicates = []  # type: List[str]
+        for assign in raw_assignments:
+            if assign.name is None and not assign.no_connect:
                 self.logger.warning("Invalid bump assignment, neither name nor no_connect specified for bump {x},{y}. Assuming it should be unassigned".format(
-                    x=x, y=y))
-            else:
-                assignments.append(BumpAssignment(name=name, no_connect=no_con,
-                    x=x, y=y, custom_cell=cell))
+                    x=assign.x, y=assign.y))
+                continue
+            try:
+                if assignments.add(assign):
+                    duplicates.append("{x},{y}".format(x=assign.x, y=assign.y))
+            except ValueError as e:
+                self.logger.warning("Invalid bump assignment: {e}. Ignoring it.".format(e=e))
+        if len(duplicates) > 0:
+            self.logger.warning("{n} bumps are assigned more than once (e.g. {e}). Using the last assignment for each bump.".format(
+                n=len(duplicates), e=", ".join(duplicates[:5])))
         return BumpsDefinition(x=self.get_setting("vlsi.inputs.bumps.x"),
             y=self.get_setting("vlsi.inputs.bumps.y"),
             pitch=self.get_setting("vlsi.inputs.bumps.pitch"),
             cell=self.get_setting("vlsi.inputs.bumps.cell"), assignments=assignments)
 
-    def get_pin_assignments(self) -> List[PinAssignment]:
+    def get_pin_assignments(self, ports: Optional[Iterable[str]] = None) -> List[PinAssignment]:
         """
         Get a list of pin assignments in accordance with settings in the Hammer IR.
+        All assignments are validated in one pass against the stackup.
+        If the top-level ports are known (either given here or in vlsi.inputs.pin.ports), pin patterns
+        are expanded against them and ports with identical placements are merged into a single assignment.
+        Otherwise, the patterns are left for the CAD tool to expand and only duplicate assignments are removed.
+
+        :param ports: Optional list of top-level port names to expand the pin patterns against.
         :return: A potentially empty list of PinAssigments.
         """
         pin_mode = str(self.get_setting("vlsi.inputs.pin_mode"))  # type: str
@@ -932,12 +1361,22 @@ class HammerTool(metaclass=ABCMeta):
                 "Invalid pin_mode {mode}. Using none pin mode.".format(mode=pin_mode))
             return []
 
+        # Preferred routing directions for each side.
+        side_directions = {
+            "top": RoutingDirection.Vertical,
+            "bottom": RoutingDirection.Vertical,
+            "left": RoutingDirection.Horizontal,
+            "right": RoutingDirection.Horizontal
+        }  # type: Dict[str, RoutingDirection]
+        # Layer directions, looked up from the stackup once.
+        layer_directions = None  # type: Optional[Dict[str, RoutingDirection]]
+
         # Generated pin mode needs to ingest the assignments
         assigns = []  # type: List[PinAssignment]
         for raw_assign in self.get_setting("vlsi.inputs.pin.assignments"):
             pins = str(raw_assign["pins"])  # type: str
             side = None if not "side" in raw_assign else raw_assign["side"]
-            if not (side is None or side == "top" or side == "bottom" or side == "right" or side == "left") :
+            if not (side is None or side in side_directions):
                 self.logger.warning("Pins {p} have invalid side {s}. Assuming pins will be handled by CAD tool.".format(p=pins, s=side))
                 continue
             preplaced = raw_assign.get("preplaced", False)
@@ -952,16 +1391,98 @@ class HammerTool(metaclass=ABCMeta):
                     self.logger.warning("Pins {p} assigned without layers or side. Assuming pins will be handled by CAD tool.".format(p=pins))
                     # No pin appended
                     continue
-            stackup = self.get_stackup()
-            for layer in layers:
-                direction = stackup.get_metal(layer).direction
-                is_horizontal = direction == RoutingDirection.Horizontal and (side == "left" or side == "right")
-                is_vertical = direction == RoutingDirection.Vertical and (side == "top" or side == "bottom")
-                is_redis = direction == RoutingDirection.Redistribution
-                if not (is_horizontal or is_vertical or is_redis):
+            if len(layers) > 0:
+                if layer_directions is None:
+                    stackup = self.get_stackup()
+                    layer_directions = {metal.name: metal.direction for metal in stackup.metals}
+                for layer in layers:
+                    if layer not in layer_directions:
+                        # Raises a ValueError for the missing layer.
+                        stackup.get_metal(layer)
+                if side is not None and not all(layer_directions[layer] in (side_directions[side], RoutingDirection.Redistribution)
+                                                for layer in layers):
                     self.logger.error("Pins {p} assigned layers {l} that do not match the direction of their side {s}. This is very likely to cause issues.".format(p=pins, l=layers, s=side))
             assigns.append(PinAssignment(pins=pins, side=side, layers=layers, preplaced=preplaced))
-        return assigns
+
+        if ports is None:
+            try:
+                ports = self.get_setting("vlsi.inputs.pin.ports", nullvalue=[])
+            except KeyError:
+                ports = []
+        port_list = list(ports)  # type: List[str]
+        if len(port_list) == 0:
+            return self._dedup_pin_assignments(assigns)
+        else:
+            return self._expand_pin_assignments(assigns, port_list)
+
+    @staticmethod
+    def _pin_assignment_key(assign: PinAssignment) -> Tuple[Optional[str], Tuple[str, ...], bool]:
+        """Get a hashable key for the placement (side, layers, preplaced) of a pin assignment."""
+        return assign.side, tuple(get_or_else(assign.layers, [])), bool(assign.preplaced)
+
+    def _dedup_pin_assignments(self, assigns: List[PinAssignment]) -> List[PinAssignment]:
+        """
+        Remove duplicate pin assignments (same pins and placement), keeping the last
+        occurrence of each since later assignments take precedence in the CAD tool.
+
+        :param assigns: Validated pin assignments.
+        :return: Pin assignments without duplicates.
+        """
+        unique = OrderedDict()  # type: OrderedDict[Tuple[str, Tuple[Optional[str], Tuple[str, ...], bool]], PinAssignment]
+        for assign in assigns:
+            key = (assign.pins, self._pin_assignment_key(assign))
+            unique.pop(key, None)
+            unique[key] = assign
+        return list(unique.values())
+
+    def _expand_pin_assignments(self, assigns: List[PinAssignment], ports: List[str]) -> List[PinAssignment]:
+        """
+        Expand the pin patterns of the given assignments against a list of top-level ports.
+        Only * and ? are wildcards, so bus bits like "data[3]" are matched literally.
+        Patterns which match no port (e.g. a bus "data" or range "data[3:0]" which only the CAD tool resolves)
+        are reported and passed through unchanged.
+        Ports assigned more than once with different placements are reported and take the last placement.
+        Ports with the same placement are merged into a single assignment (with space-separated pins).
+
+        :param assigns: Validated pin assignments.
+        :param ports: Top-level port names.
+        :return: Compact list of pin assignments, one per distinct placement.
+        """
+        port_set = set(ports)
+        placements = OrderedDict()  # type: OrderedDict[str, Tuple[Optional[str], Tuple[str, ...], bool]]
+        conflicts = []  # type: List[str]
+        for assign in assigns:
+            key = self._pin_assignment_key(assign)
+            matched = []  # type: List[str]
+            for pattern in assign.pins.split():
+                if "*" in pattern or "?" in pattern:
+                    regex = re.compile(re.escape(pattern).replace(r"\*", ".*").replace(r"\?", ".") + "$")
+                    pattern_ports = [port for port in ports if regex.match(port)]
+                elif pattern in port_set:
+                    pattern_ports = [pattern]
+                else:
+                    pattern_ports = []
+                if len(pattern_ports) == 0:
+                    self.logger.warning("Pins {p} do not match any top-level port. Passing them to the CAD tool unchanged.".format(
+                        p=pattern))
+                    pattern_ports = [pattern]
+                matched.extend(pattern_ports)
+            for port in matched:
+                previous = placements.get(port)
+                if previous is not None and previous != key:
+                    conflicts.append(port)
+                placements[port] = key
+
+        if len(conflicts) > 0:
+            unique_conflicts = list(OrderedDict.fromkeys(conflicts))
+            self.logger.warning("{n} pins have conflicting assignments (e.g. {e}). Using the last assignment for each pin.".format(
+                n=len(unique_conflicts), e=", ".join(unique_conflicts[:5])))
+
+        groups = OrderedDict()  # type: OrderedDict[Tuple[Optional[str], Tuple[str, ...], bool], List[str]]
+        for port, key in placements.items():
+            groups.setdefault(key, []).append(port)
+        return [PinAssignment(pins=" ".join(group_ports), side=side, layers=list(layers), preplaced=preplaced)
+                for (side, layers, preplaced), group_ports in groups.items()]
 
     def get_gds_map_file(self) -> Optional[str]:
         """
@@ -996,6 +1517,7 @@ class HammerTool(metaclass=ABCMeta):
 
         return map_file
 
+    @cached_by_database
     def get_dont_use_list(self) -> List[str]:
         """
         Get a "don't use" list in accordance with settings in the Hammer IR.
@@ -1027,6 +1549,7 @@ class HammerTool(metaclass=ABCMeta):
 
         return dont_use_list
 
+    @cached_by_database
     def get_placement_constraints(self) -> List[PlacementConstraint]:
         """
         Get a list of placement constraints as specified in the config.
@@ -1035,6 +1558,7 @@ class HammerTool(metaclass=ABCMeta):
         assert isinstance(constraints, list)
         return list(map(PlacementConstraint.from_dict, constraints))
 
+    @cached_by_database
     def get_mmmc_corners(self) -> List[MMMCCorner]:
         """
         Get a list of MMMC corners as specified in the config.
@@ -1052,13 +1576,14 @@ class HammerTool(metaclass=ABCMeta):
             output.append(corn)
         return output
 
+    @cached_by_database
     def get_stackup(self) -> Stackup:
         """
         Get the stackup provided by the technology key
         """
-        # TODO how does python cache this? Do we need to avoid re-processing this every time?
         return self.technology.get_stackup_by_name(self.get_setting("technology.core.stackup"))
 
+    @cached_by_database
     def get_input_ilms(self) -> List[ILMStruct]:
         """
         Get a list of input ILM modules for hierarchical mode.
@@ -1067,6 +1592,7 @@ class HammerTool(metaclass=ABCMeta):
         assert isinstance(ilms, list)
         return list(map(ILMStruct.from_setting, ilms))
 
+    @cached_by_database
     def get_output_load_constraints(self) -> List[OutputLoadConstraint]:
         """
         Get a list of output load constraints as specified in the config.
@@ -1086,9 +1612,17 @@ class HammerTool(metaclass=ABCMeta):
         Get a list of input and output delay constraints as specified in
         the config.
         """
+        return list(self.get_delay_constraints_with_array()[0])
+
+    @cached_by_database
+    def get_delay_constraints_with_array(self) -> Tuple[List[DelayConstraint], TimeValueArray]:
+        """
+        Get a list of input and output delay constraints as specified in
+        the config, along with an array of their delays in the same order.
+        The result is shared between callers, so do not modify it.
+        """
         delays = self.get_setting("vlsi.inputs.delays")  # type: List[dict]
-        output = list(map(DelayConstraint.from_dict, delays))  # type: List[DelayConstraint]
-        return output
+        return DelayConstraint.from_dicts_with_array(delays)
 
     @staticmethod
     def append_contents_to_path(content_to_append: str, target_path: str) -> None:
@@ -7,21 +7,28 @@
 #  See LICENSE for licence details.
 
 from abc import abstractmethod
+from collections import OrderedDict
 from enum import Enum
 from functools import reduce
 import importlib
+import io
 from numbers import Number
 import os
 import sys
 import json
-from typing import Callable, Iterable, List, NamedTuple, Optional, Dict, Any, Union
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Dict, Any, TextIO, Tuple, Union
 from decimal import Decimal
 
 import hammer_config
-from hammer_utils import reverse_dict, deepdict, optional_map, get_or_else, add_dicts, coerce_to_grid
-from hammer_tech import Library, ExtraLibrary
+from hammer_utils import reverse_dict, deepdict, optional_map, get_or_else, add_dicts, coerce_to_grid, to_grid_units, \
+    in_place_unique
+from hammer_tech import ExtraLibrary, Metal
 
 from .constraints import *
+from .placement_index import PlacementConstraintIndex
+from .ir_drop import CurrentRegion, estimate_ir_drop, IRDropResult
+from .power_straps import by_tracks_strap_dimensions, compute_power_strap_geometry, PowerStrapGeometry, PowerStrapGroup, \
+    PowerStrapSweepResult, PowerStrapSweepRow
 from .units import VoltageValue
 
 
@@ -115,7 +122,7 @@ class HammerVLSISettings:
         database.update_core(hammer_config.load_config_from_defaults(cls.hammer_vlsi_path, strict=True))
 
 
-from .hammer_tool import HammerTool, HammerToolStep
+from .hammer_tool import HammerTool, HammerToolStep, cached_by_database
 
 class DummyHammerTool(HammerTool):
     """
@@ -204,6 +211,8 @@ class HammerSRAMGeneratorTool(HammerTool):
             simple_ex.append(new_ex)
         outputs["vlsi.technology.extra_libraries"] = simple_ex
         outputs["vlsi.technology.extra_libraries_meta"] = "append"
+        outputs["sram_generator.outputs.step_timings"] = self.step_timings_output()
+        outputs["sram_generator.outputs.process_telemetry"] = self.process_telemetry_output()
         return outputs
 
     #TODO: Is this the right way for these two generate_all methods to work
@@ -233,6 +242,8 @@ class HammerSynthesisTool(HammerTool):
         outputs["synthesis.outputs.output_files"] = self.output_files
         outputs["synthesis.inputs.input_files"] = self.input_files
         outputs["synthesis.inputs.top_module"] = self.top_module
+        outputs["synthesis.outputs.step_timings"] = self.step_timings_output()
+        outputs["synthesis.outputs.process_telemetry"] = self.process_telemetry_output()
         return outputs
 
     ### Generated interface HammerSynthesisTool ###
@@ -309,6 +320,28 @@ class HammerPlaceAndRouteTool(HammerTool):
     def fill_outputs(self) -> bool:
         pass
 
+    def check_placement_constraints(self) -> bool:
+        """
+        Check the placement constraints for overlaps, placements outside of the top-level
+        and obstruction conflicts before running place and route.
+        Controlled by par.placement_constraints_check.
+
+        :return: False if problems were found and the check is set to error, True otherwise.
+        """
+        mode = str(self.get_setting("par.placement_constraints_check"))
+        if mode == "none":
+            return True
+        elif mode not in ("warning", "error"):
+            self.logger.error("Invalid placement_constraints_check {mode}. Assuming warning.".format(mode=mode))
+            mode = "warning"
+        problems = PlacementConstraintIndex(self.get_placement_constraints()).check()
+        for problem in problems:
+            if mode == "error":
+                self.logger.error(problem)
+            else:
+                self.logger.warning(problem)
+        return mode != "error" or len(problems) == 0
+
     def export_config_outputs(self) -> Dict[str, Any]:
         outputs = deepdict(super().export_config_outputs())
         outputs["par.outputs.output_ilms"] = list(map(lambda s: s.to_setting(), self.output_ilms))
@@ -316,6 +349,8 @@ class HammerPlaceAndRouteTool(HammerTool):
         outputs["par.outputs.output_gds"] = str(self.output_gds)
         outputs["par.outputs.output_netlist"] = str(self.output_netlist)
         outputs["par.outputs.hcells_list"] = list(self.hcells_list)
+        outputs["par.outputs.step_timings"] = self.step_timings_output()
+        outputs["par.outputs.process_telemetry"] = self.process_telemetry_output()
         return outputs
 
     ### Generated interface HammerPlaceAndRouteTool ###
@@ -479,18 +514,179 @@ class HammerPlaceAndRouteTool(HammerTool):
             namespace = "par.generate_power_straps_options.by_tracks"
             layers = self.get_setting("{}.strap_layers".format(namespace))
             pin_layers = self.get_setting("{}.pin_layers".format(namespace))
-            ground_net_names = list(map(lambda x: x.name, self.get_independent_ground_nets()))  # type: List[str]
-            power_net_names = list(map(lambda x: x.name, self.get_independent_power_nets()))  # type: List[str]
-            def get_weight(s: Supply) -> int:
-                # Check that it's not None
-                assert isinstance(s.weight, int)
-                return s.weight
-            weights = list(map(get_weight, self.get_independent_power_nets()))  # type: List[int]
-            assert len(ground_net_names) == 1, "FIXME, I am assuming there's only 1 ground net"
-            return self.specify_all_power_straps_by_tracks(layers, ground_net_names[0], power_net_names, weights, bbox, pin_layers)
+            ground_net, power_net_names, weights = self._get_power_strap_nets()
+            return self.specify_all_power_straps_by_tracks(layers, ground_net, power_net_names, weights, bbox, pin_layers)
         else:
             raise NotImplementedError("Power strap generation method %s is not implemented" % method)
 
+    def _get_power_strap_nets(self) -> Tuple[str, List[str], List[int]]:
+        """
+        Get the nets to build power straps for.
+
+        :return: Tuple of (ground net name, power net names, power net weights).
+        """
+        ground_net_names = list(map(lambda x: x.name, self.get_independent_ground_nets()))  # type: List[str]
+        power_net_names = list(map(lambda x: x.name, self.get_independent_power_nets()))  # type: List[str]
+        def get_weight(s: Supply) -> int:
+            # Check that it's not None
+            assert isinstance(s.weight, int)
+            return s.weight
+        weights = list(map(get_weight, self.get_independent_power_nets()))  # type: List[int]
+        assert len(ground_net_names) == 1, "FIXME, I am assuming there's only 1 ground net"
+        return ground_net_names[0], power_net_names, weights
+
+    @cached_by_database
+    def get_power_strap_groups(self) -> Tuple[PowerStrapGroup, ...]:
+        """
+        Get the power strap groups that the by_tracks method would generate, in integer grid units.
+        These are the same parameters that are passed to specify_power_straps.
+
+        :return: Power strap groups, bottom layer first.
+        """
+        namespace = "par.generate_power_straps_options.by_tracks"
+        layers = self.get_setting("{}.strap_layers".format(namespace))
+        return self._power_strap_groups(layers, self._get_power_strap_nets())
+
+    def _power_strap_groups(self, layers: List[str], nets: Tuple[str, List[str], List[int]],
+                            get_setting: Optional[Callable[[str, str], Any]] = None) -> Tuple[PowerStrapGroup, ...]:
+        ground_net, power_net_names, weights = nets
+        groups = []  # type: List[PowerStrapGroup]
+        for layer, last, blockage_spacing, track_pitch, track_width, track_spacing, track_start, track_offset, strap_nets, layer_is_all_power in \
+                self._by_tracks_power_strap_groups(layers, ground_net, power_net_names, weights, get_setting):
+            grid = layer.grid
+            pitch, width, spacing, offset = by_tracks_strap_dimensions(grid, track_pitch, track_width, track_spacing, track_start,
+                                                                       layer.to_grid_units(track_offset), layer_is_all_power)
+            groups.append(PowerStrapGroup(grid=grid, direction=layer.direction, pitch=pitch, width=width, spacing=spacing,
+                                          offset=offset, nets=tuple(strap_nets)))
+        return tuple(groups)
+
+    def sweep_power_straps(self, configs: Iterable[Dict[str, Any]]) -> List[PowerStrapSweepResult]:
+        """
+        Evaluate many by_tracks power strap configurations in one call.
+        The by_tracks settings are read once, and each configuration is applied on top of them like a
+        project config would be. Configurations may also override strap_layers.
+        Strap dimensions are shared between configurations which have the same settings on a layer.
+
+        :param configs: Configurations, each a dict of par.generate_power_straps_options.by_tracks keys without the
+                        namespace (e.g. {"track_width": 4, "power_utilization_M8": 0.5}).
+        :return: One result per configuration, in order.
+        """
+        namespace = "par.generate_power_straps_options.by_tracks"
+        configs = list(configs)
+        nets = self._get_power_strap_nets()
+        sum_weights = sum(nets[2])
+        base = {"strap_layers": self.get_setting("{}.strap_layers".format(namespace))}  # type: Dict[str, Any]
+        layer_names = set(base["strap_layers"])
+        for config in configs:
+            layer_names.update(config.get("strap_layers", []))
+        for key in ("blockage_spacing", "track_width", "track_spacing", "track_start", "power_utilization"):
+            for name in [key] + ["{key}_{layer}".format(key=key, layer=layer) for layer in sorted(layer_names)]:
+                try:
+                    base[name] = self.get_setting("{ns}.{name}".format(ns=namespace, name=name))
+                except KeyError:
+                    pass
+
+        results = []  # type: List[PowerStrapSweepResult]
+        for config in configs:
+            settings = dict(base)
+            settings.update(config)
+
+            def get_setting(key: str, layer_name: str) -> Any:
+                override = "{key}_{layer}".format(key=key, layer=layer_name)
+                if override in settings:
+                    return settings[override]
+                elif key in settings:
+                    return settings[key]
+                raise ValueError("No value set for key {ns}.{key}".format(ns=namespace, key=key))
+
+            try:
+                groups = self._power_strap_groups(list(settings["strap_layers"]), nets, get_setting)
+            except ValueError as e:
+                results.append(PowerStrapSweepResult(config=config, groups=(), rows=[], error=str(e)))
+                continue
+            rows = []  # type: List[PowerStrapSweepRow]
+            for group in groups:
+                if len(rows) > 0 and rows[-1].layer == group.layer:
+                    continue
+                metal = self.get_stackup().get_metal(group.layer)
+                track_width = int(get_setting("track_width", group.layer))
+                track_spacing = int(get_setting("track_spacing", group.layer))
+                track_pitch = self._get_by_tracks_track_pitch(group.layer, get_setting)
+                rows.append(PowerStrapSweepRow(
+                    layer=group.layer,
+                    track_pitch=track_pitch,
+                    pitch=metal.from_grid_units(group.pitch),
+                    width=metal.from_grid_units(group.width),
+                    spacing=metal.from_grid_units(group.spacing),
+                    offset=metal.from_grid_units(group.offset),
+                    track_utilization=(2 * track_width + track_spacing) / track_pitch,
+                    utilization=len(group.nets) * sum_weights * group.width / group.pitch
+                ))
+            results.append(PowerStrapSweepResult(config=config, groups=groups, rows=rows, error=None))
+        return results
+
+    def get_power_strap_geometry(self, bbox: Optional[List[Decimal]] = None) -> PowerStrapGeometry:
+        """
+        Get the concrete power strap rectangles that the by_tracks method would generate.
+        The result is cached per set of power strap groups and bbox, so it is cheap to call repeatedly.
+
+        :param bbox: The optional (left, bottom, right, top) bounding box of the area to generate straps.
+                     By default the core area (the top-level placement constraint inside its margins) is used.
+        :return: Power strap geometry, in integer grid units of the stackup.
+        """
+        groups = self.get_power_strap_groups()
+        grid_unit = self.get_stackup().grid_unit
+        if bbox is None:
+            toplevel = [c for c in self.get_placement_constraints() if c.type == PlacementConstraintType.TopLevel]
+            if len(toplevel) == 0:
+                raise ValueError("No bbox given and no toplevel placement constraint to take the core area from")
+            top = toplevel[0]
+            margins = top.margins if top.margins is not None else Margins(0, 0, 0, 0)
+            bbox = [Decimal(str(top.x + margins.left)), Decimal(str(top.y + margins.bottom)),
+                    Decimal(str(top.x + top.width - margins.right)), Decimal(str(top.y + top.height - margins.top))]
+        if len(bbox) != 4:
+            raise ValueError("Power strap geometry needs a (left, bottom, right, top) bbox, got {bbox}".format(bbox=bbox))
+        grid_bbox = tuple(to_grid_units(x, grid_unit) for x in bbox)
+        return compute_power_strap_geometry(groups, (grid_bbox[0], grid_bbox[1], grid_bbox[2], grid_bbox[3]))
+
+    def estimate_ir_drop(self, bbox: Optional[List[Decimal]] = None) -> Dict[str, IRDropResult]:
+        """
+        Quick-look static IR drop estimate of the power straps generated by the by_tracks method.
+        See estimate_ir_drop in hammer_vlsi.ir_drop for the model. Parameters are read from par.ir_drop_estimate.
+        Each net draws the configured current density.
+
+        :param bbox: The optional (left, bottom, right, top) bounding box of the area to generate straps.
+                     By default the core area is used (see get_power_strap_geometry).
+        :return: Dict of net name to estimate, ground net first.
+        """
+        namespace = "par.ir_drop_estimate"
+        geometry = self.get_power_strap_geometry(bbox)
+        sheet_resistance = {name: float(self._get_metal_setting(namespace, "sheet_resistance", name))
+                            for name in geometry.layers}  # type: Dict[str, float]
+        source_layers = self.get_setting("{}.source_layers".format(namespace))  # type: Optional[List[str]]
+        if source_layers is None:
+            pin_layers = self.get_setting("par.generate_power_straps_options.by_tracks.pin_layers")
+            source_layers = list(pin_layers) if len(pin_layers) > 0 else None
+        regions = list(map(CurrentRegion.from_dict, self.get_setting("{}.regions".format(namespace))))
+        ground_net, power_nets, _ = self._get_power_strap_nets()
+
+        results = OrderedDict()  # type: Dict[str, IRDropResult]
+        for net in [ground_net] + power_nets:
+            result = estimate_ir_drop(geometry, net, self.get_stackup().grid_unit, sheet_resistance,
+                                      via_resistance=float(self.get_setting("{}.via_resistance".format(namespace))),
+                                      current_density=float(self.get_setting("{}.current_density".format(namespace))),
+                                      regions=regions, source_layers=source_layers)
+            self.logger.info("Estimated IR drop on {net}: worst {drop:.2f} mV at ({x:.3f}, {y:.3f}), {current:.4g} A".format(
+                net=net, drop=result.worst_drop * 1000, x=result.worst_location[0], y=result.worst_location[1],
+                current=result.total_current))
+            if result.unconnected_current > 0:
+                self.logger.warning("{current:.4g} A of {net} is drawn at straps with no path to a supply".format(
+                    current=result.unconnected_current, net=net))
+            if not result.converged:
+                self.logger.warning("IR drop estimate of {net} did not converge".format(net=net))
+            results[net] = result
+        return results
+
     def specify_power_straps_by_tracks(self, layer_name: str, bottom_via_layer: str, blockage_spacing: Decimal, track_pitch: int, track_width: int, track_spacing: int, track_start: int, track_offset: Decimal, bbox: Optional[List[Decimal]], nets: List[str], add_pins: bool, layer_is_all_power: bool) -> List[str]:
         """
         Generate a list of TCL commands that will create power straps on a given layer by specifying the desired track consumption.
@@ -509,28 +705,13 @@ class HammerPlaceAndRouteTool(HammerTool):
         :param layer_is_all_power: True if there will be no signal wires on this layer.
         :return: A list of TCL commands that will generate power straps.
         """
-        # Note: even track_widths will be snapped to a half-track
         layer = self.get_stackup().get_metal(layer_name)
-        pitch = track_pitch * layer.pitch
-        width = Decimal(0)
-        spacing = Decimal(0)
-        strap_offset = Decimal(0)
-        if track_spacing == 0:
-            # An all-power (100% utilization) layer results in us wanting to do a uniform strap pattern, so we can just calculate the
-            # maximum width and minimum spacing from the desired pitch, instead of using TWWT.
-            if layer_is_all_power:
-                one_strap_pitch = track_width * layer.pitch
-                spacing, width = layer.min_spacing_and_max_width_from_pitch(one_strap_pitch)
-                strap_start = spacing / 2 + layer.offset
-            else:
-                width, spacing, strap_start = layer.get_width_spacing_start_twwt(track_width, force_even=True)
-        else:
-            width, spacing, strap_start = layer.get_width_spacing_start_twt(track_width)
-            spacing = 2*spacing + (track_spacing - 1) * layer.pitch + layer.min_width
-        offset = track_offset + track_start * layer.pitch + strap_start
-        assert width > Decimal(0), "Width must be greater than zero. You probably have a malformed tech plugin on layer {}.".format(layer_name)
-        assert spacing > Decimal(0), "Spacing must be greater than zero. You probably have a malformed tech plugin on layer {}.".format(layer_name)
-        return self.specify_power_straps(layer_name, bottom_via_layer, blockage_spacing, pitch, width, spacing, offset, bbox, nets, add_pins)
+        # All the calculations are done in integer grid units.
+        pitch, width, spacing, offset = by_tracks_strap_dimensions(layer.grid, track_pitch, track_width, track_spacing, track_start,
+                                                                   layer.to_grid_units(track_offset), layer_is_all_power)
+        return self.specify_power_straps(layer_name, bottom_via_layer, blockage_spacing, layer.from_grid_units(pitch),
+                                         layer.from_grid_units(width), layer.from_grid_units(spacing),
+                                         layer.from_grid_units(offset), bbox, nets, add_pins)
 
     def specify_all_power_straps_by_tracks(self, layer_names: List[str], ground_net: str, power_nets: List[str], power_weights: List[int], bbox: Optional[List[Decimal]], pin_layers: List[str]) -> List[str]:
         """
@@ -558,22 +739,41 @@ class HammerPlaceAndRouteTool(HammerTool):
 
         # TODO does the CPF help this, or do we need to be more explicit about the bbox for each domain
         output = self.specify_std_cell_power_straps(bbox, [ground_net] + power_nets)
+        for layer, last, blockage_spacing, track_pitch, track_width, track_spacing, track_start, track_offset, nets, layer_is_all_power in \
+                self._by_tracks_power_strap_groups(layer_names, ground_net, power_nets, power_weights):
+            add_pins = layer.name in pin_layers
+            output.extend(self.specify_power_straps_by_tracks(layer.name, last.name, blockage_spacing, track_pitch, track_width, track_spacing, track_start, track_offset, bbox, nets, add_pins, layer_is_all_power))
+        return output
+
+    def _by_tracks_power_strap_groups(self, layer_names: List[str], ground_net: str, power_nets: List[str], power_weights: List[int],
+                                      get_setting: Optional[Callable[[str, str], Any]] = None) -> Iterator[Tuple[Metal, Metal, Decimal, int, int, int, int, Decimal, List[str], bool]]:
+        """
+        Read the by_tracks settings for each layer and split each layer into one group of straps per power net.
+        See specify_all_power_straps_by_tracks for the parameters.
+
+        :param get_setting: Function of (key, layer name) to read the by_tracks settings with. Defaults to _get_by_tracks_metal_setting.
+
+        :return: Iterator of (layer, bottom via layer, blockage_spacing, track_pitch, track_width, track_spacing,
+                 track_start, track_offset, nets, layer_is_all_power) as passed to specify_power_straps_by_tracks.
+        """
+        if get_setting is None:
+            get_setting = self._get_by_tracks_metal_setting
         bottom_via_layer = self.get_setting("technology.core.std_cell_rail_layer")
         last = self.get_stackup().get_metal(bottom_via_layer)
         for layer_name in layer_names:
             layer = self.get_stackup().get_metal(layer_name)
-            assert layer.index > last.index, "Must build power straps bottom-up"
+            if layer.index <= last.index:
+                raise ValueError("Must build power straps bottom-up, but {b} is not above {a}.".format(a=last.name, b=layer.name))
             if last.direction == layer.direction:
                 raise ValueError("Layers {a} and {b} run in the same direction, but have no power straps between them.".format(a=last.name, b=layer.name))
 
-            blockage_spacing = coerce_to_grid(float(self._get_by_tracks_metal_setting("blockage_spacing", layer_name)), layer.grid_unit)
-            track_width = int(self._get_by_tracks_metal_setting("track_width", layer_name))
-            track_spacing = int(self._get_by_tracks_metal_setting("track_spacing", layer_name))
-            track_start = int(self._get_by_tracks_metal_setting("track_start", layer_name))
-            track_pitch = self._get_by_tracks_track_pitch(layer_name)
+            blockage_spacing = coerce_to_grid(float(get_setting("blockage_spacing", layer_name)), layer.grid_unit)
+            track_width = int(get_setting("track_width", layer_name))
+            track_spacing = int(get_setting("track_spacing", layer_name))
+            track_start = int(get_setting("track_start", layer_name))
+            track_pitch = self._get_by_tracks_track_pitch(layer_name, get_setting)
             offset = layer.offset # TODO this is relaxable if we can auto-recalculate this based on hierarchical setting
 
-            add_pins = layer_name in pin_layers
             # For multiple domains, we'll stripe them like this:
             # 2:1 :   A A B A A B ...
             # 3:1 :   A A A B A A A B ...
@@ -586,9 +786,8 @@ class HammerPlaceAndRouteTool(HammerTool):
                 nets = [ground_net, power_nets[i]]
                 group_offset = offset + track_pitch * i * layer.pitch
                 group_pitch = sum_weights * track_pitch
-                output.extend(self.specify_power_straps_by_tracks(layer_name, last.name, blockage_spacing, group_pitch, track_width, track_spacing, track_start, group_offset, bbox, nets, add_pins, layer_is_all_power))
+                yield (layer, last, blockage_spacing, group_pitch, track_width, track_spacing, track_start, group_offset, nets, layer_is_all_power)
             last = layer
-        return output
 
     _power_straps_last_index = -1
 
@@ -606,7 +805,19 @@ class HammerPlaceAndRouteTool(HammerTool):
         :param key: The base key name (e.g. track_spacing). Do not include the namespace or metal override.
         :return: The value associated with the key, after applying any metal overrides
         """
-        default = "par.generate_power_straps_options.by_tracks." + key
+        return self._get_metal_setting("par.generate_power_straps_options.by_tracks", key, layer_name)
+
+    def _get_metal_setting(self, namespace: str, key: str, layer_name: str) -> Any:
+        """
+        Return the value of the provided key in the given namespace, which can be overridden for a
+        specific metal layer by appending _<layer name>.
+
+        :param namespace: The namespace of the key (e.g. par.ir_drop_estimate).
+        :param key: The base key name (e.g. sheet_resistance). Do not include the namespace or metal override.
+        :param layer_name: The metal layer name.
+        :return: The value associated with the key, after applying any metal overrides
+        """
+        default = namespace + "." + key
         override = default + "_" + layer_name
         try:
             return self.get_setting(override)
@@ -616,19 +827,22 @@ class HammerPlaceAndRouteTool(HammerTool):
             except KeyError:
                 raise ValueError("No value set for key {}".format(default))
 
-    def _get_by_tracks_track_pitch(self, layer_name: str) -> int:
+    def _get_by_tracks_track_pitch(self, layer_name: str, get_setting: Optional[Callable[[str, str], Any]] = None) -> int:
         """
         Returns the track pitch used by the by_tracks power rail generation method
 
         :param layer_name: The string name of the metal layer
+        :param get_setting: Function of (key, layer name) to read the by_tracks settings with. Defaults to _get_by_tracks_metal_setting.
         :return: The power strap group pitch in tracks
         """
-        track_width = int(self._get_by_tracks_metal_setting("track_width", layer_name))
-        track_spacing = int(self._get_by_tracks_metal_setting("track_spacing", layer_name))
-        power_utilization = float(self._get_by_tracks_metal_setting("power_utilization", layer_name))
+        if get_setting is None:
+            get_setting = self._get_by_tracks_metal_setting
+        track_width = int(get_setting("track_width", layer_name))
+        track_spacing = int(get_setting("track_spacing", layer_name))
+        power_utilization = float(get_setting("power_utilization", layer_name))
 
-        assert power_utilization > 0.0
-        assert power_utilization <= 1.0
+        if not 0.0 < power_utilization <= 1.0:
+            raise ValueError("Power utilization on {layer} must be in (0, 1], got {u}".format(layer=layer_name, u=power_utilization))
 
         # Calculate how many tracks we consume
         # This strategy uses pairs of power and ground
@@ -702,6 +916,12 @@ class HammerDRCTool(HammerSignoffTool):
     def fill_outputs(self) -> bool:
         pass
 
+    def export_config_outputs(self) -> Dict[str, Any]:
+        outputs = deepdict(super().export_config_outputs())
+        outputs["drc.outputs.step_timings"] = self.step_timings_output()
+        outputs["drc.outputs.process_telemetry"] = self.process_telemetry_output()
+        return outputs
+
     @abstractmethod
     def globally_waived_drc_rules(self) -> List[str]:
         # TODO(johnwright) how to waive specific instances of DRC rules, rather than blanket waivers
@@ -789,6 +1009,12 @@ class HammerLVSTool(HammerSignoffTool):
     def fill_outputs(self) -> bool:
         pass
 
+    def export_config_outputs(self) -> Dict[str, Any]:
+        outputs = deepdict(super().export_config_outputs())
+        outputs["lvs.outputs.step_timings"] = self.step_timings_output()
+        outputs["lvs.outputs.process_telemetry"] = self.process_telemetry_output()
+        return outputs
+
     @abstractmethod
     def globally_waived_erc_rules(self) -> List[str]:
         # TODO(johnwright) how to waive specific instances of ERC rules, rather than blanket waivers
@@ -989,64 +1215,127 @@ class HasCPFSupport(HammerTool):
         return "\n".join(output)
 
 
+def group_sdc_assignments(assignments: Iterable[Tuple[Any, Any]]) -> "OrderedDict[Any, List[Any]]":
+    """
+    Group SDC assignments (e.g. loads on ports) so that objects assigned the same
+    value can share a single command.
+    Only the last assignment to each object is kept, since later SDC commands
+    override earlier ones for the same object.
+
+    :param assignments: (object, value) pairs, in command order.
+    :return: Dict of value -> objects assigned that value, in order of first appearance.
+    """
+    last = OrderedDict()  # type: OrderedDict[Any, Any]
+    for obj, value in assignments:
+        last[obj] = value
+    groups = OrderedDict()  # type: OrderedDict[Any, List[Any]]
+    for obj, value in last.items():
+        groups.setdefault(value, []).append(obj)
+    return groups
+
+
 class HasSDCSupport(HammerTool):
     """Mix-in trait with functions useful for tools with SDC-style
     constraints."""
     @property
     def sdc_clock_constraints(self) -> str:
         """Generate TCL fragments for top module clock constraints."""
-        output = [] # type: List[str]
+        output = io.StringIO()
+        self.write_sdc_clock_constraints(output)
+        return output.getvalue()
 
+    def write_sdc_clock_constraints(self, f: TextIO) -> int:
+        """
+        Write the top module clock constraints to the given file, one command at a time.
+        Clocks with identical uncertainties share a single set_clock_uncertainty command.
+
+        :param f: File to write to.
+        :return: Number of commands saved by grouping clocks.
+        """
+        uncertainties = []  # type: List[Tuple[str, float]]
         clocks = self.get_clock_ports()
         for clock in clocks:
             # TODO: FIXME This assumes that library units are always in ns!!!
             if get_or_else(clock.generated, False):
-                output.append("create_generated_clock -name {n} -source {m_path} -divide_by {div} {path}".
+                f.write("create_generated_clock -name {n} -source {m_path} -divide_by {div} {path}\n".
                         format(n=clock.name, m_path=clock.source_path, div=clock.divisor, path=clock.path))
             elif clock.path is not None:
-                output.append("create_clock {0} -name {1} -period {2}".format(clock.path, clock.name, clock.period.value_in_units("ns")))
+                f.write("create_clock {0} -name {1} -period {2}\n".format(clock.path, clock.name, clock.period.value_in_units("ns")))
             else:
-                output.append("create_clock {0} -name {0} -period {1}".format(clock.name, clock.period.value_in_units("ns")))
+                f.write("create_clock {0} -name {0} -period {1}\n".format(clock.name, clock.period.value_in_units("ns")))
             if clock.uncertainty is not None:
-                output.append("set_clock_uncertainty {1} [get_clocks {0}]".format(clock.name, clock.uncertainty.value_in_units("ns")))
+                uncertainties.append((clock.name, clock.uncertainty.value_in_units("ns")))
 
-        output.append("\n")
-        return "\n".join(output)
+        groups = group_sdc_assignments(uncertainties)
+        for uncertainty, names in groups.items():
+            f.write("set_clock_uncertainty {0} [get_clocks {1}]\n".format(
+                uncertainty, names[0] if len(names) == 1 else "{" + " ".join(names) + "}"))
+
+        f.write("\n\n")
+        return len(uncertainties) - len(groups)
 
     @property
     def sdc_pin_constraints(self) -> str:
         """Generate a fragment for I/O pin constraints."""
-        output = []  # type: List[str]
+        output = io.StringIO()
+        self.write_sdc_pin_constraints(output)
+        return output.getvalue()
+
+    def write_sdc_pin_constraints(self, f: TextIO) -> int:
+        """
+        Write the I/O pin constraints to the given file, one command at a time.
+        Ports with identical loads, or identical delays and clocks, share a single
+        command (e.g. set_load 1.0 [get_port {a b c}]).
+
+        :param f: File to write to.
+        :return: Number of commands saved by grouping ports.
+        """
+        collapsed = 0
+
+        def get_ports(names: List[str]) -> str:
+            if len(names) == 1:
+                return "[get_port \"{name}\"]".format(name=names[0])
+            return "[get_port {{{names}}}]".format(names=" ".join(names))
 
         default_output_load = float(self.get_setting("vlsi.inputs.default_output_load"))
 
         # Specify default load.
-        output.append("set_load {load} [all_outputs]".format(
+        f.write("set_load {load} [all_outputs]\n".format(
             load=default_output_load
         ))
 
         # Also specify loads for specific pins.
-        for load in self.get_output_load_constraints():
-            output.append("set_load {load} [get_port \"{name}\"]".format(
-                load=load.load,
-                name=load.name
+        loads = self.get_output_load_constraints()
+        load_groups = group_sdc_assignments((load.name, load.load) for load in loads)
+        for load_value, names in load_groups.items():
+            f.write("set_load {load} {ports}\n".format(
+                load=load_value,
+                ports=get_ports(names)
             ))
+        collapsed += len(loads) - len(load_groups)
 
         # Also specify delays for specific pins.
-        for delay in self.get_delay_constraints():
-            output.append("set_{direction}_delay {delay} -clock {clock} [get_port \"{name}\"]".format(
-                delay=delay.delay.value_in_units("ns"),
-                clock=delay.clock,
-                direction=delay.direction,
-                name=delay.name
+        # Delays in different directions are tracked separately since a port can have both.
+        delays, delay_array = self.get_delay_constraints_with_array()
+        delay_values = delay_array.values_in_units("ns")
+        delay_groups = group_sdc_assignments(
+            ((delay.direction, delay.name), (delay.direction, delay_value, delay.clock))
+            for delay, delay_value in zip(delays, delay_values))
+        for (direction, delay_value, clock), keys in delay_groups.items():
+            f.write("set_{direction}_delay {delay} -clock {clock} {ports}\n".format(
+                delay=delay_value,
+                clock=clock,
+                direction=direction,
+                ports=get_ports([name for _, name in keys])
             ))
+        collapsed += len(delays) - len(delay_groups)
 
         # Custom sdc constraints that are verbatim appended
         custom_sdc_constraints = self.get_setting("vlsi.inputs.custom_sdc_constraints")  # type: List[str]
         for custom in custom_sdc_constraints:
-            output.append(str(custom))
+            f.write(str(custom) + "\n")
 
-        return "\n".join(output)
+        return collapsed
 
     @property
     @abstractmethod
@@ -1118,6 +1407,26 @@ class CadenceTool(HasSDCSupport, HasCPFSupport, HasUPFSupport, HammerTool):
                                                  self.filter_for_mmmc(voltage=corner.voltage, temp=corner.temp)])
         return " ".join(lib_args)
 
+    def get_timing_libs_for_corners(self, corners: List[MMMCCorner]) -> List[str]:
+        """
+        Batch version of get_timing_libs for several corners.
+
+        :param corners: Corners to get timing libraries for.
+        :return: List of space separated lib files, one per corner in the order given.
+        """
+        return list(map(" ".join, self.read_libs_for_mmmc_corners(
+            corners, [hammer_tech.filters.timing_lib_with_ecsm_filter], hammer_tech.HammerTechnologyUtils.to_plain_item)))
+
+    def get_mmmc_qrc_for_corners(self, corners: List[MMMCCorner]) -> List[str]:
+        """
+        Batch version of get_mmmc_qrc for several corners.
+
+        :param corners: Corners to get qrc tech files for.
+        :return: List of space separated qrc tech files, one per corner in the order given.
+        """
+        return list(map(" ".join, self.read_libs_for_mmmc_corners(
+            corners, [hammer_tech.filters.qrc_tech_filter], hammer_tech.HammerTechnologyUtils.to_plain_item)))
+
     def get_qrc_tech(self) -> str:
         """
         Helper function to get the list of rc corner tech files in space separated format.
@@ -1148,13 +1457,17 @@ class CadenceTool(HasSDCSupport, HasCPFSupport, HasUPFSupport, HammerTool):
         # Generate constraints
         clock_constraints_fragment = os.path.join(self.run_dir, "clock_constraints_fragment.sdc")
         with open(clock_constraints_fragment, "w") as f:
-            f.write(self.sdc_clock_constraints)
+            collapsed = self.write_sdc_clock_constraints(f)
+        if collapsed > 0:
+            self.logger.info("Collapsed {n} clock constraint commands by grouping clocks".format(n=collapsed))
         sdc_files.append(clock_constraints_fragment)
 
         # Generate port constraints.
         pin_constraints_fragment = os.path.join(self.run_dir, "pin_constraints_fragment.sdc")
         with open(pin_constraints_fragment, "w") as f:
-            f.write(self.sdc_pin_constraints)
+            collapsed = self.write_sdc_pin_constraints(f)
+        if collapsed > 0:
+            self.logger.info("Collapsed {n} pin constraint commands by grouping ports".format(n=collapsed))
         sdc_files.append(pin_constraints_fragment)
 
         # Add the post-synthesis SDC, if present.
@@ -1179,63 +1492,73 @@ class CadenceTool(HasSDCSupport, HasCPFSupport, HasUPFSupport, HammerTool):
         corners = self.get_mmmc_corners()  # type: List[MMMCCorner]
         # In parallel, create the delay corners
         if corners:
-            setup_corner = corners[0]  # type: MMMCCorner
-            hold_corner = corners[0]  # type: MMMCCorner
-            # TODO(colins): handle more than one corner and do something with extra corners
-            for corner in corners:
-                if corner.type is MMMCCornerType.Setup:
-                    setup_corner = corner
-                if corner.type is MMMCCornerType.Hold:
-                    hold_corner = corner
-
-            # First, create Innovus library sets
-            append_mmmc("create_library_set -name {name} -timing [list {list}]".format(
-                name="{n}.setup_set".format(n=setup_corner.name),
-                list=self.get_timing_libs(setup_corner)
-            ))
-            append_mmmc("create_library_set -name {name} -timing [list {list}]".format(
-                name="{n}.hold_set".format(n=hold_corner.name),
-                list=self.get_timing_libs(hold_corner)
-            ))
-            # Skip opconds for now
-            # Next, create Innovus timing conditions
-            append_mmmc("create_timing_condition -name {name} -library_sets [list {list}]".format(
-                name="{n}.setup_cond".format(n=setup_corner.name),
-                list="{n}.setup_set".format(n=setup_corner.name)
-            ))
-            append_mmmc("create_timing_condition -name {name} -library_sets [list {list}]".format(
-                name="{n}.hold_cond".format(n=hold_corner.name),
-                list="{n}.hold_set".format(n=hold_corner.name)
-            ))
-            # Next, create Innovus rc corners from qrc tech files
-            append_mmmc("create_rc_corner -name {name} -temperature {tempInCelsius} {qrc}".format(
-                name="{n}.setup_rc".format(n=setup_corner.name),
-                tempInCelsius=str(setup_corner.temp.value),
-                qrc="-qrc_tech {}".format(self.get_mmmc_qrc(setup_corner)) if self.get_mmmc_qrc(setup_corner) != '' else ''
-            ))
-            append_mmmc("create_rc_corner -name {name} -temperature {tempInCelsius} {qrc}".format(
-                name="{n}.hold_rc".format(n=hold_corner.name),
-                tempInCelsius=str(hold_corner.temp.value),
-                qrc="-qrc_tech {}".format(self.get_mmmc_qrc(hold_corner)) if self.get_mmmc_qrc(hold_corner) != '' else ''
-            ))
-            # Next, create an Innovus delay corner.
-            append_mmmc(
-                "create_delay_corner -name {name}_delay -timing_condition {name}_cond -rc_corner {name}_rc".format(
-                    name="{n}.setup".format(n=setup_corner.name)
+            # Resolve the timing libraries and qrc tech files of all corners at once.
+            corner_libs = self.get_timing_libs_for_corners(corners)  # type: List[str]
+            corner_qrcs = self.get_mmmc_qrc_for_corners(corners)  # type: List[str]
+
+            corner_type_names = {
+                MMMCCornerType.Setup: "setup",
+                MMMCCornerType.Hold: "hold",
+                MMMCCornerType.Extra: "extra"
+            }  # type: Dict[MMMCCornerType, str]
+
+            setup_views = []  # type: List[str]
+            hold_views = []  # type: List[str]
+            extra_views = []  # type: List[str]
+            # Timing libraries -> name of the library set holding them
+            library_sets = {}  # type: Dict[str, str]
+            for corner, libs, qrc in zip(corners, corner_libs, corner_qrcs):
+                name = "{n}.{t}".format(n=corner.name, t=corner_type_names[corner.type])
+
+                # First, create an Innovus library set, shared between corners with identical libraries.
+                if libs not in library_sets:
+                    library_sets[libs] = "{n}_set".format(n=name)
+                    append_mmmc("create_library_set -name {name} -timing [list {list}]".format(
+                        name=library_sets[libs],
+                        list=libs
+                    ))
+                # Skip opconds for now
+                # Next, create an Innovus timing condition.
+                append_mmmc("create_timing_condition -name {name}_cond -library_sets [list {list}]".format(
+                    name=name,
+                    list=library_sets[libs]
                 ))
-            append_mmmc(
-                "create_delay_corner -name {name}_delay -timing_condition {name}_cond -rc_corner {name}_rc".format(
-                    name="{n}.hold".format(n=hold_corner.name)
+                # Next, create an Innovus rc corner from qrc tech files.
+                append_mmmc("create_rc_corner -name {name}_rc -temperature {tempInCelsius} {qrc}".format(
+                    name=name,
+                    tempInCelsius=str(corner.temp.value),
+                    qrc="-qrc_tech {}".format(qrc) if qrc != '' else ''
                 ))
-            # Next, create the analysis views
-            append_mmmc("create_analysis_view -name {name}_view -delay_corner {name}_delay -constraint_mode {constraint}".format(
-                name="{n}.setup".format(n=setup_corner.name), constraint=constraint_mode))
-            append_mmmc("create_analysis_view -name {name}_view -delay_corner {name}_delay -constraint_mode {constraint}".format(
-                name="{n}.hold".format(n=hold_corner.name), constraint=constraint_mode))
-            # Finally, apply the analysis view.
-            append_mmmc("set_analysis_view -setup {{ {setup_view} }} -hold {{ {hold_view} }}".format(
-                setup_view="{n}.setup_view".format(n=setup_corner.name),
-                hold_view="{n}.hold_view".format(n=hold_corner.name)
+                # Next, create an Innovus delay corner.
+                append_mmmc(
+                    "create_delay_corner -name {name}_delay -timing_condition {name}_cond -rc_corner {name}_rc".format(
+                        name=name
+                    ))
+                # Next, create the analysis view.
+                append_mmmc("create_analysis_view -name {name}_view -delay_corner {name}_delay -constraint_mode {constraint}".format(
+                    name=name, constraint=constraint_mode))
+
+                view = "{n}_view".format(n=name)
+                if corner.type is MMMCCornerType.Setup:
+                    setup_views.append(view)
+                elif corner.type is MMMCCornerType.Hold:
+                    hold_views.append(view)
+                else:
+                    extra_views.append(view)
+
+            # If no corner of a given type exists, analyze the first corner for it.
+            first_view = "{n}.{t}_view".format(n=corners[0].name, t=corner_type_names[corners[0].type])
+            if len(setup_views) == 0:
+                setup_views.append(first_view)
+            if len(hold_views) == 0:
+                hold_views.append(first_view)
+            # Extra corners are only analyzed if requested, along with the hold views.
+            if self.get_setting("vlsi.inputs.mmmc_extra_views_in_hold"):
+                hold_views.extend(v for v in extra_views if v not in hold_views)
+            # Finally, apply the analysis views.
+            append_mmmc("set_analysis_view -setup {{ {setup_views} }} -hold {{ {hold_views} }}".format(
+                setup_views=" ".join(setup_views),
+                hold_views=" ".join(hold_views)
             ))
         else:
             # First, create an Innovus library set.
@@ -1279,14 +1602,76 @@ class CadenceTool(HasSDCSupport, HasCPFSupport, HasUPFSupport, HammerTool):
 
         return "\n".join(mmmc_output)
 
+    def write_mmmc_script(self) -> str:
+        """
+        Write the mmmc script (see generate_mmmc_script) and its SDC fragments to the run_dir.
+        Since all of its results are in files, a step which only calls this can be skipped by
+        incremental runs (see vlsi.core.incremental_steps) when nothing it depends on changed.
+
+        :return: Path to the mmmc script.
+        """
+        mmmc_path = os.path.join(self.run_dir, "mmmc.tcl")
+        contents = self.generate_mmmc_script()
+        with open(mmmc_path, "w") as f:
+            f.write(contents)
+        # The libraries come from the tech JSON rather than from settings.
+        tech = self.technology
+        self.add_step_input_files([os.path.join(tech.path, "{name}.tech.{ext}".format(name=tech.name, ext=ext))
+                                   for ext in ("json", "yml")])
+        self.add_step_output_files([
+            mmmc_path,
+            os.path.join(self.run_dir, "clock_constraints_fragment.sdc"),
+            os.path.join(self.run_dir, "pin_constraints_fragment.sdc")
+        ])
+        return mmmc_path
+
     def generate_dont_use_commands(self) -> List[str]:
         """
         Generate a list of dont_use commands for Cadence tools.
+        Patterns in the dont_use list are checked against the cells of the selected libraries.
+        Patterns which match are emitted as given in a single set_dont_use command (prefixed with "*/" unless
+        they name a library, e.g. "stdcells/DLY*"), so that wildcards also cover cells which only have
+        liberty files. Patterns which match no cell and all patterns if no library cell information
+        is available are guarded in TCL instead.
+        """
+        dont_use_list = self.get_dont_use_list()  # type: List[str]
+        if len(dont_use_list) == 0:
+            return []
+
+        cell_index = self.technology.get_lib_cell_index()  # type: hammer_tech.LibraryCellIndex
+        if cell_index.is_empty:
+            self.logger.warning("No library cell information available, checking dont_use cells in TCL instead")
+            return self._generate_guarded_dont_use_commands(dont_use_list)
+
+        cells = []  # type: List[str]
+        unmatched = []  # type: List[str]
+        for pattern in dont_use_list:
+            if len(cell_index.match(pattern)) == 0:
+                unmatched.append(pattern)
+            elif "/" in pattern:
+                cells.append(pattern)
+            else:
+                # "*/" is needed for "get_db lib_cells <cell_expression>"
+                cells.append("*/" + pattern)
+        in_place_unique(cells)
+        for pattern in unmatched:
+            self.logger.warning("dont_use pattern {p} does not match any cell with LEF information, "
+                                "checking it in TCL instead".format(p=pattern))
+
+        commands = []  # type: List[str]
+        if len(cells) > 0:
+            commands.append("set_dont_use [get_db lib_cells {{ {cells} }}]".format(cells=" ".join(cells)))
+        return commands + self._generate_guarded_dont_use_commands(unmatched)
+
+    @staticmethod
+    def _generate_guarded_dont_use_commands(dont_use_list: List[str]) -> List[str]:
+        """
+        Generate per-cell dont_use commands which check for cell existence in TCL.
         """
 
         def map_cell(in_cell: str) -> str:
             # "*/" is needed for "get_db lib_cells <cell_expression>"
-            if in_cell.startswith("*/"):
+            if "/" in in_cell:
                 mapped_cell = in_cell  # type: str
             else:
                 mapped_cell = "*/" + in_cell
@@ -1294,7 +1679,7 @@ class CadenceTool(HasSDCSupport, HasCPFSupport, HasUPFSupport, HammerTool):
             # Check for cell existence first to avoid Genus erroring out.
             get_db_str = "[get_db lib_cells {mapped_cell}]".format(mapped_cell=mapped_cell)
             # Escaped version for puts.
-            get_db_str_escaped = get_db_str.replace('[', '\[').replace(']', '\]')
+            get_db_str_escaped = get_db_str.replace('[', '\\[').replace(']', '\\]')
             return """
 puts "set_dont_use {get_db_str_escaped}"
 if {{ {get_db_str} ne "" }} {{
@@ -1304,7 +1689,7 @@ if {{ {get_db_str} ne "" }} {{
 }}
             """.format(get_db_str=get_db_str, get_db_str_escaped=get_db_str_escaped, mapped_cell=mapped_cell)
 
-        return list(map(map_cell, self.get_dont_use_list()))
+        return list(map(map_cell, dont_use_list))
 
     def generate_power_spec_commands(self) -> List[str]:
         """
@@ -7,7 +7,7 @@
 #  See LICENSE for licence details.
 
 from enum import Enum
-from typing import Callable, NamedTuple, Optional, TYPE_CHECKING
+from typing import Callable, NamedTuple, Optional, Tuple, TYPE_CHECKING
 
 __all__ = ['HammerStepFunction', 'HammerToolStep', 'HookLocation', 'HammerToolHookAction']
 
@@ -17,12 +17,20 @@ if TYPE_CHECKING:
 
 HammerStepFunction = Callable[['HammerTool'], bool]
 
-HammerToolStep = NamedTuple('HammerToolStep', [
+class HammerToolStep(NamedTuple('HammerToolStep', [
     # Function to call to execute this step
     ('func', HammerStepFunction),
     # Name of the step
-    ('name', str)
-])
+    ('name', str),
+    # Names of the (earlier) steps this step needs, or None if it needs every earlier step.
+    # Steps which declare their dependencies can run concurrently (see vlsi.core.max_threads).
+    ('depends_on', Optional[Tuple[str, ...]])
+])):
+    __slots__ = ()
+
+    def __new__(cls, func: HammerStepFunction, name: str,
+                depends_on: Optional[Tuple[str, ...]] = None) -> "HammerToolStep":
+        return super().__new__(cls, func, name, depends_on)
 
 
 # Where to insert/replace the given step.
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  ir_drop.py
+#  Quick-look static IR drop estimate of the power strap mesh, to evaluate
+#  power strap settings without running place and route and signoff.
+#
+#  See LICENSE for licence details.
+
+import math
+import operator
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from hammer_tech import RoutingDirection
+
+from .power_straps import PowerStrapGeometry
+
+__all__ = ['CurrentRegion', 'IRDropResult', 'estimate_ir_drop']
+
+
+class CurrentRegion(NamedTuple('CurrentRegion', [
+        ('x', float),
+        ('y', float),
+        ('width', float),
+        ('height', float),
+        ('current_density', float)
+])):
+    """
+    A rectangular region drawing current on top of the uniform current density.
+
+    x, y, width, height: The region in microns.
+    current_density: The additional current density in A/mm^2.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_dict(d: dict) -> "CurrentRegion":
+        return CurrentRegion(
+            x=float(d["x"]),
+            y=float(d["y"]),
+            width=float(d["width"]),
+            height=float(d["height"]),
+            current_density=float(d["current_density"])
+        )
+
+
+class IRDropResult(NamedTuple('IRDropResult', [
+        ('net', str),
+        ('worst_drop', float),
+        ('worst_location', Tuple[float, float]),
+        ('average_drop', float),
+        ('layer_drops', Dict[str, float]),
+        ('total_current', float),
+        ('unconnected_current', float),
+        ('iterations', int),
+        ('converged', bool)
+])):
+    """
+    Result of an IR drop estimate of one net.
+
+    net: The net name.
+    worst_drop: The largest drop from the supply in volts (for ground nets, the largest rise).
+    worst_location: (x, y) in microns of the worst drop.
+    average_drop: The average drop over the nodes which draw current, in volts.
+    layer_drops: The worst drop on each strap layer, in volts.
+    total_current: The current drawn from the net in amps.
+    unconnected_current: The part of total_current drawn at straps with no path to a supply, in amps.
+                         These straps are not part of the estimate.
+    iterations: The number of solver iterations.
+    converged: False if the solver stopped at the iteration limit.
+    """
+    __slots__ = ()
+
+
+# A.mm^-2 to A.um^-2
+_PER_MM2_TO_PER_UM2 = 1e-6
+
+
+def _current(rect: Tuple[float, float, float, float], current_density: float, regions: List[CurrentRegion]) -> float:
+    """
+    Integrate the current density over a (left, bottom, right, top) rectangle in microns.
+    """
+    current = current_density * (rect[2] - rect[0]) * (rect[3] - rect[1])
+    for r in regions:
+        w = min(rect[2], r.x + r.width) - max(rect[0], r.x)
+        h = min(rect[3], r.y + r.height) - max(rect[1], r.y)
+        if w > 0 and h > 0:
+            current += r.current_density * w * h
+    return current * _PER_MM2_TO_PER_UM2
+
+
+def _bands(centers: Sequence[float], low: float, high: float) -> List[Tuple[float, float]]:
+    """
+    Split [low, high] into one band per (sorted) center, with the boundaries halfway between centers.
+    """
+    bounds = [low] + [(a + b) / 2 for a, b in zip(centers[:-1], centers[1:])] + [high]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def estimate_ir_drop(geometry: PowerStrapGeometry, net: str, grid_unit: Decimal, sheet_resistance: Dict[str, float],
+                     via_resistance: float, current_density: float, regions: Iterable[CurrentRegion] = (),
+                     source_layers: Optional[Iterable[str]] = None, tolerance: float = 1e-6,
+                     max_iterations: Optional[int] = None) -> IRDropResult:
+    """
+    Estimate the static IR drop of one net of the power strap mesh.
+
+    Each strap is modelled as a chain of resistors between the points where it crosses straps of the
+    same net on the layers directly above and below, which are connected by vias.
+    The ends of the straps on the source layers are held at the supply voltage (as if they were pins
+    at the edge of the block), and the current of the area around each crossing on the lowest layer is
+    drawn there. The standard cell rails are not modelled.
+    The resulting sparse system is solved with conjugate gradients, preconditioned by solving along each strap.
+
+    :param geometry: Power strap geometry, bottom layer first (see HammerPlaceAndRouteTool.get_power_strap_geometry).
+    :param net: The net to analyze.
+    :param grid_unit: Size of the geometry's grid units in microns.
+    :param sheet_resistance: Sheet resistance of each strap layer in ohms/square.
+    :param via_resistance: Resistance of the via stack at each crossing of adjacent strap layers in ohms.
+    :param current_density: Uniform current density in A/mm^2.
+    :param regions: Regions drawing additional current.
+    :param source_layers: Layers whose strap ends connect to the supply. By default the top layer.
+    :param tolerance: Relative residual at which the solver stops.
+    :param max_iterations: Solver iteration limit. By default 10 times the number of nodes.
+    :return: The estimate.
+    """
+    names = list(geometry.layers.keys())
+    if len(names) == 0:
+        raise ValueError("No power strap layers to estimate IR drop on")
+    for name in names:
+        if sheet_resistance.get(name, 0.0) <= 0:
+            raise ValueError("Sheet resistance of {layer} must be positive".format(layer=name))
+    if via_resistance <= 0:
+        raise ValueError("Via resistance must be positive")
+    sources = set(names[-1:] if source_layers is None else source_layers)
+    regions = list(regions)
+    layers = [geometry[name] for name in names]
+    for below, above in zip(layers[:-1], layers[1:]):
+        if below.direction == above.direction:
+            raise ValueError("Strap layers {a} and {b} run in the same direction".format(a=below.grid.name, b=above.grid.name))
+
+    # All positions below are doubled grid units, so that strap centers are integers.
+    # straps[i]: (low, high) of each strap of the net on layer i across the strap direction, sorted.
+    straps = []  # type: List[List[Tuple[int, int]]]
+    along = []  # type: List[Tuple[int, int]]
+    for layer in layers:
+        vertical = layer.direction == RoutingDirection.Vertical
+        straps.append(sorted((r[0], r[2]) if vertical else (r[1], r[3]) for r in layer.iter_rects(net)))
+        bbox = layer.bbox
+        along.append((2 * bbox[1], 2 * bbox[3]) if vertical else (2 * bbox[0], 2 * bbox[2]))
+    centers = [[low + high for low, high in s] for s in straps]
+
+    # Nodes: node_ids[i][s] maps positions along strap s on layer i to node numbers.
+    node_ids = []  # type: List[List[Dict[int, int]]]
+    node_layer = []  # type: List[int]
+    node_xy = []  # type: List[Tuple[int, int]]
+    is_source = []  # type: List[bool]
+    edges = []  # type: List[Tuple[int, int, float]]
+    via_edges = []  # type: List[Tuple[int, int, float]]
+    for i, layer in enumerate(layers):
+        vertical = layer.direction == RoutingDirection.Vertical
+        rs = sheet_resistance[names[i]]
+        layer_ids = []  # type: List[Dict[int, int]]
+        for s, (low, high) in enumerate(straps[i]):
+            positions = set()
+            if i > 0:
+                positions.update(centers[i - 1])
+            if i < len(layers) - 1:
+                positions.update(centers[i + 1])
+            ends = along[i] if names[i] in sources else ()
+            positions.update(ends)
+            ids = {}  # type: Dict[int, int]
+            for pos in sorted(positions):
+                ids[pos] = len(node_layer)
+                node_layer.append(i)
+                node_xy.append((centers[i][s], pos) if vertical else (pos, centers[i][s]))
+                is_source.append(pos in ends)
+            ordered = sorted(ids.items())
+            for (p0, a), (p1, b) in zip(ordered[:-1], ordered[1:]):
+                # R = rs * length / width, with the length in doubled grid units
+                edges.append((a, b, 2.0 * (high - low) / (rs * (p1 - p0))))
+            layer_ids.append(ids)
+        node_ids.append(layer_ids)
+    via_conductance = 1.0 / via_resistance
+    for i in range(len(layers) - 1):
+        for s, ids in enumerate(node_ids[i]):
+            for t, above_ids in enumerate(node_ids[i + 1]):
+                via_edges.append((ids[centers[i + 1][t]], above_ids[centers[i][s]], via_conductance))
+
+    # Loads: the current of the area around each node on the lowest layer
+    scale = float(grid_unit) / 2
+    load = [0.0] * len(node_layer)
+    bottom = layers[0]
+    bottom_vertical = bottom.direction == RoutingDirection.Vertical
+    across = (2 * bottom.bbox[0], 2 * bottom.bbox[2]) if bottom_vertical else (2 * bottom.bbox[1], 2 * bottom.bbox[3])
+    for s, (band_low, band_high) in enumerate(_bands(centers[0], across[0], across[1])):
+        ids = node_ids[0][s]
+        node_positions = sorted(ids.keys())
+        for pos, (seg_low, seg_high) in zip(node_positions, _bands(node_positions, along[0][0], along[0][1])):
+            if bottom_vertical:
+                rect = (band_low * scale, seg_low * scale, band_high * scale, seg_high * scale)
+            else:
+                rect = (seg_low * scale, band_low * scale, seg_high * scale, band_high * scale)
+            load[ids[pos]] += _current(rect, current_density, regions)
+    total_current = sum(load)
+
+    # Only solve for nodes with a path to a supply.
+    adjacency = [[] for _ in node_layer]  # type: List[List[Tuple[int, float]]]
+    for a, b, g in edges + via_edges:
+        adjacency[a].append((b, g))
+        adjacency[b].append((a, g))
+    connected = [False] * len(node_layer)
+    stack = [n for n, source in enumerate(is_source) if source]
+    if len(stack) == 0:
+        raise ValueError("No straps of net {net} on the source layers {layers}".format(net=net, layers=", ".join(sorted(sources))))
+    for n in stack:
+        connected[n] = True
+    while len(stack) > 0:
+        n = stack.pop()
+        for m, _ in adjacency[n]:
+            if not connected[m]:
+                connected[m] = True
+                stack.append(m)
+    unconnected_current = sum(l for l, c in zip(load, connected) if not c)
+
+    # Conductance matrix of the unknown nodes (G * drop = load).
+    # The unknowns are numbered along each strap in turn, so the straps form the tridiagonal part of G
+    # (lower/upper hold the negated off-diagonals); every node has at most one via down and one via up.
+    unknowns = [n for n in range(len(node_layer)) if connected[n] and not is_source[n]]
+    size = len(unknowns)
+    index = {n: k for k, n in enumerate(unknowns)}
+    diag = [0.0] * size
+    upper = [0.0] * size
+    via_down, via_down_g = [size] * size, [0.0] * size
+    via_up, via_up_g = [size] * size, [0.0] * size
+    for a, b, g in edges:
+        if a in index:
+            diag[index[a]] += g
+        if b in index:
+            diag[index[b]] += g
+        if a in index and b in index:
+            assert index[b] == index[a] + 1, "Nodes along a strap must be numbered consecutively"
+            upper[index[a]] = g
+    for a, b, g in via_edges:
+        # a is on the lower layer, b on the upper one
+        if a in index:
+            diag[index[a]] += g
+        if b in index:
+            diag[index[b]] += g
+        if a in index and b in index:
+            via_up[index[a]], via_up_g[index[a]] = index[b], g
+            via_down[index[b]], via_down_g[index[b]] = index[a], g
+    lower = [0.0] + upper[:-1]
+    rhs = [load[n] for n in unknowns]
+
+    def matvec(v: List[float]) -> List[float]:
+        # Index size is a zero entry for nodes without a via
+        padded = v + [0.0]
+        below = map(padded.__getitem__, via_down)
+        above = map(padded.__getitem__, via_up)
+        return [d * x - l * prev - u * nxt - gd * vd - gu * vu
+                for d, x, l, prev, u, nxt, gd, vd, gu, vu in
+                zip(diag, v, lower, [0.0] + v[:-1], upper, v[1:] + [0.0], via_down_g, below, via_up_g, above)]
+
+    # Line preconditioner: solve the strap (tridiagonal) part of G exactly with the Thomas algorithm.
+    scaled_upper = [0.0] * size
+    inv_pivot = [0.0] * size
+    previous = 0.0
+    for k in range(size):
+        inv_pivot[k] = 1.0 / (diag[k] - lower[k] * previous)
+        previous = upper[k] * inv_pivot[k]
+        scaled_upper[k] = previous
+
+    def precondition(r: List[float]) -> List[float]:
+        out = [0.0] * size
+        previous = 0.0
+        for k in range(size):
+            previous = (r[k] + lower[k] * previous) * inv_pivot[k]
+            out[k] = previous
+        following = 0.0
+        for k in range(size - 1, -1, -1):
+            following = out[k] + scaled_upper[k] * following
+            out[k] = following
+        return out
+
+    drop = [0.0] * size
+    residual = list(rhs)
+    z = precondition(residual)
+    p = list(z)
+    rz = sum(map(operator.mul, residual, z))
+    rhs_norm = math.sqrt(sum(r * r for r in rhs))
+    limit = 10 * size if max_iterations is None else max_iterations
+    iterations = 0
+    converged = rhs_norm == 0.0
+    while not converged and iterations < limit:
+        iterations += 1
+        ap = matvec(p)
+        alpha = rz / sum(map(operator.mul, p, ap))
+        drop = [x + alpha * pp for x, pp in zip(drop, p)]
+        residual = [r - alpha * a for r, a in zip(residual, ap)]
+        if math.sqrt(sum(r * r for r in residual)) <= tolerance * rhs_norm:
+            converged = True
+            break
+        z = precondition(residual)
+        rz_next = sum(map(operator.mul, residual, z))
+        beta = rz_next / rz
+        p = [zz + beta * pp for zz, pp in zip(z, p)]
+        rz = rz_next
+
+    layer_drops = {name: 0.0 for name in names}  # type: Dict[str, float]
+    worst_drop, worst_node = 0.0, None  # type: Tuple[float, Optional[int]]
+    for n, d in zip(unknowns, drop):
+        name = names[node_layer[n]]
+        layer_drops[name] = max(layer_drops[name], d)
+        if d > worst_drop:
+            worst_drop, worst_node = d, n
+    loaded = [d for n, d in zip(unknowns, drop) if load[n] > 0]
+    worst_location = (0.0, 0.0) if worst_node is None else \
+        (node_xy[worst_node][0] * scale, node_xy[worst_node][1] * scale)
+    return IRDropResult(
+        net=net,
+        worst_drop=worst_drop,
+        worst_location=worst_location,
+        average_drop=sum(loaded) / len(loaded) if len(loaded) > 0 else 0.0,
+        layer_drops=layer_drops,
+        total_current=total_current,
+        unconnected_current=unconnected_current,
+        iterations=iterations,
+        converged=converged
+    )
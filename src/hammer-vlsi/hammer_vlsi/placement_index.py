@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  placement_index.py
+#  Spatial index over placement constraints, for fast region queries and
+#  pre-place-and-route checks of the constraints.
+#
+#  See LICENSE for licence details.
+
+import math
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .constraints import ObstructionType, PlacementConstraint, PlacementConstraintType
+
+__all__ = ['PlacementConstraintIndex']
+
+# Bounding box of a constraint: (left, bottom, right, top)
+_Box = Tuple[float, float, float, float]
+
+
+def _box(constraint: PlacementConstraint) -> _Box:
+    return (constraint.x, constraint.y, constraint.x + constraint.width, constraint.y + constraint.height)
+
+
+def _overlaps(a: _Box, b: _Box) -> bool:
+    """Check if two boxes overlap. Boxes which only share an edge do not overlap."""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _contains(outer: _Box, inner: _Box) -> bool:
+    """Check if the inner box is entirely within the outer box."""
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+class PlacementConstraintIndex:
+    """
+    Uniform grid (bucket) index over the bounding boxes of placement constraints.
+
+    Each constraint is filed under every grid cell its box touches; the cell size is picked
+    from the typical constraint size so that most constraints land in a few cells.
+    Region queries and overlap detection then only compare constraints which share a cell.
+    Constraints much larger than a cell (e.g. a hierarchical block among small macros) would
+    touch a huge number of cells, so they are kept in a separate list and checked linearly.
+    Top-level and dummy constraints are not indexed (see toplevel).
+    """
+
+    # Constraint types which occupy their area exclusively.
+    SOLID_TYPES = (PlacementConstraintType.HardMacro, PlacementConstraintType.Hierarchical)
+
+    # Constraints spanning more than this many cells in either direction are not filed in the grid.
+    MAX_CELLS_PER_SIDE = 8
+
+    def __init__(self, constraints: Iterable[PlacementConstraint], cell_size: Optional[float] = None) -> None:
+        """
+        Build an index over the given constraints.
+
+        :param constraints: Placement constraints to index.
+        :param cell_size: Size of the (square) grid cells. By default, this is the median of the
+                          larger dimension of the indexed constraints.
+        """
+        self.toplevel = []  # type: List[PlacementConstraint]
+        self.constraints = []  # type: List[PlacementConstraint]
+        for constraint in constraints:
+            if constraint.type == PlacementConstraintType.TopLevel:
+                self.toplevel.append(constraint)
+            elif constraint.type != PlacementConstraintType.Dummy:
+                self.constraints.append(constraint)
+        self._boxes = [_box(c) for c in self.constraints]  # type: List[_Box]
+
+        if cell_size is None:
+            sizes = sorted(max(c.width, c.height) for c in self.constraints if max(c.width, c.height) > 0)
+            cell_size = sizes[len(sizes) // 2] if len(sizes) > 0 else 1.0
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive")
+        self.cell_size = float(cell_size)  # type: float
+
+        self._cells = {}  # type: Dict[Tuple[int, int], List[int]]
+        # Indices of the constraints which are too large for the grid.
+        self._large = []  # type: List[int]
+        max_size = self.MAX_CELLS_PER_SIDE * self.cell_size
+        for i, box in enumerate(self._boxes):
+            if box[2] - box[0] > max_size or box[3] - box[1] > max_size:
+                self._large.append(i)
+                continue
+            for cell in self._cells_for(box):
+                self._cells.setdefault(cell, []).append(i)
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def _cells_for(self, box: _Box) -> Iterator[Tuple[int, int]]:
+        x0, y0 = self._cell_of(box[0], box[1])
+        x1, y1 = self._cell_of(box[2], box[3])
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield (cx, cy)
+
+    def _occupied_cells_for(self, box: _Box) -> Iterator[Tuple[int, int]]:
+        """Get the cells touched by the given box which hold any constraints."""
+        x0, y0 = self._cell_of(box[0], box[1])
+        x1, y1 = self._cell_of(box[2], box[3])
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self._cells):
+            return (cell for cell in self._cells_for(box) if cell in self._cells)
+        # Large regions: scan the occupied cells instead of every cell of the region.
+        return (cell for cell in self._cells if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1)
+
+    def query(self, x: float, y: float, width: float, height: float) -> List[PlacementConstraint]:
+        """
+        Get the indexed constraints which overlap the given region.
+
+        :return: Overlapping constraints, in the order they were given to the index.
+        """
+        region = (x, y, x + width, y + height)
+        found = set(i for i in self._large if _overlaps(self._boxes[i], region))  # type: Set[int]
+        for cell in self._occupied_cells_for(region):
+            for i in self._cells[cell]:
+                if i not in found and _overlaps(self._boxes[i], region):
+                    found.add(i)
+        return [self.constraints[i] for i in sorted(found)]
+
+    def query_point(self, x: float, y: float) -> List[PlacementConstraint]:
+        """
+        Get the indexed constraints which contain the given point (including their edges).
+        """
+        candidates = list(self._cells.get(self._cell_of(x, y), ())) + self._large
+        return [self.constraints[i] for i in sorted(candidates) if _contains(self._boxes[i], (x, y, x, y))]
+
+    def overlapping_pairs(self) -> Iterator[Tuple[PlacementConstraint, PlacementConstraint]]:
+        """
+        Get every pair of indexed constraints which overlap, each pair exactly once.
+        """
+        for cell, members in self._cells.items():
+            for a_pos, a in enumerate(members):
+                box_a = self._boxes[a]
+                for b in members[a_pos + 1:]:
+                    box_b = self._boxes[b]
+                    if not _overlaps(box_a, box_b):
+                        continue
+                    # Only report the pair in the cell holding the lower-left corner of the overlap.
+                    if self._cell_of(max(box_a[0], box_b[0]), max(box_a[1], box_b[1])) == cell:
+                        yield (self.constraints[a], self.constraints[b])
+        # Large constraints are compared with every other constraint.
+        large = set(self._large)
+        for a in self._large:
+            box_a = self._boxes[a]
+            for b, box_b in enumerate(self._boxes):
+                if (b in large and b <= a) or not _overlaps(box_a, box_b):
+                    continue
+                yield (self.constraints[min(a, b)], self.constraints[max(a, b)])
+
+    def check(self) -> List[str]:
+        """
+        Check the indexed constraints for problems which would only show up in place and route:
+         - more than one top-level constraint
+         - constraints which are not entirely inside the top-level constraint
+         - overlapping hard macros or hierarchical blocks
+         - placement obstructions overlapping placement constraints
+
+        :return: List of problems found (empty if the constraints are fine).
+        """
+        problems = []  # type: List[str]
+        if len(self.toplevel) > 1:
+            problems.append("Multiple toplevel placement constraints: {paths}".format(
+                paths=", ".join(c.path for c in self.toplevel)))
+        if len(self.toplevel) > 0:
+            top = self.toplevel[0]
+            top_box = _box(top)
+            for constraint, box in zip(self.constraints, self._boxes):
+                if not _contains(top_box, box):
+                    problems.append("Placement constraint {path} ({type}) is not inside the toplevel {top}".format(
+                        path=constraint.path, type=constraint.type, top=top.path))
+
+        for a, b in self.overlapping_pairs():
+            if a.type in self.SOLID_TYPES and b.type in self.SOLID_TYPES:
+                problems.append("Placement constraints {a} ({at}) and {b} ({bt}) overlap".format(
+                    a=a.path, at=a.type, b=b.path, bt=b.type))
+            else:
+                for obstruction, other in ((a, b), (b, a)):
+                    if obstruction.type == PlacementConstraintType.Obstruction and \
+                            ObstructionType.Place in (obstruction.obs_types or []) and \
+                            other.type == PlacementConstraintType.Placement:
+                        problems.append("Placement obstruction {a} overlaps placement constraint {b}".format(
+                            a=obstruction.path, b=other.path))
+        return problems
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  power_straps.py
+#  Concrete power strap geometry for the by_tracks power strap method, so that strap
+#  coordinates and routing resource consumption are known before place and route.
+#
+#  See LICENSE for licence details.
+
+from array import array
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from hammer_tech import MetalGrid, RoutingDirection
+
+__all__ = ['by_tracks_strap_dimensions', 'PowerStrapGroup', 'PowerStrapLayerGeometry', 'PowerStrapGeometry',
+           'compute_power_strap_geometry', 'PowerStrapSweepRow', 'PowerStrapSweepResult']
+
+# Rectangle in grid units: (left, bottom, right, top)
+_Rect = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=1024)
+def by_tracks_strap_dimensions(grid: MetalGrid, track_pitch: int, track_width: int, track_spacing: int,
+                               track_start: int, track_offset: int, layer_is_all_power: bool) -> Tuple[int, int, int, int]:
+    """
+    Calculate the dimensions of a power strap group from the desired track consumption.
+    See HammerPlaceAndRouteTool.specify_power_straps_by_tracks for a description of the parameters.
+    All lengths are in integer grid units. Results are cached, so that sweeps share the work for identical layers.
+
+    :param track_offset: The offset of the group from the bounding box, in grid units.
+    :return: Tuple of (pitch, width, spacing, offset).
+    """
+    # Note: even track_widths will be snapped to a half-track
+    pitch = track_pitch * grid.pitch
+    if track_spacing == 0:
+        # An all-power (100% utilization) layer results in us wanting to do a uniform strap pattern, so we can just calculate the
+        # maximum width and minimum spacing from the desired pitch, instead of using TWWT.
+        if layer_is_all_power:
+            one_strap_pitch = track_width * grid.pitch
+            spacing, width = grid.min_spacing_and_max_width_from_pitch(one_strap_pitch)
+            # Center the strap between its neighbours. For an odd spacing this rounds the start down by half
+            # a grid unit, so that the strap stays on the manufacturing grid.
+            strap_start = spacing // 2 + grid.offset
+        else:
+            width, spacing, strap_start = grid.get_width_spacing_start_twwt(track_width, force_even=True)
+    else:
+        width, spacing, strap_start = grid.get_width_spacing_start_twt(track_width)
+        spacing = 2*spacing + (track_spacing - 1) * grid.pitch + grid.min_width
+    offset = track_offset + track_start * grid.pitch + strap_start
+    if width <= 0:
+        raise ValueError("Width must be greater than zero. You probably have a malformed tech plugin on layer {}.".format(grid.name))
+    if spacing <= 0:
+        raise ValueError("Spacing must be greater than zero. You probably have a malformed tech plugin on layer {}.".format(grid.name))
+    return pitch, width, spacing, offset
+
+
+class PowerStrapGroup(NamedTuple('PowerStrapGroup', [
+        ('grid', MetalGrid),
+        ('direction', RoutingDirection),
+        ('pitch', int),
+        ('width', int),
+        ('spacing', int),
+        ('offset', int),
+        ('nets', Tuple[str, ...])
+])):
+    """
+    One repeating group of power straps on a layer (i.e. one call to specify_power_straps).
+    All lengths are in integer grid units.
+
+    grid: The metal layer the straps are on.
+    direction: The direction the straps run in.
+    pitch: The pitch between groups of straps.
+    width: The width of each strap.
+    spacing: The spacing between straps in a group.
+    offset: The offset of the first group from the bounding box.
+    nets: The nets of the straps in a group, in order.
+    """
+    __slots__ = ()
+
+    @property
+    def layer(self) -> str:
+        return self.grid.name
+
+
+class PowerStrapSweepRow(NamedTuple('PowerStrapSweepRow', [
+        ('layer', str),
+        ('track_pitch', int),
+        ('pitch', Decimal),
+        ('width', Decimal),
+        ('spacing', Decimal),
+        ('offset', Decimal),
+        ('track_utilization', float),
+        ('utilization', float)
+])):
+    """
+    Power straps on one layer for one configuration of a power strap sweep.
+
+    layer: The metal layer name.
+    track_pitch: The pitch between groups of straps of one power net in routing tracks.
+    pitch, width, spacing, offset: As passed to specify_power_straps for the first power net.
+    track_utilization: The fraction of routing tracks used by power straps (the achieved power_utilization).
+    utilization: The fraction of the layer covered by power straps.
+    """
+    __slots__ = ()
+
+
+class PowerStrapSweepResult(NamedTuple('PowerStrapSweepResult', [
+        ('config', Dict[str, Any]),
+        ('groups', Tuple[PowerStrapGroup, ...]),
+        ('rows', List[PowerStrapSweepRow]),
+        ('error', Optional[str])
+])):
+    """
+    Result of one configuration of a power strap sweep (see HammerPlaceAndRouteTool.sweep_power_straps).
+
+    config: The configuration.
+    groups: The power strap groups, which can be passed to compute_power_strap_geometry.
+    rows: One row per strap layer, bottom layer first.
+    error: Why the configuration is invalid, or None if it is valid.
+    """
+    __slots__ = ()
+
+
+class PowerStrapLayerGeometry:
+    """
+    Power strap rectangles on one metal layer, and the routing tracks they consume.
+    Rectangles are stored flattened per net as (left, bottom, right, top) in grid units.
+    """
+
+    def __init__(self, grid: MetalGrid, direction: RoutingDirection, bbox: _Rect) -> None:
+        self.grid = grid  # type: MetalGrid
+        self.direction = direction  # type: RoutingDirection
+        self.bbox = bbox  # type: _Rect
+        self._rects = {}  # type: Dict[str, array]
+        # Low and high edge of the bbox across the strap direction
+        if direction == RoutingDirection.Vertical:
+            self._low, self._high = bbox[0], bbox[2]
+        else:
+            self._low, self._high = bbox[1], bbox[3]
+        # Tracks run along the strap direction, starting at the layer offset from the bbox.
+        self.total_tracks = max(0, (self._high - self._low - grid.offset) // grid.pitch + 1)  # type: int
+        self._blocked = bytearray(self.total_tracks)
+
+    @property
+    def nets(self) -> List[str]:
+        return list(self._rects.keys())
+
+    def _add_strap(self, net: str, start: int, width: int) -> None:
+        """
+        Add a strap across the bbox whose low edge is at start (across the strap direction).
+        """
+        rects = self._rects.setdefault(net, array('q'))
+        if self.direction == RoutingDirection.Vertical:
+            rects.extend((start, self.bbox[1], start + width, self.bbox[3]))
+        else:
+            rects.extend((self.bbox[0], start, self.bbox[2], start + width))
+
+        # Mark every track whose min-width wire would violate the spacing to this strap.
+        grid = self.grid
+        keepout = grid.get_spacing_for_width(width) + grid.min_width // 2
+        first = (start - keepout - self._low - grid.offset) // grid.pitch + 1
+        last = (start + width + keepout - self._low - grid.offset - 1) // grid.pitch
+        first = max(first, 0)
+        last = min(last, self.total_tracks - 1)
+        if last >= first:
+            self._blocked[first:last + 1] = b'\x01' * (last - first + 1)
+
+    def rects(self, net: str) -> array:
+        """
+        Get the flattened strap rectangles of the given net (left, bottom, right, top, left, ...).
+
+        :return: A copy of the array of coordinates in grid units.
+        """
+        return array('q', self._rects.get(net, array('q')))
+
+    def iter_rects(self, net: str) -> Iterator[_Rect]:
+        """
+        Iterate over the strap rectangles of the given net.
+        """
+        rects = self._rects.get(net, array('q'))
+        for i in range(0, len(rects), 4):
+            yield (rects[i], rects[i + 1], rects[i + 2], rects[i + 3])
+
+    def strap_count(self, net: str) -> int:
+        return len(self._rects.get(net, ())) // 4
+
+    @property
+    def used_tracks(self) -> int:
+        """
+        Number of routing tracks which cannot be used for signals because of power straps.
+        """
+        return self._blocked.count(1)
+
+    @property
+    def track_utilization(self) -> float:
+        """
+        Fraction of the routing tracks in the bbox consumed by power straps.
+        """
+        return self.used_tracks / self.total_tracks if self.total_tracks > 0 else 0.0
+
+    @property
+    def area_utilization(self) -> float:
+        """
+        Fraction of the bbox area covered by power straps.
+        """
+        covered = 0
+        for rects in self._rects.values():
+            for i in range(0, len(rects), 4):
+                covered += (rects[i + 2] - rects[i]) * (rects[i + 3] - rects[i + 1])
+        area = (self.bbox[2] - self.bbox[0]) * (self.bbox[3] - self.bbox[1])
+        return covered / area if area > 0 else 0.0
+
+
+class PowerStrapGeometry:
+    """
+    Power strap rectangles for a set of layers, in grid units.
+    Use compute_power_strap_geometry to get one.
+    """
+
+    def __init__(self, bbox: _Rect) -> None:
+        self.bbox = bbox  # type: _Rect
+        self.layers = {}  # type: Dict[str, PowerStrapLayerGeometry]
+
+    def __getitem__(self, layer: str) -> PowerStrapLayerGeometry:
+        return self.layers[layer]
+
+    def rects(self, layer: str, net: str) -> array:
+        """
+        Get the flattened strap rectangles of the given net on the given layer.
+        """
+        return self.layers[layer].rects(net)
+
+    def query(self, rect: _Rect) -> List[Tuple[str, str, _Rect]]:
+        """
+        Get the straps which overlap the given rectangle (e.g. a macro or blockage).
+        Straps which only share an edge with the rectangle do not overlap.
+
+        :param rect: (left, bottom, right, top) in grid units.
+        :return: List of (layer, net, strap rectangle).
+        """
+        found = []  # type: List[Tuple[str, str, _Rect]]
+        for name, layer in self.layers.items():
+            for net in layer.nets:
+                for strap in layer.iter_rects(net):
+                    if strap[0] < rect[2] and rect[0] < strap[2] and strap[1] < rect[3] and rect[1] < strap[3]:
+                        found.append((name, net, strap))
+        return found
+
+    def resource_report(self) -> List[str]:
+        """
+        Summarize the routing resources consumed on each layer.
+
+        :return: One line per layer.
+        """
+        return ["{layer}: {straps} straps, {used}/{total} tracks ({pct:.1f}%) used by power".format(
+            layer=name, straps=sum(layer.strap_count(n) for n in layer.nets), used=layer.used_tracks,
+            total=layer.total_tracks, pct=100.0 * layer.track_utilization) for name, layer in self.layers.items()]
+
+
+@lru_cache(maxsize=32)
+def compute_power_strap_geometry(groups: Tuple[PowerStrapGroup, ...], bbox: _Rect) -> PowerStrapGeometry:
+    """
+    Lay out the given power strap groups in a bounding box.
+    Straps run across the whole bbox; only straps which fit entirely within the bbox are created.
+    The result is cached, so do not modify it.
+
+    :param groups: Power strap groups, e.g. from HammerPlaceAndRouteTool.get_power_strap_groups.
+    :param bbox: (left, bottom, right, top) of the strap area in grid units.
+    :return: The strap geometry.
+    """
+    geometry = PowerStrapGeometry(bbox)
+    for group in groups:
+        layer = geometry.layers.get(group.layer)
+        if layer is None:
+            layer = PowerStrapLayerGeometry(group.grid, group.direction, bbox)
+            geometry.layers[group.layer] = layer
+        if group.pitch <= 0:
+            raise ValueError("Power strap pitch on {layer} must be positive".format(layer=group.layer))
+        step = group.width + group.spacing
+        for start in range(layer._low + group.offset, layer._high, group.pitch):
+            for i, net in enumerate(group.nets):
+                strap_start = start + i * step
+                if strap_start + group.width <= layer._high:
+                    layer._add_strap(net, strap_start, group.width)
+    return geometry
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  process_monitor.py
+#  Background sampling of the CPU, memory, thread and I/O usage of the
+#  processes launched by hammer-vlsi (e.g. CAD tools), read from /proc.
+#
+#  See LICENSE for licence details.
+
+import os
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+__all__ = ['ProcessTelemetry', 'ProcessTimeSeries', 'ProcessTreeSampler']
+
+# Identifies a process even if its pid is reused: (pid, start time in clock ticks).
+_ProcessKey = Tuple[int, int]
+
+
+class _ProcessStat(NamedTuple('_ProcessStat', [
+        ('ppid', int),
+        ('cpu_ticks', int),
+        ('threads', int),
+        ('rss_pages', int),
+        ('start_ticks', int)
+])):
+    __slots__ = ()
+
+
+def _read_stat(pid: int) -> Optional[_ProcessStat]:
+    """
+    Read /proc/<pid>/stat, or return None if the process is gone.
+    """
+    try:
+        with open("/proc/{pid}/stat".format(pid=pid), "r") as f:
+            stat = f.read()
+    except (OSError, IOError):
+        return None
+    # The command name is in parentheses and may itself contain spaces and parentheses.
+    fields = stat[stat.rfind(")") + 2:].split()
+    try:
+        # Fields are numbered from 3 (state) in this list; see proc(5).
+        return _ProcessStat(
+            ppid=int(fields[1]),
+            cpu_ticks=int(fields[11]) + int(fields[12]),
+            threads=int(fields[17]),
+            rss_pages=int(fields[21]),
+            start_ticks=int(fields[19])
+        )
+    except (IndexError, ValueError):
+        return None
+
+
+def _read_io(pid: int) -> Tuple[int, int]:
+    """
+    Read the bytes read and written by a process (rchar and wchar of /proc/<pid>/io).
+    These count all reads and writes, including ones served from the page cache or network file systems.
+
+    :return: (read bytes, written bytes), or (0, 0) if not available.
+    """
+    read_bytes, write_bytes = 0, 0
+    try:
+        with open("/proc/{pid}/io".format(pid=pid), "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "rchar":
+                    read_bytes = int(value)
+                elif key == "wchar":
+                    write_bytes = int(value)
+    except (OSError, IOError, ValueError):
+        pass
+    return read_bytes, write_bytes
+
+
+class ProcessTelemetry(NamedTuple('ProcessTelemetry', [
+        ('step', str),
+        ('samples', int),
+        ('duration', float),
+        ('mean_cpu_percent', float),
+        ('peak_cpu_percent', float),
+        ('peak_rss_kb', int),
+        ('peak_threads', int),
+        ('peak_processes', int),
+        ('read_bytes', int),
+        ('write_bytes', int)
+])):
+    """
+    Summary of the processes launched during one step.
+
+    step: Name of the step.
+    samples: Number of samples taken.
+    duration: Time covered by the samples, in seconds.
+    mean_cpu_percent, peak_cpu_percent: CPU utilization of all processes together (100 = one core busy).
+    peak_rss_kb: Peak total resident set size of all processes, in KiB.
+    peak_threads, peak_processes: Peak number of threads and processes.
+    read_bytes, write_bytes: Bytes read and written by the processes.
+    """
+    __slots__ = ()
+
+
+class ProcessTimeSeries:
+    """
+    Samples of the processes launched during one step, stored in columns.
+    To bound memory for long steps, every other sample is dropped whenever max_samples is reached,
+    so the series always covers the whole step with a coarser resolution.
+    """
+
+    def __init__(self, step: str, start: float, max_samples: int = 1024) -> None:
+        """
+        :param step: Name of the step.
+        :param start: Time when sampling started, in seconds since the epoch.
+        :param max_samples: Maximum number of samples to keep.
+        """
+        if max_samples < 2:
+            raise ValueError("max_samples must be at least 2")
+        self.step = step  # type: str
+        self.start = start  # type: float
+        self.max_samples = max_samples  # type: int
+        # Seconds since start
+        self.times = array('d')
+        self.cpu_percent = array('d')
+        self.rss_kb = array('q')
+        self.threads = array('q')
+        self.processes = array('q')
+        # Cumulative bytes since start
+        self.read_bytes = array('q')
+        self.write_bytes = array('q')
+        # Which samples are kept: every stride-th one.
+        self._stride = 1
+        self._skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _columns(self) -> List[array]:
+        return [self.times, self.cpu_percent, self.rss_kb, self.threads, self.processes, self.read_bytes, self.write_bytes]
+
+    def append(self, time_offset: float, cpu_percent: float, rss_kb: int, threads: int, processes: int,
+               read_bytes: int, write_bytes: int) -> None:
+        """
+        Add a sample (see the columns for the meaning of the arguments).
+        """
+        self._skipped += 1
+        if self._skipped < self._stride:
+            return
+        self._skipped = 0
+        for column, value in zip(self._columns(), (time_offset, cpu_percent, rss_kb, threads, processes,
+                                                   read_bytes, write_bytes)):
+            column.append(value)
+        if len(self.times) >= self.max_samples:
+            for column in self._columns():
+                del column[1::2]
+            self._stride *= 2
+
+    def summary(self) -> ProcessTelemetry:
+        """
+        Summarize the series.
+        """
+        samples = len(self.times)
+        return ProcessTelemetry(
+            step=self.step,
+            samples=samples,
+            duration=self.times[-1] if samples > 0 else 0.0,
+            mean_cpu_percent=sum(self.cpu_percent) / samples if samples > 0 else 0.0,
+            peak_cpu_percent=max(self.cpu_percent, default=0.0),
+            peak_rss_kb=max(self.rss_kb, default=0),
+            peak_threads=max(self.threads, default=0),
+            peak_processes=max(self.processes, default=0),
+            read_bytes=self.read_bytes[-1] if samples > 0 else 0,
+            write_bytes=self.write_bytes[-1] if samples > 0 else 0
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the series as a dictionary of columns (e.g. for a JSON file).
+        """
+        return {
+            "step": self.step,
+            "start": self.start,
+            "times": list(self.times),
+            "cpu_percent": list(self.cpu_percent),
+            "rss_kb": list(self.rss_kb),
+            "threads": list(self.threads),
+            "processes": list(self.processes),
+            "read_bytes": list(self.read_bytes),
+            "write_bytes": list(self.write_bytes)
+        }
+
+    def trace_events(self, pid: int) -> List[Dict[str, Any]]:
+        """
+        Get the series as counter ("C") events of the Chrome trace event format.
+
+        :param pid: Process id to show the counters under.
+        """
+        events = []  # type: List[Dict[str, Any]]
+        for i in range(len(self.times)):
+            ts = int((self.start + self.times[i]) * 1e6)
+            events.append({"name": "CPU %", "ph": "C", "ts": ts, "pid": pid,
+                           "args": {"cpu_percent": self.cpu_percent[i]}})
+            events.append({"name": "RSS (KiB)", "ph": "C", "ts": ts, "pid": pid,
+                           "args": {"rss_kb": self.rss_kb[i]}})
+            events.append({"name": "Threads", "ph": "C", "ts": ts, "pid": pid,
+                           "args": {"threads": self.threads[i]}})
+        return events
+
+
+class ProcessTreeSampler:
+    """
+    Periodically samples the descendants of a process (but not the process itself) from /proc in a background thread.
+    Only available on systems with a Linux-style /proc (see supported).
+    """
+
+    def __init__(self, step: str, root_pid: Optional[int] = None, interval: float = 1.0, max_samples: int = 1024) -> None:
+        """
+        :param step: Name of the step being sampled.
+        :param root_pid: Process whose descendants to sample (default: this process).
+        :param interval: Time between samples, in seconds.
+        :param max_samples: Maximum number of samples to keep (see ProcessTimeSeries).
+        """
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive")
+        self.root_pid = os.getpid() if root_pid is None else root_pid  # type: int
+        self.interval = interval  # type: float
+        self.series = ProcessTimeSeries(step, time.time(), max_samples)
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_kb = (os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096) // 1024
+        self._start = time.perf_counter()
+        self._last_time = self._start
+        # Last seen CPU ticks and I/O of each process
+        self._last_ticks = {}  # type: Dict[_ProcessKey, int]
+        self._last_io = {}  # type: Dict[_ProcessKey, Tuple[int, int]]
+        self._read_bytes = 0
+        self._write_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @staticmethod
+    def supported() -> bool:
+        """
+        Check if processes can be sampled on this system.
+        """
+        return os.path.isfile("/proc/self/stat")
+
+    def _descendants(self) -> Dict[int, _ProcessStat]:
+        stats = {}  # type: Dict[int, _ProcessStat]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                stat = _read_stat(int(entry))
+                if stat is not None:
+                    stats[int(entry)] = stat
+        children = {}  # type: Dict[int, List[int]]
+        for pid, stat in stats.items():
+            children.setdefault(stat.ppid, []).append(pid)
+        found = {}  # type: Dict[int, _ProcessStat]
+        pending = list(children.get(self.root_pid, []))
+        while len(pending) > 0:
+            pid = pending.pop()
+            found[pid] = stats[pid]
+            pending.extend(children.get(pid, []))
+        return found
+
+    def sample(self) -> None:
+        """
+        Take one sample now and append it to the series.
+        """
+        now = time.perf_counter()
+        elapsed = max(now - self._last_time, 1e-9)
+        self._last_time = now
+
+        processes = self._descendants()
+        cpu_ticks = 0
+        rss_pages = 0
+        threads = 0
+        ticks = {}  # type: Dict[_ProcessKey, int]
+        io = {}  # type: Dict[_ProcessKey, Tuple[int, int]]
+        for pid, stat in processes.items():
+            key = (pid, stat.start_ticks)
+            ticks[key] = stat.cpu_ticks
+            cpu_ticks += stat.cpu_ticks - self._last_ticks.get(key, 0)
+            rss_pages += stat.rss_pages
+            threads += stat.threads
+            io[key] = _read_io(pid)
+            last_read, last_write = self._last_io.get(key, (0, 0))
+            self._read_bytes += max(io[key][0] - last_read, 0)
+            self._write_bytes += max(io[key][1] - last_write, 0)
+        # Processes which exited drop out; their usage until the last sample is kept in the totals.
+        self._last_ticks = ticks
+        self._last_io = io
+
+        self.series.append(
+            time_offset=now - self._start,
+            cpu_percent=100.0 * cpu_ticks / self._clock_ticks / elapsed,
+            rss_kb=rss_pages * self._page_kb,
+            threads=threads,
+            processes=len(processes),
+            read_bytes=self._read_bytes,
+            write_bytes=self._write_bytes
+        )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        """
+        Start sampling in a background thread.
+        """
+        if self._thread is not None:
+            raise ValueError("Sampler was already started")
+        self._thread = threading.Thread(target=self._run, name="hammer-process-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProcessTimeSeries:
+        """
+        Stop sampling and wait for the background thread to finish.
+
+        :return: The samples taken.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.series
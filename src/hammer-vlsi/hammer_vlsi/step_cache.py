@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  step_cache.py
+#  Records of the settings and files each tool step used, so that steps whose
+#  inputs and outputs did not change since the last run can be skipped.
+#
+#  See LICENSE for licence details.
+
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+__all__ = ['StepRecording', 'StepCache', 'hash_path']
+
+# Setting value recorded for settings which did not exist.
+_MISSING_SETTING = "<missing>"
+
+
+def hash_path(path: str) -> str:
+    """
+    Hash the contents of a file, or of all the files in a directory (including their relative paths).
+
+    :param path: Path to hash.
+    :return: Hex digest, or "missing" if the path does not exist.
+    """
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                digest.update(os.path.relpath(full_path, path).encode("utf-8"))
+                digest.update(hash_path(full_path).encode("utf-8"))
+        return digest.hexdigest()
+    elif os.path.isfile(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    else:
+        return "missing"
+
+
+def _setting_value(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class StepRecording:
+    """
+    What a step read and wrote while it ran.
+    Settings are recorded by HammerTool.get_setting; files by HammerTool.add_step_input_files/add_step_output_files.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name  # type: str
+        self.settings = {}  # type: Dict[str, str]
+        self.inputs = []  # type: List[str]
+        self.outputs = []  # type: List[str]
+
+    def record_setting(self, key: str, value: Any) -> None:
+        self.settings[key] = _setting_value(value)
+
+    def record_missing_setting(self, key: str) -> None:
+        self.settings[key] = _MISSING_SETTING
+
+
+class StepRecord(NamedTuple('StepRecord', [
+        ('input_fingerprint', str),
+        ('fingerprint', str),
+        ('settings', List[str]),
+        ('inputs', List[str]),
+        ('outputs', Dict[str, str])
+])):
+    """
+    Stored record of a step which ran successfully.
+
+    input_fingerprint: Hash of the previous step's fingerprint, the settings read and the input files.
+    fingerprint: Hash of input_fingerprint and the output files, which the next step's input_fingerprint builds on.
+    settings: Keys of the settings read.
+    inputs: Input files.
+    outputs: Hashes of the output files.
+    """
+    __slots__ = ()
+
+
+class StepCache:
+    """
+    Records of the steps of one tool run, stored as JSON (usually in the run_dir).
+
+    Each step's fingerprint covers the fingerprint of the step before it, so a step which runs again
+    (because its inputs changed) also makes every following step run again, like make.
+    Only steps which declared output files can be skipped, since the effects of the other steps
+    (e.g. commands collected in memory) would be lost.
+    """
+
+    def __init__(self, path: str, tool: str) -> None:
+        """
+        Load the records from the given file, if it exists.
+
+        :param path: Path to the JSON file.
+        :param tool: Name of the tool, which the first step's fingerprint builds on.
+        """
+        self.path = path  # type: str
+        self.records = {}  # type: Dict[str, StepRecord]
+        self.initial_fingerprint = hashlib.sha256(tool.encode("utf-8")).hexdigest()  # type: str
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as f:
+                    raw = json.load(f)
+                self.records = {name: StepRecord(**record) for name, record in raw.items()}
+            except (ValueError, TypeError):
+                # Unreadable records just mean that every step runs.
+                self.records = {}
+
+    @staticmethod
+    def _input_fingerprint(previous: str, name: str, settings: Dict[str, str], inputs: Iterable[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(previous.encode("utf-8"))
+        digest.update(name.encode("utf-8"))
+        for key in sorted(settings.keys()):
+            digest.update(key.encode("utf-8"))
+            digest.update(settings[key].encode("utf-8"))
+        for path in sorted(inputs):
+            digest.update(path.encode("utf-8"))
+            digest.update(hash_path(path).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _fingerprint(input_fingerprint: str, outputs: Dict[str, str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(input_fingerprint.encode("utf-8"))
+        for path in sorted(outputs.keys()):
+            digest.update(path.encode("utf-8"))
+            digest.update(outputs[path].encode("utf-8"))
+        return digest.hexdigest()
+
+    def check(self, previous: str, name: str, get_setting: Callable[[str], Tuple[bool, Any]]) -> Optional[str]:
+        """
+        Check if the given step can be skipped: it ran before after the same previous step, with the same
+        settings and input files, and its output files are unchanged.
+
+        :param previous: Fingerprint of the previous step.
+        :param name: Name of the step.
+        :param get_setting: Function which returns (True, value) for a setting key, or (False, None) if it does not exist.
+        :return: The fingerprint of the step if it can be skipped, None otherwise.
+        """
+        record = self.records.get(name)
+        if record is None or len(record.outputs) == 0:
+            return None
+        settings = {}  # type: Dict[str, str]
+        for key in record.settings:
+            exists, value = get_setting(key)
+            settings[key] = _setting_value(value) if exists else _MISSING_SETTING
+        if self._input_fingerprint(previous, name, settings, record.inputs) != record.input_fingerprint:
+            return None
+        for path, digest in record.outputs.items():
+            if hash_path(path) != digest:
+                return None
+        return record.fingerprint
+
+    def fingerprint_of(self, name: str) -> Optional[str]:
+        """
+        Get the recorded fingerprint of a step which was not run this time (e.g. due to a resume hook).
+        """
+        record = self.records.get(name)
+        return None if record is None else record.fingerprint
+
+    def finish(self, previous: str, recording: StepRecording) -> str:
+        """
+        Record a step which ran successfully and save the records.
+
+        :param previous: Fingerprint of the previous step.
+        :param recording: What the step read and wrote.
+        :return: The fingerprint of the step.
+        """
+        input_fingerprint = self._input_fingerprint(previous, recording.name, recording.settings, recording.inputs)
+        outputs = {path: hash_path(path) for path in recording.outputs}
+        record = StepRecord(
+            input_fingerprint=input_fingerprint,
+            fingerprint=self._fingerprint(input_fingerprint, outputs),
+            settings=sorted(recording.settings.keys()),
+            inputs=sorted(set(recording.inputs)),
+            outputs=outputs
+        )
+        self.records[recording.name] = record
+        self.save()
+        return record.fingerprint
+
+    def save(self) -> None:
+        """
+        Write the records to the JSON file.
+        """
+        directory = os.path.dirname(self.path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump({name: record._asdict() for name, record in self.records.items()}, f, indent=4, sort_keys=True)
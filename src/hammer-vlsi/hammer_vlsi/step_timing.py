@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  step_timing.py
+#  Wall clock, CPU time and peak memory of tool steps, and export of
+#  them as Chrome trace events.
+#
+#  See LICENSE for licence details.
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from .process_monitor import ProcessTimeSeries, ProcessTreeSampler
+
+__all__ = ['StepTiming', 'StepTimer']
+
+
+def _max_rss_kb(ru_maxrss: int) -> int:
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return ru_maxrss // 1024 if sys.platform == "darwin" else ru_maxrss
+
+
+class StepTiming(NamedTuple('StepTiming', [
+        ('name', str),
+        ('category', str),
+        ('start', float),
+        ('wall_time', float),
+        ('user_time', float),
+        ('system_time', float),
+        ('children_user_time', float),
+        ('children_system_time', float),
+        ('max_rss_kb', int),
+        ('children_max_rss_kb', int),
+        ('thread', int)
+])):
+    """
+    Resources used by one step (or hook) of a tool.
+    All times are in seconds.
+    CPU times and peak memory are for the whole hammer-vlsi process (and its children), so when steps run
+    concurrently (see vlsi.core.max_threads), each step's values include the work of the steps running
+    at the same time.
+
+    name: Name of the step, or of the hook (pre_steps, between_steps, post_steps).
+    category: "step" or "hook".
+    start: Time when the step started, in seconds since the epoch.
+    wall_time: Elapsed wall clock time.
+    user_time, system_time: CPU time of the hammer-vlsi process.
+    children_user_time, children_system_time: CPU time of child processes (e.g. the CAD tool) which finished during the step.
+    max_rss_kb: Peak resident set size of the hammer-vlsi process so far, in KiB.
+    children_max_rss_kb: Peak resident set size of the largest child process so far, in KiB.
+    thread: Number of the thread which ran the step, counting from 0 in order of first use.
+    """
+    __slots__ = ()
+
+    def to_trace_event(self, pid: int, tid: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Convert this timing to a complete ("X") event of the Chrome trace event format.
+
+        :param pid: Process id to show the event under.
+        :param tid: Thread id to show the event under (default: the thread of the step).
+        """
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": int(self.start * 1e6),
+            "dur": int(self.wall_time * 1e6),
+            "pid": pid,
+            "tid": self.thread if tid is None else tid,
+            "args": {
+                "user_time": self.user_time,
+                "system_time": self.system_time,
+                "children_user_time": self.children_user_time,
+                "children_system_time": self.children_system_time,
+                "max_rss_kb": self.max_rss_kb,
+                "children_max_rss_kb": self.children_max_rss_kb
+            }
+        }
+
+
+class StepTimer:
+    """
+    Collects the StepTimings of one run of a tool, and optionally samples the processes launched by each step.
+    Steps may be measured from several threads at once.
+    The process samples of a step cover all processes launched by hammer-vlsi while it runs, so the samples of
+    concurrent steps overlap and should not be added up.
+    """
+
+    def __init__(self, sample_interval: Optional[float] = None) -> None:
+        """
+        :param sample_interval: Interval in seconds at which to sample the child processes of steps,
+                                or None to not sample them. Ignored if sampling is not supported.
+        """
+        self.timings = []  # type: List[StepTiming]
+        self.process_series = []  # type: List[ProcessTimeSeries]
+        if sample_interval is not None and not ProcessTreeSampler.supported():
+            sample_interval = None
+        self.sample_interval = sample_interval  # type: Optional[float]
+        # Small numbers for the threads which ran steps, used as trace thread ids.
+        self._threads = {}  # type: Dict[int, int]
+        self._lock = threading.Lock()
+
+    def _thread_number(self) -> int:
+        with self._lock:
+            return self._threads.setdefault(threading.get_ident(), len(self._threads))
+
+    @contextmanager
+    def measure(self, name: str, category: str = "step") -> Iterator[None]:
+        """
+        Measure the resources used by the body of the with statement and record them, even if it raises.
+        Child processes are sampled for steps (but not hooks) if a sample interval is set.
+
+        :param name: Name of the step.
+        :param category: "step" or "hook".
+        """
+        thread = self._thread_number()
+        sampler = None  # type: Optional[ProcessTreeSampler]
+        if self.sample_interval is not None and category == "step":
+            sampler = ProcessTreeSampler(name, interval=self.sample_interval)
+            sampler.start()
+        start = time.time()
+        wall_start = time.perf_counter()
+        self_start = resource.getrusage(resource.RUSAGE_SELF)
+        children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            if sampler is not None:
+                self.process_series.append(sampler.stop())
+            self_end = resource.getrusage(resource.RUSAGE_SELF)
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            self.timings.append(StepTiming(
+                name=name,
+                category=category,
+                start=start,
+                wall_time=wall_time,
+                user_time=self_end.ru_utime - self_start.ru_utime,
+                system_time=self_end.ru_stime - self_start.ru_stime,
+                children_user_time=children_end.ru_utime - children_start.ru_utime,
+                children_system_time=children_end.ru_stime - children_start.ru_stime,
+                max_rss_kb=_max_rss_kb(self_end.ru_maxrss),
+                children_max_rss_kb=_max_rss_kb(children_end.ru_maxrss),
+                thread=thread
+            ))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        Get the timings as a list of plain dictionaries (e.g. for an output JSON).
+        """
+        return [dict(timing._asdict()) for timing in self.timings]
+
+    def process_telemetry(self) -> List[Dict[str, Any]]:
+        """
+        Get summaries of the sampled child processes of the steps which launched any.
+        """
+        summaries = (series.summary() for series in self.process_series)
+        return [dict(summary._asdict()) for summary in summaries if summary.peak_processes > 0]
+
+    def trace_events(self, process_name: str) -> List[Dict[str, Any]]:
+        """
+        Get the timings as Chrome trace events, under a process with the given name.
+
+        :param process_name: Name to show for the process (e.g. the tool name).
+        """
+        pid = os.getpid()
+        events = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": 0,
+            "args": {"name": process_name}
+        }]  # type: List[Dict[str, Any]]
+        for thread in sorted(set(timing.thread for timing in self.timings)):
+            events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": thread,
+                "args": {"name": "main" if thread == 0 else "step thread {n}".format(n=thread)}
+            })
+        events.extend(timing.to_trace_event(pid) for timing in self.timings)
+        for series in self.process_series:
+            events.extend(series.trace_events(pid))
+        return events
+
+    def write_chrome_trace(self, path: str, process_name: str) -> None:
+        """
+        Write the timings to a Chrome trace event file, which can be loaded in chrome://tracing or Perfetto.
+
+        :param path: Path of the JSON file to write.
+        :param process_name: Name to show for the process (e.g. the tool name).
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(process_name), "displayTimeUnit": "ms"}, f, indent=1)
@@ -8,22 +8,230 @@
 
 # pylint: disable=bad-continuation
 
+import asyncio
 import atexit
+import fcntl
+import getpass
+import io
+import itertools
+import json
+import os
+import re
+import shlex
+import socket
 import subprocess
 import datetime
+import tempfile
+import threading
+import time
+import uuid
 from abc import abstractmethod
+from collections import deque
 from functools import reduce
-from typing import Any, Dict, List, NamedTuple, Optional
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, cast
 
 from hammer_config import HammerDatabase
 from hammer_logging import HammerVLSILoggingContext
 from hammer_utils import add_dicts, get_or_else
 
-__all__ = ['HammerSubmitCommand', 'HammerLocalSubmitCommand',
-           'HammerLSFSettings', 'HammerLSFSubmitCommand']
+__all__ = ['HammerOutputCapture', 'HammerSubmitCommand', 'HammerLocalSubmitCommand',
+           'HammerLSFSettings', 'HammerLSFSubmitCommand', 'HammerSlurmSettings', 'HammerSlurmSubmitCommand',
+           'HammerSGESettings', 'HammerSGESubmitCommand', 'HammerSSHSettings', 'HammerSSHSubmitCommand',
+           'HammerPoolSettings', 'HammerPoolSubmitCommand']
+
+# Numbers the output log files of commands run by this process.
+_output_log_counter = itertools.count(1)
+
+
+class HammerOutputCapture:
+    """
+    Captures the output of a command without holding all of it in memory:
+    the output is streamed to a log file, only the last tail_bytes are kept for the return value,
+    and the lines forwarded to the logger can be rate limited.
+    """
+
+    def __init__(self, logger: HammerVLSILoggingContext, log_path: Optional[str] = None,
+                 tail_bytes: int = 1 << 20, lines_per_second: Optional[float] = None) -> None:
+        """
+        :param logger: Logging context to forward the output lines to (at debug level).
+        :param log_path: File to write the whole output to, or None to not write it.
+        :param tail_bytes: Number of bytes at the end of the output to keep in memory.
+        :param lines_per_second: Maximum number of lines per second to forward to the logger, or None for all lines.
+        """
+        if tail_bytes <= 0:
+            raise ValueError("tail_bytes must be positive")
+        self.logger = logger  # type: HammerVLSILoggingContext
+        self.log_path = log_path  # type: Optional[str]
+        self.tail_bytes = tail_bytes  # type: int
+        self.lines_per_second = lines_per_second  # type: Optional[float]
+        self.total_bytes = 0  # type: int
+        self._tail = deque()  # type: Deque[bytes]
+        self._tail_size = 0
+        self._partial = b""
+        self._window_start = time.monotonic()
+        self._window_lines = 0
+        self._suppressed = 0
+        self._log_file = None  # type: Any
+        if log_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._log_file = open(log_path, "wb", buffering=1 << 20)
+
+    def _log_line(self, line: bytes) -> None:
+        if self.lines_per_second is not None:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._report_suppressed()
+                self._window_start = now
+                self._window_lines = 0
+            if self._window_lines >= self.lines_per_second:
+                self._suppressed += 1
+                return
+            self._window_lines += 1
+        self.logger.debug(line.decode("utf-8", errors="replace").rstrip())
+
+    def _report_suppressed(self) -> None:
+        if self._suppressed > 0:
+            self.logger.debug("({n} lines not shown{where})".format(
+                n=self._suppressed, where="" if self.log_path is None else "; see " + self.log_path))
+            self._suppressed = 0
+
+    def feed(self, data: bytes) -> None:
+        """
+        Add a chunk of output.
+        """
+        if len(data) == 0:
+            return
+        self.total_bytes += len(data)
+        if self._log_file is not None:
+            self._log_file.write(data)
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+            self._tail_size -= len(self._tail.popleft())
+        *lines, self._partial = (self._partial + data).split(b"\n")
+        for line in lines:
+            self._log_line(line)
+
+    def close(self) -> str:
+        """
+        Finish capturing, and close the log file.
+
+        :return: The output, or its last tail_bytes (starting at a line boundary) with a note about the omitted part.
+        """
+        if self._partial != b"":
+            self._log_line(self._partial)
+            self._partial = b""
+        self._report_suppressed()
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        tail = b"".join(self._tail)
+        if self.total_bytes <= self.tail_bytes:
+            return tail.decode("utf-8", errors="replace")
+        tail = tail[len(tail) - self.tail_bytes:]
+        newline = tail.find(b"\n")
+        if newline != -1:
+            tail = tail[newline + 1:]
+        note = "... ({n} bytes of output omitted{where})\n".format(
+            n=self.total_bytes - len(tail), where="" if self.log_path is None else "; see " + self.log_path)
+        return note + tail.decode("utf-8", errors="replace")
 
 
 class HammerSubmitCommand:
+    # Handling of command output (see HammerOutputCapture and vlsi.submit).
+    # Directory for the output log files of commands, or None to not write them.
+    log_dir = None  # type: Optional[str]
+    output_tail_bytes = 1 << 20  # type: int
+    log_lines_per_second = None  # type: Optional[float]
+
+    def output_capture(self, args: List[str], logger: HammerVLSILoggingContext) -> HammerOutputCapture:
+        """
+        Create the output capture for a command according to the output settings of this submit command.
+
+        :param args: Command-line being run.
+        :param logger: Logging context for the output lines.
+        """
+        log_path = None  # type: Optional[str]
+        if self.log_dir is not None:
+            program = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(args[0]))
+            log_path = os.path.join(self.log_dir, "{date}-{n}-{program}.log".format(
+                date=datetime.datetime.now().strftime("hammer-exec-%Y%m%d-%H%M%S"),
+                n=next(_output_log_counter), program=program))
+        return HammerOutputCapture(logger, log_path, self.output_tail_bytes, self.log_lines_per_second)
+
+    def job_output_dir(self, prefix: str) -> str:
+        """
+        Create a new directory for the scripts and output files of jobs which write their output to files
+        (e.g. non-blocking scheduler jobs), in the log_dir or else the temporary directory.
+
+        :param prefix: Prefix of the directory name (e.g. "hammer-lsf-").
+        :return: Path of the new directory.
+        """
+        base_dir = self.log_dir if self.log_dir is not None else tempfile.gettempdir()
+        os.makedirs(base_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix=datetime.datetime.now().strftime(prefix + "%Y%m%d-%H%M%S-"), dir=base_dir)
+
+    def read_output_file(self, path: str, args: List[str], logger: HammerVLSILoggingContext) -> str:
+        """
+        Log and capture the output of a command which was written to a file, as if it came from the command.
+
+        :param path: Output file of the command.
+        :param args: Command-line which was run.
+        :param logger: The logging context
+        :return: The command output, or "" if the file is missing.
+        """
+        output = self.output_capture(args, logger.context("Exec " + self.get_program_tag(args)))
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    output.feed(chunk)
+        except (OSError, IOError):
+            logger.warning("Output file {path} of {tag} is missing".format(path=path, tag=self.get_program_tag(args)))
+        return output.close()
+
+    def run_process(self, launch_args: List[str], args: List[str], env: Dict[str, str],
+                    logger: HammerVLSILoggingContext, cwd: str = None, stdin_data: Optional[bytes] = None) -> str:
+        """
+        Run a local process which runs the given command (e.g. the command itself, or a blocking scheduler
+        command which runs it) until it exits, logging and capturing its output.
+
+        :param launch_args: Command-line of the local process.
+        :param args: Command-line of the command (used to name it in the logs).
+        :param env: The environment variables to set for the process
+        :param logger: The logging context
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :param stdin_data: Data to write to the standard input of the process (leave as None to inherit it).
+        :return: The process output
+        """
+        logger.debug("Executing subprocess: " + ' '.join(launch_args))
+        subprocess_logger = logger.context("Exec " + self.get_program_tag(args))
+        proc = subprocess.Popen(launch_args, shell=False, stderr=subprocess.STDOUT,
+                                stdout=subprocess.PIPE, env=env, cwd=cwd,
+                                stdin=subprocess.PIPE if stdin_data is not None else None)
+        atexit.register(proc.kill)
+        if stdin_data is not None:
+            assert proc.stdin is not None
+            proc.stdin.write(stdin_data)
+            proc.stdin.close()
+
+        # Log output and also capture output at the same time.
+        assert proc.stdout is not None
+        # stdout is buffered (the default), so read1 returns whatever output is available.
+        stdout = cast(io.BufferedReader, proc.stdout)
+        output = self.output_capture(args, subprocess_logger)
+        try:
+            while True:
+                chunk = stdout.read1(1 << 16)
+                if chunk == b"":
+                    break
+                output.feed(chunk)
+        finally:
+            result = output.close()
+        proc.wait()
+        atexit.unregister(proc.kill)
+        # TODO: check errors
+
+        return result
 
     @abstractmethod
     def submit(self, args: List[str], env: Dict[str, str],
@@ -41,6 +249,119 @@ class HammerSubmitCommand:
         """
         pass
 
+    def submit_batch(self, jobs: List[List[str]], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: str = None) -> List[str]:
+        """
+        Submit several independent jobs and block until all of them are complete.
+        By default they are submitted one after another; job submission systems which can
+        run them concurrently (e.g. LSF job arrays) override this.
+
+        :param jobs: Command-lines to run; see submit.
+        :param env: The environment variables to set for the commands
+        :param logger: The logging context
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :return: The output of each command, in the order of jobs.
+        """
+        return [self.submit(args, env, logger, cwd) for args in jobs]
+
+    def launch_args(self, args: List[str]) -> Optional[List[str]]:
+        """
+        Get the command-line which launches the given command on this job submission system,
+        for backends which run the command through a local process (used by submit_async).
+
+        :param args: Command-line to run; each item in the list is one token.
+        :return: The command-line to launch locally, or None if the command can only be run with submit.
+        """
+        return None
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        """
+        Submit the job to the job submission system without blocking the event loop, so that one process
+        can supervise many jobs (e.g. with asyncio.gather).
+        The output is logged and captured as in submit. If the coroutine is cancelled or the timeout expires,
+        the job is terminated (and killed if it does not exit within a few seconds).
+
+        :param args: Command-line to run; each item in the list is one token.
+                     The first token should be the command to run.
+        :param env: The environment variables to set for the command
+        :param logger: The logging context
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :param timeout: Time in seconds after which to terminate the job (leave as None to wait forever).
+        :return: The command output
+        :raises asyncio.TimeoutError: If the timeout expired.
+        """
+        launch_args = self.launch_args(args)
+        if launch_args is None:
+            # No local command-line for this backend, so run the blocking submit in a worker thread instead.
+            # The job cannot be terminated from here, so on timeout or cancellation it keeps running.
+            loop = asyncio.get_event_loop()
+            return await asyncio.wait_for(
+                loop.run_in_executor(None, self.submit, args, env, logger, cwd), timeout)
+        return await self.run_process_async(launch_args, args, env, logger, cwd, timeout)
+
+    async def run_process_async(self, launch_args: List[str], args: List[str], env: Dict[str, str],
+                                logger: HammerVLSILoggingContext, cwd: str = None, timeout: Optional[float] = None,
+                                stdin_data: Optional[bytes] = None) -> str:
+        """
+        Like run_process, but as a coroutine (see submit_async).
+        If the coroutine is cancelled or the timeout expires, the process is terminated.
+
+        :raises asyncio.TimeoutError: If the timeout expired.
+        """
+        logger.debug("Executing subprocess: " + ' '.join(launch_args))
+        subprocess_logger = logger.context("Exec " + self.get_program_tag(args))
+        proc = await asyncio.create_subprocess_exec(*launch_args, stderr=subprocess.STDOUT,
+                                                    stdout=subprocess.PIPE, env=env, cwd=cwd,
+                                                    stdin=subprocess.PIPE if stdin_data is not None else None)
+        if stdin_data is not None:
+            assert proc.stdin is not None
+            proc.stdin.write(stdin_data)
+            await proc.stdin.drain()
+            proc.stdin.close()
+        output = self.output_capture(args, subprocess_logger)
+
+        async def capture() -> None:
+            # Read in chunks instead of lines so that very long lines do not overrun the stream buffer.
+            assert proc.stdout is not None
+            while True:
+                chunk = await proc.stdout.read(1 << 16)
+                if chunk == b"":
+                    break
+                output.feed(chunk)
+            await proc.wait()
+
+        try:
+            await asyncio.wait_for(capture(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await self._terminate_async(proc, logger)
+            output.close()
+            raise
+        if proc.returncode != 0:
+            logger.warning("{tag} exited with code {code}".format(tag=self.get_program_tag(args), code=proc.returncode))
+
+        return output.close()
+
+    @staticmethod
+    async def _terminate_async(proc: "asyncio.subprocess.Process", logger: HammerVLSILoggingContext,
+                               grace_period: float = 5.0) -> None:
+        """
+        Terminate a process started by submit_async, killing it if it does not exit within the grace period.
+        """
+        if proc.returncode is not None:
+            return
+        logger.warning("Terminating subprocess {pid}".format(pid=proc.pid))
+        try:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), grace_period)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        except ProcessLookupError:
+            pass
+
     @abstractmethod
     def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:
         """
@@ -75,20 +396,33 @@ class HammerSubmitCommand:
         def combine_settings(settings: List[Dict[str, Dict[str, Any]]], key: str) -> Dict[str, Any]:
             return reduce(add_dicts, map(lambda d: d[key], settings), {})
 
+        submit_command_types = {
+            "lsf": HammerLSFSubmitCommand,
+            "slurm": HammerSlurmSubmitCommand,
+            "sge": HammerSGESubmitCommand,
+            "ssh": HammerSSHSubmitCommand,
+            "pool": HammerPoolSubmitCommand
+        }  # type: Dict[str, Callable[[], HammerSubmitCommand]]
+
         submit_command = None  # type: Optional[HammerSubmitCommand]
-        if submit_command_mode in {"none", "local"}:  # pylint: disable=no-else-return
-            # Do not read the options, return immediately
-            return HammerLocalSubmitCommand()
-        elif submit_command_mode == "lsf":
-            submit_command = HammerLSFSubmitCommand()
+        if submit_command_mode in {"none", "local"}:
+            # Do not read the options
+            submit_command = HammerLocalSubmitCommand()
+        elif submit_command_mode in submit_command_types:
+            submit_command = submit_command_types[submit_command_mode]()
+            submit_command.read_settings(
+                combine_settings(submit_command_settings, submit_command_mode),
+                tool_namespace)
         else:
             raise NotImplementedError(
                 "Submit command key for {0}: {1} is not implemented".format(
                     tool_namespace, submit_command_mode))
 
-        submit_command.read_settings(
-            combine_settings(submit_command_settings, submit_command_mode),
-            tool_namespace)
+        # Output handling is shared by all submit commands.
+        submit_command.log_dir = database.get_setting("vlsi.submit.log_dir", nullvalue=None)
+        submit_command.output_tail_bytes = int(database.get_setting("vlsi.submit.output_tail_bytes",
+                                                                    nullvalue=HammerSubmitCommand.output_tail_bytes))
+        submit_command.log_lines_per_second = database.get_setting("vlsi.submit.log_lines_per_second", nullvalue=None)
         return submit_command
 
     @staticmethod
@@ -121,27 +455,10 @@ class HammerLocalSubmitCommand(HammerSubmitCommand):
     def submit(self, args: List[str], env: Dict[str, str],
                logger: HammerVLSILoggingContext, cwd: str = None) -> str:
         # Just run the command on this host.
+        return self.run_process(args, args, env, logger, cwd)
 
-        prog_tag = self.get_program_tag(args)
-
-        logger.debug("Executing subprocess: " + ' '.join(args))
-        subprocess_logger = logger.context("Exec " + prog_tag)
-        proc = subprocess.Popen(args, shell=False, stderr=subprocess.STDOUT,
-                                stdout=subprocess.PIPE, env=env, cwd=cwd)
-        atexit.register(proc.kill)
-
-        output_buf = ""
-        # Log output and also capture output at the same time.
-        while True:
-            line = proc.stdout.readline().decode("utf-8")
-            if line != '':
-                subprocess_logger.debug(line.rstrip())
-                output_buf += line
-            else:
-                break
-        # TODO: check errors
-
-        return output_buf
+    def launch_args(self, args: List[str]) -> List[str]:
+        return list(args)
 
     def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:
         # Should never get here
@@ -153,7 +470,13 @@ class HammerLSFSettings(NamedTuple('HammerLSFSettings', [
     ('num_cpus', Optional[int]),
     ('queue', Optional[str]),
     ('log_file', Optional[str]),
-    ('extra_args', List[str])
+    ('extra_args', List[str]),
+    # Whether to block in bsub -K (the default), or to submit and poll with bjobs.
+    ('blocking', bool),
+    ('bjobs_binary', str),
+    ('bkill_binary', str),
+    # Time between bjobs polls in seconds, when not blocking.
+    ('poll_interval', float)
 ])):
     __slots__ = ()
 
@@ -178,19 +501,36 @@ class HammerLSFSettings(NamedTuple('HammerLSFSettings', [
         except KeyError:
             log_file = None
 
+        poll_interval = float(get_or_else(settings.get("poll_interval"), 10.0))
+        if poll_interval <= 0:
+            raise ValueError("LSF poll_interval must be positive")
+
         return HammerLSFSettings(
             bsub_binary=bsub_binary,
             num_cpus=num_cpus,
             queue=queue,
             log_file=log_file,
-            extra_args=get_or_else(settings["extra_args"], [])
+            extra_args=get_or_else(settings["extra_args"], []),
+            blocking=bool(get_or_else(settings.get("blocking"), True)),
+            bjobs_binary=get_or_else(settings.get("bjobs_binary"), "bjobs"),
+            bkill_binary=get_or_else(settings.get("bkill_binary"), "bkill"),
+            poll_interval=poll_interval
         )
 
 
 class HammerLSFSubmitCommand(HammerSubmitCommand):
+    """
+    Submits jobs to LSF. By default, each job blocks in bsub -K.
+    With blocking set to false, jobs are submitted as job arrays without -K and bjobs is polled until they finish,
+    so that many jobs can be supervised at once (see submit_batch and submit_async).
+    The output of non-blocking jobs is read back from their bsub -o files.
+    """
 
     # TODO(johnwright): log the command output
 
+    # LSF job states of finished jobs
+    FINISHED_STATES = ("DONE", "EXIT")
+
     @property
     def settings(self) -> HammerLSFSettings:
         if not hasattr(self, "_settings"):
@@ -213,6 +553,14 @@ class HammerLSFSubmitCommand(HammerSubmitCommand):
         args = [self.settings.bsub_binary, "-K"]  # always use -K to block
         args.extend(["-o", self.settings.log_file if self.settings.log_file is not None else
             datetime.datetime.now().strftime("hammer-vlsi-bsub-%Y%m%d-%H%M%S.log")])  # always use -o to log to a file
+        args.extend(self.bsub_resource_args())
+        return args
+
+    def bsub_resource_args(self) -> List[str]:
+        """
+        Get the bsub arguments which select the queue and resources of jobs.
+        """
+        args = []  # type: List[str]
         if self.settings.queue is not None:
             args.extend(["-q", self.settings.queue])
         if self.settings.num_cpus is not None:
@@ -220,29 +568,902 @@ class HammerLSFSubmitCommand(HammerSubmitCommand):
         args.extend(self.settings.extra_args)
         return args
 
+    def launch_args(self, args: List[str]) -> List[str]:
+        # bsub -K blocks until the job is done, and kills the job if it is terminated.
+        return self.bsub_args() + [' '.join(args)]
+
+    def _write_job_array(self, jobs: List[List[str]], cwd: Optional[str]) -> Tuple[str, str]:
+        """
+        Write a script which runs job $LSB_JOBINDEX of the given jobs, in a new directory
+        which also receives the output files.
+
+        :return: Tuple of (job array directory, script path).
+        """
+        array_dir = self.job_output_dir("hammer-lsf-")
+        lines = ["#!/bin/sh", "# Runs job $LSB_JOBINDEX of a hammer-vlsi LSF job array."]
+        if cwd is not None:
+            lines.append("cd {cwd} || exit 1".format(cwd=shlex.quote(cwd)))
+        lines.append('case "$LSB_JOBINDEX" in')
+        for i, args in enumerate(jobs, 1):
+            lines.append("  {i}) exec {cmd} ;;".format(i=i, cmd=" ".join(shlex.quote(a) for a in args)))
+        lines.append("esac")
+        lines.append("exit 1")
+        script = os.path.join(array_dir, "jobs.sh")
+        with open(script, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return array_dir, script
+
+    def _bsub_array_args(self, jobs: List[List[str]], array_dir: str, script: str) -> List[str]:
+        name = "hammer-{id}[1-{n}]".format(id=os.path.basename(array_dir), n=len(jobs))
+        return [self.settings.bsub_binary, "-J", name, "-o", os.path.join(array_dir, "%I.log")] + \
+            self.bsub_resource_args() + ["sh " + shlex.quote(script)]
+
+    @staticmethod
+    def _parse_job_id(bsub_output: str) -> str:
+        match = re.search(r"Job <(\d+)>", bsub_output)
+        if match is None:
+            raise ValueError("Could not submit LSF job: {output}".format(output=bsub_output.strip()))
+        return match.group(1)
+
+    def _bjobs_args(self, job_id: str) -> List[str]:
+        return [self.settings.bjobs_binary, "-a", "-noheader", "-o", "jobid jobindex stat exit_code", job_id]
+
+    @staticmethod
+    def _finished_indices(bjobs_output: str, array_dir: str, count: int) -> Dict[int, str]:
+        """
+        Parse bjobs output for a job array.
+
+        :return: Dictionary of the indices of finished jobs to their state. Jobs which bjobs no longer reports
+                 are finished if their output file exists.
+        """
+        states = {}  # type: Dict[int, str]
+        for line in bjobs_output.splitlines():
+            fields = line.split()
+            if len(fields) >= 3 and fields[1].isdigit():
+                states[int(fields[1])] = fields[2]
+        finished = {}  # type: Dict[int, str]
+        for index in range(1, count + 1):
+            state = states.get(index)
+            if state in HammerLSFSubmitCommand.FINISHED_STATES:
+                finished[index] = state
+            elif state is None and os.path.exists(os.path.join(array_dir, "{i}.log".format(i=index))):
+                finished[index] = "DONE"
+        return finished
+
+    def _collect_outputs(self, jobs: List[List[str]], array_dir: str, job_id: str, finished: Dict[int, str],
+                         logger: HammerVLSILoggingContext) -> List[str]:
+        outputs = []  # type: List[str]
+        for index, args in enumerate(jobs, 1):
+            if finished[index] != "DONE":
+                logger.warning("LSF job {id}[{i}] ({tag}) finished in state {state}".format(
+                    id=job_id, i=index, tag=self.get_program_tag(args), state=finished[index]))
+            outputs.append(self.read_output_file(os.path.join(array_dir, "{i}.log".format(i=index)), args, logger))
+        return outputs
+
+    def submit_batch(self, jobs: List[List[str]], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: str = None) -> List[str]:
+        if self.settings.blocking:
+            return super().submit_batch(jobs, env, logger, cwd)
+        if len(jobs) == 0:
+            return []
+        array_dir, script = self._write_job_array(jobs, cwd)
+        bsub_args = self._bsub_array_args(jobs, array_dir, script)
+        logger.debug("Executing subprocess: " + ' '.join(bsub_args))
+        job_id = self._parse_job_id(subprocess.run(bsub_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                   env=env).stdout.decode("utf-8", errors="replace"))
+        logger.info("Submitted LSF job array {id} with {n} job(s)".format(id=job_id, n=len(jobs)))
+        try:
+            while True:
+                bjobs = subprocess.run(self._bjobs_args(job_id), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                       env=env).stdout.decode("utf-8", errors="replace")
+                finished = self._finished_indices(bjobs, array_dir, len(jobs))
+                if len(finished) == len(jobs):
+                    break
+                time.sleep(self.settings.poll_interval)
+        except BaseException:
+            subprocess.run([self.settings.bkill_binary, job_id], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, env=env)
+            raise
+        return self._collect_outputs(jobs, array_dir, job_id, finished, logger)
+
+    async def submit_batch_async(self, jobs: List[List[str]], env: Dict[str, str],
+                                 logger: HammerVLSILoggingContext, cwd: str = None,
+                                 timeout: Optional[float] = None) -> List[str]:
+        """
+        Like submit_batch, but as a coroutine which polls bjobs without blocking the event loop.
+        Only available when not blocking. If the coroutine is cancelled or the timeout expires, the jobs are killed.
+
+        :param timeout: Time in seconds after which to kill the jobs (leave as None to wait forever).
+        :raises asyncio.TimeoutError: If the timeout expired.
+        """
+        if self.settings.blocking:
+            raise ValueError("submit_batch_async needs LSF blocking to be false")
+        if len(jobs) == 0:
+            return []
+
+        async def run(args: List[str]) -> str:
+            proc = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                        env=env)
+            out, _ = await proc.communicate()
+            return out.decode("utf-8", errors="replace")
+
+        array_dir, script = self._write_job_array(jobs, cwd)
+        bsub_args = self._bsub_array_args(jobs, array_dir, script)
+        logger.debug("Executing subprocess: " + ' '.join(bsub_args))
+        job_id = self._parse_job_id(await run(bsub_args))
+        logger.info("Submitted LSF job array {id} with {n} job(s)".format(id=job_id, n=len(jobs)))
+
+        async def poll() -> Dict[int, str]:
+            while True:
+                finished = self._finished_indices(await run(self._bjobs_args(job_id)), array_dir, len(jobs))
+                if len(finished) == len(jobs):
+                    return finished
+                await asyncio.sleep(self.settings.poll_interval)
+
+        try:
+            finished = await asyncio.wait_for(poll(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            logger.warning("Killing LSF job array {id}".format(id=job_id))
+            await run([self.settings.bkill_binary, job_id])
+            raise
+        return self._collect_outputs(jobs, array_dir, job_id, finished, logger)
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        if self.settings.blocking:
+            return await super().submit_async(args, env, logger, cwd, timeout)
+        return (await self.submit_batch_async([args], env, logger, cwd, timeout))[0]
+
     def submit(self, args: List[str], env: Dict[str, str],
                logger: HammerVLSILoggingContext, cwd: str = None) -> str:
-        # TODO fix output capturing
+        if not self.settings.blocking:
+            return self.submit_batch([args], env, logger, cwd)[0]
+        return self.run_process(self.launch_args(args), args, env, logger, cwd)
 
-        prog_tag = self.get_program_tag(args)
 
-        subprocess_format_str = 'Executing subprocess: {bsub_args} "{args}"'
-        logger.debug(subprocess_format_str.format(bsub_args=' '.join(self.bsub_args()),
-                                                  args=' '.join(args)))
-        subprocess_logger = logger.context("Exec " + prog_tag)
-        proc = subprocess.Popen(self.bsub_args() + [' '.join(args)],
-                                shell=False, stderr=subprocess.STDOUT,
-                                stdout=subprocess.PIPE, env=env, cwd=cwd)
+def _optional_int(settings: Dict[str, Any], key: str) -> Optional[int]:
+    value = settings.get(key)
+    return int(value) if value is not None else None
 
-        output_buf = ""
-        # Log output and also capture output at the same time.
-        while True:
-            line = proc.stdout.readline().decode("utf-8")
-            if line != '':
-                subprocess_logger.debug(line.rstrip())
-                output_buf += line
+
+class HammerSlurmSettings(NamedTuple('HammerSlurmSettings', [
+    ('srun_binary', str),
+    ('sbatch_binary', str),
+    ('squeue_binary', str),
+    ('scancel_binary', str),
+    ('num_cpus', Optional[int]),
+    # Memory per node in MiB
+    ('memory_mb', Optional[int]),
+    ('partition', Optional[str]),
+    ('extra_args', List[str]),
+    # Whether to block in srun (the default), or to submit with sbatch and poll with squeue.
+    ('blocking', bool),
+    # Time between squeue polls in seconds, when not blocking.
+    ('poll_interval', float)
+])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_setting(settings: Dict[str, Any]) -> "HammerSlurmSettings":
+        if not isinstance(settings, dict):
+            raise ValueError("Must be a dictionary")
+        poll_interval = float(get_or_else(settings.get("poll_interval"), 10.0))
+        if poll_interval <= 0:
+            raise ValueError("Slurm poll_interval must be positive")
+        return HammerSlurmSettings(
+            srun_binary=get_or_else(settings.get("srun_binary"), "srun"),
+            sbatch_binary=get_or_else(settings.get("sbatch_binary"), "sbatch"),
+            squeue_binary=get_or_else(settings.get("squeue_binary"), "squeue"),
+            scancel_binary=get_or_else(settings.get("scancel_binary"), "scancel"),
+            num_cpus=_optional_int(settings, "num_cpus"),
+            memory_mb=_optional_int(settings, "memory_mb"),
+            partition=settings.get("partition"),
+            extra_args=list(get_or_else(settings.get("extra_args"), [])),
+            blocking=bool(get_or_else(settings.get("blocking"), True)),
+            poll_interval=poll_interval
+        )
+
+
+class HammerSlurmSubmitCommand(HammerSubmitCommand):
+    """
+    Submits jobs to Slurm. By default, each job blocks in srun, which streams the output back.
+    With blocking set to false, jobs are submitted with sbatch and squeue is polled until they finish,
+    so that many jobs can be supervised at once (see submit_batch and submit_async).
+    The output of non-blocking jobs is read back from their sbatch --output files.
+    """
+
+    # Slurm job states of finished jobs. Jobs which squeue no longer reports are also finished.
+    FINISHED_STATES = ("COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL",
+                       "PREEMPTED", "BOOT_FAIL", "DEADLINE")
+
+    @property
+    def settings(self) -> HammerSlurmSettings:
+        if not hasattr(self, "_settings"):
+            raise ValueError("Nothing set for settings yet")
+        return getattr(self, "_settings")
+
+    @settings.setter
+    def settings(self, value: HammerSlurmSettings) -> None:
+        """
+        Set the settings class variable
+
+        :param value: The HammerSlurmSettings NamedTuple to use
+        """
+        setattr(self, "_settings", value)
+
+    def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:  # pylint: disable=unused-argument
+        self.settings = HammerSlurmSettings.from_setting(settings)
+
+    def resource_args(self) -> List[str]:
+        """
+        Get the srun/sbatch arguments which select the partition and resources of jobs.
+        """
+        args = []  # type: List[str]
+        if self.settings.partition is not None:
+            args.append("--partition=" + self.settings.partition)
+        if self.settings.num_cpus is not None:
+            args.append("--cpus-per-task=%d" % self.settings.num_cpus)
+        if self.settings.memory_mb is not None:
+            args.append("--mem=%dM" % self.settings.memory_mb)
+        args.extend(self.settings.extra_args)
+        return args
+
+    def launch_args(self, args: List[str]) -> List[str]:
+        # srun blocks until the job is done, and cancels the job if it is terminated.
+        return [self.settings.srun_binary] + self.resource_args() + list(args)
+
+    def _sbatch_args(self, args: List[str], output_path: str, cwd: Optional[str]) -> List[str]:
+        sbatch_args = [self.settings.sbatch_binary, "--parsable", "--job-name=hammer-" + os.path.basename(args[0]),
+                       "--output=" + output_path]
+        if cwd is not None:
+            sbatch_args.append("--chdir=" + cwd)
+        return sbatch_args + self.resource_args() + ["--wrap=" + " ".join(shlex.quote(a) for a in args)]
+
+    @staticmethod
+    def _parse_job_id(sbatch_output: str) -> str:
+        # sbatch --parsable prints "<job id>" or "<job id>;<cluster>".
+        match = re.search(r"^(\d+)(;\S+)?$", sbatch_output.strip(), re.MULTILINE)
+        if match is None:
+            raise ValueError("Could not submit Slurm job: {output}".format(output=sbatch_output.strip()))
+        return match.group(1)
+
+    def _squeue_args(self, job_ids: List[str]) -> List[str]:
+        return [self.settings.squeue_binary, "--noheader", "--format=%i %T", "--jobs=" + ",".join(job_ids)]
+
+    @staticmethod
+    def _running_jobs(squeue_output: str, logger: HammerVLSILoggingContext) -> List[str]:
+        """
+        Parse squeue output.
+
+        :return: The job ids which have not finished yet.
+        """
+        running = []  # type: List[str]
+        for line in squeue_output.splitlines():
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            if fields[1] in HammerSlurmSubmitCommand.FINISHED_STATES:
+                if fields[1] != "COMPLETED":
+                    logger.warning("Slurm job {id} finished in state {state}".format(id=fields[0], state=fields[1]))
             else:
-                break
-        # TODO: check errors
+                running.append(fields[0])
+        return running
+
+    def submit_batch(self, jobs: List[List[str]], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: str = None) -> List[str]:
+        if self.settings.blocking:
+            return super().submit_batch(jobs, env, logger, cwd)
+        if len(jobs) == 0:
+            return []
+        job_dir = self.job_output_dir("hammer-slurm-")
+        output_paths = [os.path.join(job_dir, "{i}.log".format(i=i)) for i in range(1, len(jobs) + 1)]
+        job_ids = []  # type: List[str]
+        try:
+            for args, output_path in zip(jobs, output_paths):
+                sbatch_args = self._sbatch_args(args, output_path, cwd)
+                logger.debug("Executing subprocess: " + ' '.join(sbatch_args))
+                job_ids.append(self._parse_job_id(subprocess.run(
+                    sbatch_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env
+                ).stdout.decode("utf-8", errors="replace")))
+            logger.info("Submitted Slurm job(s) {ids}".format(ids=", ".join(job_ids)))
+            pending = list(job_ids)
+            while True:
+                squeue = subprocess.run(self._squeue_args(pending), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        env=env).stdout.decode("utf-8", errors="replace")
+                pending = self._running_jobs(squeue, logger)
+                if len(pending) == 0:
+                    break
+                time.sleep(self.settings.poll_interval)
+        except BaseException:
+            if len(job_ids) > 0:
+                subprocess.run([self.settings.scancel_binary] + job_ids, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, env=env)
+            raise
+        return [self.read_output_file(path, args, logger) for args, path in zip(jobs, output_paths)]
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        if self.settings.blocking:
+            return await super().submit_async(args, env, logger, cwd, timeout)
+
+        async def run(command: List[str]) -> str:
+            proc = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                        env=env)
+            out, _ = await proc.communicate()
+            return out.decode("utf-8", errors="replace")
+
+        output_path = os.path.join(self.job_output_dir("hammer-slurm-"), "1.log")
+        sbatch_args = self._sbatch_args(args, output_path, cwd)
+        logger.debug("Executing subprocess: " + ' '.join(sbatch_args))
+        job_id = self._parse_job_id(await run(sbatch_args))
+        logger.info("Submitted Slurm job {id}".format(id=job_id))
+
+        async def poll() -> None:
+            while len(self._running_jobs(await run(self._squeue_args([job_id])), logger)) > 0:
+                await asyncio.sleep(self.settings.poll_interval)
+
+        try:
+            await asyncio.wait_for(poll(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            logger.warning("Cancelling Slurm job {id}".format(id=job_id))
+            await run([self.settings.scancel_binary, job_id])
+            raise
+        return self.read_output_file(output_path, args, logger)
 
-        return output_buf
+    def submit(self, args: List[str], env: Dict[str, str],
+               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+        if not self.settings.blocking:
+            return self.submit_batch([args], env, logger, cwd)[0]
+        return self.run_process(self.launch_args(args), args, env, logger, cwd)
+
+
+class HammerSGESettings(NamedTuple('HammerSGESettings', [
+    ('qsub_binary', str),
+    ('qdel_binary', str),
+    ('num_cpus', Optional[int]),
+    # Parallel environment which provides num_cpus slots
+    ('parallel_environment', str),
+    # Memory per job in MiB, requested per slot through memory_resource
+    ('memory_mb', Optional[int]),
+    ('memory_resource', str),
+    ('queue', Optional[str]),
+    ('extra_args', List[str])
+])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_setting(settings: Dict[str, Any]) -> "HammerSGESettings":
+        if not isinstance(settings, dict):
+            raise ValueError("Must be a dictionary")
+        return HammerSGESettings(
+            qsub_binary=get_or_else(settings.get("qsub_binary"), "qsub"),
+            qdel_binary=get_or_else(settings.get("qdel_binary"), "qdel"),
+            num_cpus=_optional_int(settings, "num_cpus"),
+            parallel_environment=get_or_else(settings.get("parallel_environment"), "smp"),
+            memory_mb=_optional_int(settings, "memory_mb"),
+            memory_resource=get_or_else(settings.get("memory_resource"), "h_vmem"),
+            queue=settings.get("queue"),
+            extra_args=list(get_or_else(settings.get("extra_args"), []))
+        )
+
+
+class HammerSGESubmitCommand(HammerSubmitCommand):
+    """
+    Submits jobs to Sun/Univa/Son of Grid Engine with qsub -sync y, which blocks until the job is done.
+    The job runs in the current (or given) working directory with the environment of hammer-vlsi,
+    and its output is read back from its qsub -o file.
+    """
+
+    @property
+    def settings(self) -> HammerSGESettings:
+        if not hasattr(self, "_settings"):
+            raise ValueError("Nothing set for settings yet")
+        return getattr(self, "_settings")
+
+    @settings.setter
+    def settings(self, value: HammerSGESettings) -> None:
+        """
+        Set the settings class variable
+
+        :param value: The HammerSGESettings NamedTuple to use
+        """
+        setattr(self, "_settings", value)
+
+    def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:  # pylint: disable=unused-argument
+        self.settings = HammerSGESettings.from_setting(settings)
+
+    def resource_args(self) -> List[str]:
+        """
+        Get the qsub arguments which select the queue and resources of jobs.
+        """
+        args = []  # type: List[str]
+        if self.settings.queue is not None:
+            args.extend(["-q", self.settings.queue])
+        num_cpus = get_or_else(self.settings.num_cpus, 1)
+        if self.settings.num_cpus is not None:
+            args.extend(["-pe", self.settings.parallel_environment, "%d" % num_cpus])
+        if self.settings.memory_mb is not None:
+            # Grid Engine memory requests are per slot.
+            args.extend(["-l", "{resource}={mb}M".format(resource=self.settings.memory_resource,
+                                                         mb=-(-self.settings.memory_mb // num_cpus))])
+        args.extend(self.settings.extra_args)
+        return args
+
+    def qsub_args(self, args: List[str], output_path: str) -> List[str]:
+        """
+        Get the qsub command-line which runs the given command, and blocks until it is done.
+
+        :param args: Command-line to run.
+        :param output_path: File for the standard output and error of the command.
+        """
+        return [self.settings.qsub_binary, "-sync", "y", "-b", "y", "-cwd", "-V", "-j", "y", "-o", output_path,
+                "-N", "hammer-" + os.path.basename(args[0])] + self.resource_args() + list(args)
+
+    @staticmethod
+    def _parse_job_id(qsub_output: str) -> Optional[str]:
+        match = re.search(r"Your job (\d+)", qsub_output)
+        return match.group(1) if match is not None else None
+
+    def submit(self, args: List[str], env: Dict[str, str],
+               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+        output_path = os.path.join(self.job_output_dir("hammer-sge-"), "1.log")
+        qsub_args = self.qsub_args(args, output_path)
+        logger.debug("Executing subprocess: " + ' '.join(qsub_args))
+        proc = subprocess.Popen(qsub_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, cwd=cwd)
+        try:
+            qsub_output = proc.communicate()[0].decode("utf-8", errors="replace")
+        except BaseException:
+            # qsub -sync y does not delete the job when it is interrupted.
+            proc.kill()
+            job_id = self._parse_job_id(proc.communicate()[0].decode("utf-8", errors="replace"))
+            if job_id is not None:
+                subprocess.run([self.settings.qdel_binary, job_id], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, env=env)
+            raise
+        for line in qsub_output.splitlines():
+            logger.debug(line)
+        if proc.returncode != 0:
+            logger.warning("qsub exited with code {code} for {tag}".format(code=proc.returncode,
+                                                                          tag=self.get_program_tag(args)))
+        return self.read_output_file(output_path, args, logger)
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        output_path = os.path.join(self.job_output_dir("hammer-sge-"), "1.log")
+        qsub_args = self.qsub_args(args, output_path)
+        logger.debug("Executing subprocess: " + ' '.join(qsub_args))
+        proc = await asyncio.create_subprocess_exec(*qsub_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                    env=env, cwd=cwd)
+        qsub_output = []  # type: List[str]
+
+        async def wait() -> None:
+            assert proc.stdout is not None
+            async for line in proc.stdout:
+                qsub_output.append(line.decode("utf-8", errors="replace"))
+                logger.debug(qsub_output[-1].rstrip("\n"))
+            await proc.wait()
+
+        try:
+            await asyncio.wait_for(wait(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await self._terminate_async(proc, logger)
+            job_id = self._parse_job_id("".join(qsub_output))
+            if job_id is not None:
+                logger.warning("Deleting SGE job {id}".format(id=job_id))
+                qdel = await asyncio.create_subprocess_exec(self.settings.qdel_binary, job_id, env=env,
+                                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                await qdel.wait()
+            raise
+        return self.read_output_file(output_path, args, logger)
+
+
+# Environment variables which describe this host or shell, and are not passed on to SSH hosts.
+_SSH_LOCAL_ENV_VARS = frozenset(["_", "PWD", "OLDPWD", "SHLVL", "HOST", "HOSTNAME", "DISPLAY", "TERM"])
+
+
+class HammerSSHSettings(NamedTuple('HammerSSHSettings', [
+    ('hosts', List[str]),
+    ('ssh_binary', str),
+    ('ssh_args', List[str]),
+    # Command run on each host to measure its load. It prints the load average first, and optionally
+    # the number of CPUs on its last line.
+    ('load_probe', str),
+    # Time in seconds to wait for the load probe of a host before skipping it.
+    ('probe_timeout', float)
+])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_setting(settings: Dict[str, Any]) -> "HammerSSHSettings":
+        if not isinstance(settings, dict):
+            raise ValueError("Must be a dictionary")
+        hosts = list(get_or_else(settings.get("hosts"), []))
+        if len(hosts) == 0:
+            raise ValueError("Missing mandatory key hosts for SSH settings.")
+        probe_timeout = float(get_or_else(settings.get("probe_timeout"), 5.0))
+        if probe_timeout <= 0:
+            raise ValueError("SSH probe_timeout must be positive")
+        return HammerSSHSettings(
+            hosts=hosts,
+            ssh_binary=get_or_else(settings.get("ssh_binary"), "ssh"),
+            ssh_args=list(get_or_else(settings.get("ssh_args"), ["-o", "BatchMode=yes"])),
+            load_probe=get_or_else(settings.get("load_probe"), "cat /proc/loadavg && nproc"),
+            probe_timeout=probe_timeout
+        )
+
+
+class HammerSSHSubmitCommand(HammerSubmitCommand):
+    """
+    Runs jobs on a list of hosts over ssh, for sites without a job scheduler.
+    Each job goes to the host with the lowest load per CPU, counting the jobs this process already runs there.
+    The environment is sent over the standard input of ssh, the job runs in the same working directory
+    (which must exist on the host, e.g. on a shared file system), and its output is streamed back.
+    Terminating ssh does not kill the remote command unless the ssh_args make ssh allocate a terminal.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Number of jobs this process is running on each host
+        self._running = {}  # type: Dict[str, int]
+
+    @property
+    def settings(self) -> HammerSSHSettings:
+        if not hasattr(self, "_settings"):
+            raise ValueError("Nothing set for settings yet")
+        return getattr(self, "_settings")
+
+    @settings.setter
+    def settings(self, value: HammerSSHSettings) -> None:
+        """
+        Set the settings class variable
+
+        :param value: The HammerSSHSettings NamedTuple to use
+        """
+        setattr(self, "_settings", value)
+
+    def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:  # pylint: disable=unused-argument
+        self.settings = HammerSSHSettings.from_setting(settings)
+
+    def ssh_args(self, host: str, remote_command: str) -> List[str]:
+        return [self.settings.ssh_binary] + self.settings.ssh_args + [host, remote_command]
+
+    @staticmethod
+    def _parse_load(probe_output: str) -> Optional[Tuple[float, int]]:
+        """
+        Parse the output of the load probe.
+
+        :return: Tuple of (load average, number of CPUs), or None if the output is not understood.
+        """
+        lines = probe_output.strip().splitlines()
+        try:
+            load = float(lines[0].split()[0])
+            cpus = int(lines[-1].split()[0]) if len(lines) > 1 else 1
+        except (IndexError, ValueError):
+            return None
+        return load, max(cpus, 1)
+
+    def probe_loads(self, env: Dict[str, str]) -> Dict[str, Tuple[float, int]]:
+        """
+        Run the load probe on all hosts at once.
+
+        :param env: The environment variables to run ssh with
+        :return: Dictionary of each reachable host to (load average, number of CPUs).
+        """
+        procs = [(host, subprocess.Popen(self.ssh_args(host, self.settings.load_probe), stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env))
+                 for host in self.settings.hosts]
+        deadline = time.time() + self.settings.probe_timeout
+        loads = {}  # type: Dict[str, Tuple[float, int]]
+        for host, proc in procs:
+            try:
+                out = proc.communicate(timeout=max(deadline - time.time(), 0.0))[0].decode("utf-8", errors="replace")
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                continue
+            load = self._parse_load(out) if proc.returncode == 0 else None
+            if load is not None:
+                loads[host] = load
+        return loads
+
+    def choose_host(self, env: Dict[str, str], logger: HammerVLSILoggingContext) -> str:
+        """
+        Choose the least loaded host for a new job and count the job as running on it.
+        Call release_host when the job is done.
+
+        :raises ValueError: If no host is reachable.
+        """
+        loads = self.probe_loads(env)
+        if len(loads) == 0:
+            raise ValueError("None of the SSH hosts {hosts} are reachable".format(hosts=", ".join(self.settings.hosts)))
+        with self._lock:
+            # Ties go to the first host in the list.
+            host = min(loads.keys(), key=lambda h: ((loads[h][0] + self._running.get(h, 0)) / loads[h][1],
+                                                    self.settings.hosts.index(h)))
+            self._running[host] = self._running.get(host, 0) + 1
+        logger.info("Running on {host} (load {load:.2f} on {cpus} CPUs)".format(host=host, load=loads[host][0],
+                                                                              cpus=loads[host][1]))
+        return host
+
+    def release_host(self, host: str) -> None:
+        with self._lock:
+            self._running[host] -= 1
+
+    @staticmethod
+    def remote_command(args: List[str], cwd: Optional[str]) -> str:
+        """
+        Get the remote command which runs the given command in the given working directory,
+        after reading the environment (see env_script) from its standard input.
+        """
+        script = 'eval "$(cat)" && cd {cwd} && exec {cmd}'.format(
+            cwd=shlex.quote(cwd if cwd is not None else os.getcwd()),
+            cmd=" ".join(shlex.quote(a) for a in args))
+        # Run the script with sh, whatever the login shell of the host is.
+        return "sh -c " + shlex.quote(script)
+
+    @staticmethod
+    def env_script(env: Dict[str, str]) -> bytes:
+        """
+        Get the shell script which exports the given environment on a host.
+        """
+        lines = ["export {key}={value}".format(key=key, value=shlex.quote(value)) for key, value in sorted(env.items())
+                 if re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", key) and key not in _SSH_LOCAL_ENV_VARS
+                 and not key.startswith("SSH_")]
+        return "\n".join(lines + [""]).encode("utf-8")
+
+    def submit(self, args: List[str], env: Dict[str, str],
+               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+        host = self.choose_host(env, logger)
+        try:
+            return self.run_process(self.ssh_args(host, self.remote_command(args, cwd)), args, env, logger,
+                                    stdin_data=self.env_script(env))
+        finally:
+            self.release_host(host)
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        host = await asyncio.get_event_loop().run_in_executor(None, self.choose_host, env, logger)
+        try:
+            return await self.run_process_async(self.ssh_args(host, self.remote_command(args, cwd)), args, env, logger,
+                                                timeout=timeout, stdin_data=self.env_script(env))
+        finally:
+            self.release_host(host)
+
+
+def _total_memory_mb() -> Optional[int]:
+    """
+    Get the total memory of this host from /proc/meminfo, or None if it is not available.
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+class HammerPoolSettings(NamedTuple('HammerPoolSettings', [
+    ('state_dir', str),
+    ('slots', int),
+    ('memory_mb', Optional[int]),
+    ('num_cpus', int),
+    ('job_memory_mb', int),
+    ('poll_interval', float)
+])):
+    """
+    Settings of the local job-slot pool.
+
+    state_dir: Directory of the pool state and lock files. All hammer-vlsi processes using the same directory share
+               the pool, so it must be on a local file system of this host.
+    slots: CPU slots of the pool (default: the number of CPUs).
+    memory_mb: Memory budget of the pool in MiB (default: the memory of the host, or unlimited if unknown).
+    num_cpus: Slots taken by each job.
+    job_memory_mb: Memory reserved by each job in MiB.
+    poll_interval: Time between checks for free slots while a job is queued, in seconds.
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_setting(settings: Dict[str, Any]) -> "HammerPoolSettings":
+        if not isinstance(settings, dict):
+            raise ValueError("Must be a dictionary")
+        state_dir = settings.get("state_dir")
+        if state_dir is None:
+            state_dir = os.path.join(tempfile.gettempdir(), "hammer-pool-" + getpass.getuser())
+        slots = settings.get("slots")
+        memory_mb = settings.get("memory_mb")
+        result = HammerPoolSettings(
+            state_dir=str(state_dir),
+            slots=int(slots) if slots is not None else (os.cpu_count() or 1),
+            memory_mb=int(memory_mb) if memory_mb is not None else _total_memory_mb(),
+            num_cpus=int(get_or_else(settings.get("num_cpus"), 1)),
+            job_memory_mb=int(get_or_else(settings.get("job_memory_mb"), 0)),
+            poll_interval=float(get_or_else(settings.get("poll_interval"), 1.0))
+        )
+        if result.num_cpus > result.slots:
+            raise ValueError("Pool jobs need {n} slots, but the pool only has {slots}".format(
+                n=result.num_cpus, slots=result.slots))
+        if result.memory_mb is not None and result.job_memory_mb > result.memory_mb:
+            raise ValueError("Pool jobs need {n} MiB, but the pool only has {total} MiB".format(
+                n=result.job_memory_mb, total=result.memory_mb))
+        if result.poll_interval <= 0:
+            raise ValueError("Pool poll_interval must be positive")
+        return result
+
+
+class HammerPoolSubmitCommand(HammerLocalSubmitCommand):
+    """
+    Runs commands on this host once CPU slots and memory are free in a pool shared by all hammer-vlsi processes
+    on the host. The pool state is a JSON file updated under an exclusive lock; jobs wait in first-come,
+    first-served order and reservations of processes which died are dropped.
+    """
+
+    def __init__(self) -> None:
+        # Time each job of this command waited in the queue, in seconds.
+        self.queue_wait_times = []  # type: List[float]
+
+    @property
+    def settings(self) -> HammerPoolSettings:
+        if not hasattr(self, "_settings"):
+            raise ValueError("Nothing set for settings yet")
+        return getattr(self, "_settings")
+
+    @settings.setter
+    def settings(self, value: HammerPoolSettings) -> None:
+        """
+        Set the settings class variable
+
+        :param value: The HammerPoolSettings NamedTuple to use
+        """
+        setattr(self, "_settings", value)
+
+    def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:  # pylint: disable=unused-argument
+        self.settings = HammerPoolSettings.from_setting(settings)
+
+    def _update_state(self, job_id: str, release: bool = False) -> bool:
+        """
+        Lock the pool state, drop jobs of dead processes, and then either release the given job,
+        or queue it and start it if it is first in line and fits.
+
+        :return: True if the job holds its reservation.
+        """
+        settings = self.settings
+        os.makedirs(settings.state_dir, exist_ok=True)
+        host = socket.gethostname()
+        with open(os.path.join(settings.state_dir, "pool.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state_path = os.path.join(settings.state_dir, "pool.json")
+                try:
+                    with open(state_path, "r") as f:
+                        state = json.load(f)
+                except (OSError, IOError, ValueError):
+                    state = {}
+                running = state.get("running", {})  # type: Dict[str, Dict[str, Any]]
+                queue = state.get("queue", [])  # type: List[Dict[str, Any]]
+
+                def alive(job: Dict[str, Any]) -> bool:
+                    if job.get("host") != host:
+                        return True
+                    try:
+                        os.kill(int(job["pid"]), 0)
+                    except ProcessLookupError:
+                        return False
+                    except PermissionError:
+                        pass
+                    return True
+
+                running = {k: v for k, v in running.items() if alive(v)}
+                queue = [job for job in queue if alive(job)]
+
+                holds = False
+                if release:
+                    running.pop(job_id, None)
+                    queue = [job for job in queue if job["id"] != job_id]
+                elif job_id in running:
+                    holds = True
+                else:
+                    if all(job["id"] != job_id for job in queue):
+                        queue.append({"id": job_id, "host": host, "pid": os.getpid(),
+                                      "slots": settings.num_cpus, "memory_mb": settings.job_memory_mb})
+                    used_slots = sum(job["slots"] for job in running.values())
+                    used_memory = sum(job["memory_mb"] for job in running.values())
+                    fits = used_slots + settings.num_cpus <= settings.slots and \
+                        (settings.memory_mb is None or used_memory + settings.job_memory_mb <= settings.memory_mb)
+                    if queue[0]["id"] == job_id and fits:
+                        running[job_id] = queue.pop(0)
+                        holds = True
+
+                with open(state_path + ".tmp", "w") as f:
+                    json.dump({"running": running, "queue": queue}, f, indent=4)
+                os.replace(state_path + ".tmp", state_path)
+                return holds
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _queued(self, logger: HammerVLSILoggingContext) -> None:
+        logger.info("Waiting for {n} free slot(s) in the job pool {dir}".format(
+            n=self.settings.num_cpus, dir=self.settings.state_dir))
+
+    def _started(self, logger: HammerVLSILoggingContext, waited: float, queued: bool) -> None:
+        self.queue_wait_times.append(waited)
+        if queued:
+            logger.info("Job waited {t:.1f} s in the job pool queue".format(t=waited))
+
+    def acquire(self, logger: HammerVLSILoggingContext) -> str:
+        """
+        Wait until the pool has room for a job, and reserve it.
+
+        :return: The id of the job, to pass to release.
+        """
+        job_id = uuid.uuid4().hex
+        start = time.monotonic()
+        try:
+            queued = False
+            while not self._update_state(job_id):
+                if not queued:
+                    self._queued(logger)
+                    queued = True
+                time.sleep(self.settings.poll_interval)
+        except BaseException:
+            self.release(job_id)
+            raise
+        self._started(logger, time.monotonic() - start, queued)
+        return job_id
+
+    async def acquire_async(self, logger: HammerVLSILoggingContext) -> str:
+        """
+        Like acquire, but waits without blocking the event loop.
+        The pool state is locked and updated in a worker thread.
+        """
+        loop = asyncio.get_event_loop()
+        job_id = uuid.uuid4().hex
+        start = time.monotonic()
+        update = None  # type: Optional[asyncio.Future]
+        try:
+            queued = False
+            while True:
+                update = loop.run_in_executor(None, self._update_state, job_id)
+                if await asyncio.shield(update):
+                    break
+                if not queued:
+                    self._queued(logger)
+                    queued = True
+                await asyncio.sleep(self.settings.poll_interval)
+        except BaseException:
+            # Let a pending update finish first, so that it cannot queue the job again after its release.
+            if update is not None:
+                await asyncio.wait([update])
+            await loop.run_in_executor(None, self.release, job_id)
+            raise
+        self._started(logger, time.monotonic() - start, queued)
+        return job_id
+
+    def release(self, job_id: str) -> None:
+        """
+        Release the reservation of a job (or remove it from the queue).
+        """
+        self._update_state(job_id, release=True)
+
+    def submit(self, args: List[str], env: Dict[str, str],
+               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+        job_id = self.acquire(logger)
+        try:
+            return super().submit(args, env, logger, cwd)
+        finally:
+            self.release(job_id)
+
+    async def submit_async(self, args: List[str], env: Dict[str, str],
+                           logger: HammerVLSILoggingContext, cwd: str = None,
+                           timeout: Optional[float] = None) -> str:
+        job_id = await self.acquire_async(logger)
+        try:
+            return await super().submit_async(args, env, logger, cwd, timeout)
+        finally:
+            await asyncio.get_event_loop().run_in_executor(None, self.release, job_id)
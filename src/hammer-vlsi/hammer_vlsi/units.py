@@ -7,6 +7,8 @@
 #  See LICENSE for licence details.
 
 from abc import abstractmethod
+from array import array
+import re
 import sys
 try:
     from abc import ABC  # pylint: disable=ungrouped-imports
@@ -17,11 +19,25 @@ except ImportError:
         import abc  # pylint: disable=ungrouped-imports
         ABC = abc.ABCMeta('ABC', (object,), {'__slots__': ()})  # type: ignore
 
-from typing import Optional, TypeVar
+from typing import cast, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Type, TypeVar
 
 from hammer_utils import get_or_else
 
 _TT = TypeVar('_TT', bound='ValueWithUnit')
+_TA = TypeVar('_TA', bound='ValueWithUnitArray')
+
+# Compiled value parsers, keyed by base unit (e.g. "s").
+_unit_regexes = {}  # type: Dict[str, Pattern]
+
+
+def _unit_regex(unit: str) -> Pattern:
+    """Get the (cached) compiled regex which parses values with the given base unit."""
+    regex = _unit_regexes.get(unit)
+    if regex is None:
+        regex = re.compile(r"^(-?[\d.]+) *(.*){}$".format(re.escape(unit)))
+        _unit_regexes[unit] = regex
+    return regex
+
 
 class ValueWithUnit(ABC):
     """Represents some particular value that has units (e.g. "10 ns", "2000 um", "25 C", etc).
@@ -77,33 +93,53 @@ class ValueWithUnit(ABC):
                        the given prefix, or the default prefix defined by the
                        class if one is not specified.
         """
-        import re
-
         default_prefix = get_or_else(prefix, self.default_prefix)
+        num, value_prefix = self._parse(value, _unit_regex(self.unit), default_prefix, self.unit_type)
+
+        self._value = num  # type: float
+        # Preserve the prefix too to preserve precision
+        self._prefix = value_prefix  # type: float
 
-        regex = r"^(-?[\d.]+) *(.*){}$".format(re.escape(self.unit))
-        match = re.search(regex, value)
+    @classmethod
+    def _parse(cls, value: str, regex: Pattern, default_prefix: str, unit_type: str) -> Tuple[float, float]:
+        """
+        Parse the given string into a number and a prefix multiplier.
+        :param value: Value encoded in the given string (e.g. "0.25 ns").
+        :param regex: Compiled parser for the unit (see _unit_regex).
+        :param default_prefix: Prefix to use if value does not have one.
+        :param unit_type: Unit type, for error messages.
+        :return: Tuple of (number, prefix multiplier) - e.g. (0.25, 1e-9).
+        """
+        match = regex.match(value)
         if match is None:
             try:
                 num = str(float(value))
                 value_prefix = default_prefix
             except ValueError:
-                raise ValueError("Malformed {type} value {value}".format(type=self.unit_type,
+                raise ValueError("Malformed {type} value {value}".format(type=unit_type,
                                                                          value=value))
         else:
             num = match.group(1)
             value_prefix = match.group(2)
 
         if num.count('.') > 1 or len(value_prefix) > 1:
-            raise ValueError("Malformed {type} value {value}".format(type=self.unit_type,
+            raise ValueError("Malformed {type} value {value}".format(type=unit_type,
                                                                      value=value))
 
-        if value_prefix not in self._prefix_table:
+        if value_prefix not in cls._prefix_table:
             raise ValueError("Bad prefix for {value}".format(value=value))
 
-        self._value = float(num)  # type: float
-        # Preserve the prefix too to preserve precision
-        self._prefix = self._prefix_table[value_prefix]  # type: float
+        return float(num), cls._prefix_table[value_prefix]
+
+    @classmethod
+    def _from_parts(cls: Type[_TT], value: float, prefix: float) -> _TT:
+        """
+        Create a value directly from a number and a prefix multiplier, without parsing.
+        """
+        new = cls.__new__(cls)
+        new._value = value
+        new._prefix = prefix
+        return new
 
     @property
     def value(self) -> float:
@@ -113,12 +149,7 @@ class ValueWithUnit(ABC):
     def value_in_units(self, prefix: str, round_zeroes: bool = True) -> float:
         """Get this value in the given prefix. e.g. "ns", "mV", etc.
         """
-        # e.g. extract "n" from "ns" or blank if it's blank (e.g. "V" -> "")
-        letter_prefix = ""
-        if prefix != self.unit:
-            letter_prefix = "" if prefix == "" else prefix[0]
-
-        retval = self._value * (self._prefix / self._prefix_table[letter_prefix])
+        retval = self._value * (self._prefix / self._prefix_table[_letter_prefix(prefix, self.unit)])
         if round_zeroes:  # pylint: disable=no-else-return
             return round(retval, 3)
         else:
@@ -213,6 +244,13 @@ class ValueWithUnit(ABC):
         return self.value >= other.value
 
 
+def _letter_prefix(prefix: str, unit: str) -> str:
+    """Extract e.g. "n" from "ns", or blank if the prefix is blank or just the unit (e.g. "V" -> "")."""
+    if prefix == unit or prefix == "":
+        return ""
+    return prefix[0]
+
+
 class TimeValue(ValueWithUnit):
     """Time value - e.g. "4 ns".
     Parses time values from strings.
@@ -267,3 +305,127 @@ class TemperatureValue(ValueWithUnit):
     @property
     def unit_type(self) -> str:
         return "voltage"
+
+
+class ValueWithUnitArray(ABC):
+    """Array of values which share the same unit (e.g. a column of I/O delays).
+
+    Values are parsed in one pass with a cached compiled parser and stored in a
+    flat array of doubles in the base unit (e.g. seconds), which avoids creating
+    one ValueWithUnit object per value for bulk constraints.
+    """
+
+    @property
+    @abstractmethod
+    def value_type(self) -> Type[ValueWithUnit]:
+        """Get the scalar type of values in this array (e.g. TimeValue).
+        Meant to be overridden by subclasses."""
+
+    def __init__(self, values: Iterable[str] = (), prefix: Optional[str] = None) -> None:
+        """
+        Create an array from parsing the given strings.
+        :param values: Values encoded as strings (e.g. ["0.25 ns", "100 ps", "1"]).
+        :param prefix: If a value does not have a prefix (e.g. "0.25"), then use
+                       the given prefix, or the default prefix defined by the
+                       value type if one is not specified.
+        """
+        proto = self._prototype()
+        default_prefix = get_or_else(prefix, proto.default_prefix)
+        regex = _unit_regex(proto.unit)
+        parse = proto._parse
+        unit_type = proto.unit_type
+
+        data = array('d')
+        for value in values:
+            num, value_prefix = parse(value, regex, default_prefix, unit_type)
+            data.append(num * value_prefix)
+        self._values = data  # type: array
+
+    def _prototype(self) -> ValueWithUnit:
+        """Get an (unparsed) instance of the value type, to look up its unit properties."""
+        value_type = self.value_type
+        return value_type.__new__(value_type)
+
+    @classmethod
+    def from_values(cls: Type[_TA], values: Iterable[ValueWithUnit]) -> _TA:
+        """
+        Create an array from existing values.
+        The types of the values must match the value type of the array.
+        """
+        new = cls()
+        value_type = new.value_type
+        data = new._values
+        for value in values:
+            if type(value) != value_type:  # pylint: disable=unidiomatic-typecheck
+                raise TypeError("Types do not match")
+            data.append(value.value)
+        return new
+
+    @property
+    def values(self) -> array:
+        """Get a copy of the actual values of this array (e.g. 10 ns -> 1e-9)."""
+        return array('d', self._values)
+
+    def values_in_units(self, prefix: str, round_zeroes: bool = True) -> List[float]:
+        """Get all values in the given prefix. e.g. "ns", "mV", etc.
+
+        :param prefix: Prefix for the resulting values - e.g. "ns".
+        :param round_zeroes: True to round 1.00000001 etc to 1 within 3 decimal places.
+        """
+        scale = 1 / ValueWithUnit._prefix_table[_letter_prefix(prefix, self._prototype().unit)]
+        if round_zeroes:
+            return [round(value * scale, 3) for value in self._values]
+        else:
+            return [value * scale for value in self._values]
+
+    def str_values_in_units(self, prefix: str, round_zeroes: bool = True) -> List[str]:
+        """Get all values in the given prefix including the units.
+        e.g. return ["5 ns", "0.1 ns"].
+
+        :param prefix: Prefix for the resulting values - e.g. "ns".
+        :param round_zeroes: True to round 1.00000001 etc to 1 within 3 decimal places.
+        """
+        suffix = " " + prefix
+        return ["%g" % value + suffix for value in self.values_in_units(prefix, round_zeroes)]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, index: int) -> ValueWithUnit:
+        """Get the value at the given index as a scalar value (e.g. TimeValue)."""
+        return self.value_type._from_parts(self._values[index], 1.0)
+
+    def __iter__(self) -> Iterator[ValueWithUnit]:
+        value_type = self.value_type
+        for value in self._values:
+            yield value_type._from_parts(value, 1.0)
+
+
+class TimeValueArray(ValueWithUnitArray):
+    """Array of time values - e.g. ["4 ns", "200 ps"]."""
+
+    @property
+    def value_type(self) -> Type[ValueWithUnit]:
+        return TimeValue
+
+    def __getitem__(self, index: int) -> TimeValue:
+        return cast(TimeValue, super().__getitem__(index))
+
+    def __iter__(self) -> Iterator[TimeValue]:
+        return cast(Iterator[TimeValue], super().__iter__())
+
+
+class VoltageValueArray(ValueWithUnitArray):
+    """Array of voltage values - e.g. ["0.95 V", "900 mV"]."""
+
+    @property
+    def value_type(self) -> Type[ValueWithUnit]:
+        return VoltageValue
+
+
+class TemperatureValueArray(ValueWithUnitArray):
+    """Array of temperature values in Celsius - e.g. ["25 C", "-40 C"]."""
+
+    @property
+    def value_type(self) -> Type[ValueWithUnit]:
+        return TemperatureValue
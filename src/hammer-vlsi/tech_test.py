@@ -13,7 +13,7 @@ import os
 import shutil
 import unittest
 
-from hammer_vlsi import HammerVLSISettings
+from hammer_vlsi import CadenceTool, HammerVLSISettings
 from typing import Any, Dict, List, Optional
 
 from hammer_logging import HammerVLSILogging
@@ -270,7 +270,7 @@ class HammerTechnologyTest(HasGetTech, unittest.TestCase):
 
         prefixes_orig = [hammer_tech.PathPrefix(prefix="test", path="/tmp/test")]
 
-        prefixes = [hammer_tech.PathPrefix(prefix="test", path="/tmp/test")]
+        prefixes = [hammer_tech.PathPrefix(prefix="test", path="/tmp/test")]  # type: List[hammer_tech.LibraryPrefix]
         lib.extra_prefixes = prefixes
         # Check that we get the original back even after mutating the original list.
         prefixes.append(hammer_tech.PathPrefix(prefix="bar", path="/tmp/bar"))
@@ -281,6 +281,51 @@ class HammerTechnologyTest(HasGetTech, unittest.TestCase):
         prefixes2.append(hammer_tech.PathPrefix(prefix="bar", path="/tmp/bar"))
         self.assertEqual(lib.extra_prefixes, prefixes_orig)
 
+    def test_library_records(self) -> None:
+        """
+        Test that libraries are validated, immutable, cheap to copy and round-trip through JSON.
+        """
+        lib_dict = {
+            "name": "my_lib",
+            "lef file": "test/my_lib.lef",
+            "corner": {"nmos": "fast", "pmos": "fast", "temperature": "0 C"},
+            "supplies": {"VDD": "0.9 V", "GND": "0 V"},
+            "provides": [{"lib_type": "stdcell", "vt": "RVT"}],
+            "my custom key": {"foo": "bar"}
+        }
+        lib = hammer_tech.HammerTechnology.parse_library(lib_dict)  # type: hammer_tech.Library
+        self.assertEqual(lib.lef_file, "test/my_lib.lef")
+        self.assertEqual(lib.corner.temperature, "0 C")
+        self.assertEqual(lib.supplies.VDD, "0.9 V")
+        self.assertEqual(lib.provides[0].lib_type, "stdcell")
+        self.assertEqual(lib.gds_file, None)
+
+        # Round-trip, including properties not in the schema.
+        self.assertEqual(json.loads(lib.serialize()), lib_dict)
+        self.assertEqual(hammer_tech.library_from_json(lib.serialize()), lib)
+
+        # Records are immutable.
+        with self.assertRaises(AttributeError):
+            lib.lef_file = "test/other.lef"
+        lib2 = lib._replace(gds_file="test/my_lib.gds")
+        self.assertEqual(lib2.gds_file, "test/my_lib.gds")
+        self.assertEqual(lib.gds_file, None)
+
+        # Copies keep their own extra_prefixes.
+        prefixes = [hammer_tech.PathPrefix(prefix="test", path="/tmp/test")]  # type: List[hammer_tech.LibraryPrefix]
+        lib.extra_prefixes = prefixes
+        lib_copy = hammer_tech.copy_library(lib)
+        self.assertEqual(lib_copy, lib)
+        self.assertEqual(lib_copy.extra_prefixes, prefixes)
+        lib_copy.extra_prefixes = []
+        self.assertEqual(lib.extra_prefixes, prefixes)
+
+        # Invalid values are rejected at load.
+        with self.assertRaises(ValueError):
+            hammer_tech.HammerTechnology.parse_library({"lef file": 42})
+        with self.assertRaises(ValueError):
+            hammer_tech.HammerTechnology.parse_library({"provides": {"lib_type": "stdcell"}})
+
     def test_prepend_dir_path(self) -> None:
         """
         Test that the technology library can prepend directories correctly.
@@ -476,6 +521,65 @@ libraries: []
         # Cleanup
         shutil.rmtree(tech_dir_base)
 
+    def test_dont_use_commands(self) -> None:
+        """
+        Test that dont_use patterns are resolved against the LEF macros of the libraries.
+        """
+        import hammer_config
+
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        tech_json_filename = os.path.join(tech_dir, "dummy28.tech.json")
+
+        def add_libs_with_lef(d: Dict[str, Any]) -> Dict[str, Any]:
+            r = deepdict(d)
+            for lib, cells in [("stdcells", ["DLY1", "DLY2"]), ("other_lib", ["DLY2"])]:
+                with open(os.path.join(tech_dir, lib + ".lef"), "w") as f:
+                    for cell in cells:
+                        f.write("MACRO {c}\n  SIZE 1.0 BY 2.0 ;\nEND {c}\n".format(c=cell))
+                    f.write("END LIBRARY\n")
+                r['libraries'].append({'name': lib, 'lef file': 'test/{lib}.lef'.format(lib=lib)})
+            return r
+
+        HammerToolTestHelpers.write_tech_json(tech_json_filename, add_libs_with_lef)
+        tech = self.get_tech(hammer_tech.HammerTechnology.load_from_dir("dummy28", tech_dir))
+        tech.cache_dir = tech_dir
+        tech.logger = HammerVLSILogging.context("")
+
+        class DummyCadenceTool(CadenceTool, DummyTool):
+            @property
+            def post_synth_sdc(self) -> Optional[str]:
+                return None
+
+        tool = DummyCadenceTool()
+        tool.technology = tech
+        tool.logger = HammerVLSILogging.context("")
+        database = hammer_config.HammerDatabase()
+        database.update_project([{
+            'vlsi.inputs.dont_use_mode': 'manual',
+            'vlsi.inputs.dont_use_list': ['DLY1', 'other_lib/DLY*', '*/DLY2', 'DL?2', 'LIBERTY_ONLY',
+                                          'stdcells/NOPE']
+        }])
+        tool.set_database(database)
+        tech.set_database(database)
+
+        commands = tool.generate_dont_use_commands()
+        # Library-qualified patterns only apply to their library, and wildcards are kept so that they
+        # also match cells which only have liberty files.
+        self.assertEqual(commands[0], "set_dont_use [get_db lib_cells { */DLY1 other_lib/DLY* */DLY2 */DL?2 }]")
+        # Patterns which match no LEF macro are checked in TCL.
+        self.assertEqual(len(commands), 3)
+        self.assertIn("set_dont_use [get_db lib_cells */LIBERTY_ONLY]", commands[1])
+        self.assertIn("set_dont_use [get_db lib_cells stdcells/NOPE]", commands[2])
+
+        # The LEF files are only read again if the settings change.
+        index = tech.get_lib_cell_index()
+        self.assertIs(tech.get_lib_cell_index(), index)
+        database.update_project([{'vlsi.inputs.dont_use_mode': 'manual'}])
+        self.assertIsNot(tech.get_lib_cell_index(), index)
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+
     def test_macro_sizes(self) -> None:
         """
         Test that getting macro sizes works as expected.
@@ -531,6 +635,33 @@ END LIBRARY
         # Cleanup
         shutil.rmtree(tech_dir_base)
 
+    def test_lib_cell_index(self) -> None:
+        """
+        Test that cell patterns are resolved against the library cell index.
+        """
+        index = hammer_tech.LibraryCellIndex([
+            ("stdcells", "DLY1"),
+            ("stdcells", "DLY2"),
+            ("stdcells", "INVX1"),
+            ("other_lib", "DLY2"),
+            ("other_lib", "BUFX4")
+        ])
+        self.assertFalse(index.is_empty)
+        self.assertEqual(index.cells, ["DLY1", "DLY2", "INVX1", "BUFX4"])
+
+        self.assertEqual(index.match("DLY*"), ["DLY1", "DLY2"])
+        self.assertEqual(index.match("*/BUFX4"), ["BUFX4"])
+        self.assertEqual(index.match("other_lib/DLY*"), ["other_lib/DLY2"])
+        self.assertEqual(index.match("*_lib/*X4"), ["other_lib/BUFX4"])
+        self.assertEqual(index.match("stdcells/BUFX4"), [])
+        self.assertEqual(index.match("invx1"), [])
+
+        cells, unmatched = index.expand(["*/DLY*", "DLY1", "INV?1", "XOR*", "*/NAND2"])
+        self.assertEqual(cells, ["DLY1", "DLY2", "INVX1"])
+        self.assertEqual(unmatched, ["XOR*", "*/NAND2"])
+
+        self.assertTrue(hammer_tech.LibraryCellIndex([]).is_empty)
+
     def test_special_cells(self) -> None:
         import hammer_config
 
@@ -733,5 +864,29 @@ class StackupTest(unittest.TestCase):
                 w = w + (m.grid_unit*2)
                 self.assertLess(p, w + m.get_spacing_for_width(w))
 
+    def test_metal_grid(self) -> None:
+        # Generate multiple stackups, but we'll only use the largest for this test
+        stackup = StackupTestHelper.create_test_stackup_list()[-1]
+        for m in stackup.metals:
+            grid = m.grid
+            self.assertEqual(m.from_grid_units(grid.pitch), m.pitch)
+            self.assertEqual(m.from_grid_units(grid.min_width), m.min_width)
+            self.assertEqual(m.from_grid_units(grid.offset), m.offset)
+            for num_tracks in range(1, 40):
+                # Results in grid units and at the Decimal API boundary must agree exactly
+                # and stay on-grid.
+                for force_even in (False, True):
+                    w, s, o = grid.get_width_spacing_start_twwt(num_tracks, force_even)
+                    self.assertEqual(m.get_width_spacing_start_twwt(num_tracks, force_even),
+                                     (m.from_grid_units(w), m.from_grid_units(s), m.from_grid_units(o)))
+                    self.assertTrue(all(isinstance(x, int) for x in (w, s, o)))
+                    if force_even:
+                        self.assertEqual(w % 2, 0)
+                w, s, o = grid.get_width_spacing_start_twt(num_tracks)
+                self.assertEqual(m.get_width_spacing_start_twt(num_tracks),
+                                 (m.from_grid_units(w), m.from_grid_units(s), m.from_grid_units(o)))
+            with self.assertRaises(ValueError):
+                grid.min_spacing_and_max_width_from_pitch(grid.widths_and_spacings[0][1] - 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,10 +5,17 @@
 #
 #  See LICENSE for licence details.
 
+import asyncio
+import io
 import json
 import os
 import shutil
+import socket
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import unittest
 from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 from decimal import Decimal
@@ -20,10 +27,10 @@ from test_tool_utils import HammerToolTestHelpers, DummyTool, SingleStepTool
 import hammer_config
 import hammer_tech
 import hammer_vlsi
-from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging, Level
+from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging, HammerVLSILoggingContext, Level
 from hammer_logging.test import HammerLoggingCaptureContext
 from hammer_tech import LibraryFilter, Library, ExtraLibrary
-from hammer_utils import deeplist, deepdict, add_dicts, get_or_else
+from hammer_utils import deeplist, deepdict, add_dicts, get_or_else, to_grid_units
 
 class SDCDummyTool(hammer_vlsi.HasSDCSupport, DummyTool):
     @property
@@ -58,6 +65,56 @@ class SDCTest(unittest.TestCase):
         self.assertTrue(str1 in constraints)
         self.assertTrue(str2 in constraints)
 
+    def test_grouped_sdc_constraints(self):
+        """
+        Test that ports and clocks with identical constraints share a single command.
+        """
+        inputs = {
+            "vlsi.inputs.clocks": [
+                {"name": "clk_a", "period": "1 ns", "uncertainty": "0.1 ns"},
+                {"name": "clk_b", "period": "2 ns", "uncertainty": "100 ps"},
+                {"name": "clk_c", "period": "3 ns", "uncertainty": "0.2 ns"}
+            ],
+            "vlsi.inputs.default_output_load": 1,
+            "vlsi.inputs.output_loads": [
+                {"name": "out_a", "load": 2.0},
+                {"name": "out_b", "load": 2.0},
+                {"name": "out_c", "load": 4.0},
+                # Later constraints override earlier ones on the same port.
+                {"name": "out_c", "load": 2.0}
+            ],
+            "vlsi.inputs.delays": [
+                {"name": "in_a", "clock": "clk_a", "direction": "input", "delay": "0.5 ns"},
+                {"name": "in_b", "clock": "clk_a", "direction": "input", "delay": "500 ps"},
+                {"name": "in_c", "clock": "clk_b", "direction": "input", "delay": "0.5 ns"},
+                {"name": "in_a", "clock": "clk_a", "direction": "output", "delay": "0.5 ns"}
+            ]
+        }
+
+        tool = SDCDummyTool()
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        database.update_project([inputs])
+        tool.set_database(database)
+
+        output = io.StringIO()
+        self.assertEqual(tool.write_sdc_pin_constraints(output), 4)
+        self.assertEqual(output.getvalue().split("\n"), [
+            "set_load 1.0 [all_outputs]",
+            "set_load 2.0 [get_port {out_a out_b out_c}]",
+            "set_input_delay 0.5 -clock clk_a [get_port {in_a in_b}]",
+            "set_input_delay 0.5 -clock clk_b [get_port \"in_c\"]",
+            "set_output_delay 0.5 -clock clk_a [get_port \"in_a\"]",
+            ""
+        ])
+        self.assertEqual(tool.sdc_pin_constraints, output.getvalue())
+
+        output = io.StringIO()
+        self.assertEqual(tool.write_sdc_clock_constraints(output), 1)
+        self.assertIn("set_clock_uncertainty 0.1 [get_clocks {clk_a clk_b}]\n", output.getvalue())
+        self.assertIn("set_clock_uncertainty 0.2 [get_clocks clk_c]\n", output.getvalue())
+        self.assertEqual(tool.sdc_clock_constraints, output.getvalue())
+
 class HammerVLSILoggingTest(unittest.TestCase):
     def test_colours(self):
         """
@@ -127,6 +184,171 @@ class HammerVLSILoggingTest(unittest.TestCase):
 
 
 class HammerToolTest(HasGetTech, unittest.TestCase):
+    def test_cached_derived_settings(self) -> None:
+        """
+        Test that settings-derived values are cached until the database changes.
+        """
+        tool = SDCDummyTool()
+        database = hammer_config.HammerDatabase()
+        database.update_project([{
+            "vlsi.inputs.clocks": [{"name": "clk", "period": "1 ns"}],
+            "vlsi.inputs.supplies.power": [{"name": "VDD", "pin": "VDD"}],
+            "vlsi.inputs.delays": [{"name": "in", "clock": "clk", "direction": "input", "delay": "0.1 ns"}]
+        }])
+        tool.set_database(database)
+
+        clocks = tool.get_clock_ports()
+        again = tool.get_clock_ports()
+        self.assertEqual(clocks, again)
+        # The parsed values are reused, but callers get their own list.
+        self.assertIs(clocks[0], again[0])
+        self.assertIsNot(clocks, again)
+        again.append(clocks[0])
+        self.assertEqual(len(tool.get_clock_ports()), 1)
+        self.assertIs(tool.get_all_power_nets()[0], tool.get_all_supplies("vlsi.inputs.supplies.power")[0])
+        # Delay constraints and their array of values are parsed once.
+        delays = tool.get_delay_constraints_with_array()
+        self.assertIs(tool.get_delay_constraints_with_array(), delays)
+        self.assertEqual(tool.get_delay_constraints(), delays[0])
+
+        # Changing the database invalidates the cache.
+        tool.set_setting("vlsi.inputs.clocks", [{"name": "clk2", "period": "2 ns"}])
+        self.assertEqual([c.name for c in tool.get_clock_ports()], ["clk2"])
+        database.update_project([{"vlsi.inputs.clocks": [{"name": "clk3", "period": "3 ns"}]}])
+        # The runtime setting still overrides the project.
+        self.assertEqual([c.name for c in tool.get_clock_ports()], ["clk2"])
+        other = hammer_config.HammerDatabase()
+        other.update_project([{"vlsi.inputs.clocks": [{"name": "clk4", "period": "4 ns"}]}])
+        tool.set_database(other)
+        self.assertEqual([c.name for c in tool.get_clock_ports()], ["clk4"])
+
+    def test_incremental_steps(self) -> None:
+        """
+        Test that incremental runs skip steps whose settings and files did not change.
+        """
+        class Tool(hammer_vlsi.DummyHammerTool):
+            ran = []  # type: List[str]
+
+            @property
+            def steps(self) -> List[hammer_vlsi.HammerToolStep]:
+                return self.make_steps_from_methods([self.first, self.second, self.report])
+
+            def write(self, name: str, contents: str) -> str:
+                path = os.path.join(self.run_dir, name)
+                with open(path, "w") as f:
+                    f.write(contents)
+                return path
+
+            def first(self) -> bool:
+                Tool.ran.append("first")
+                self.add_step_output_files([self.write("first.txt", str(self.get_setting("test.value")))])
+                return True
+
+            def second(self) -> bool:
+                Tool.ran.append("second")
+                self.add_step_input_files([os.path.join(self.run_dir, "first.txt")])
+                self.add_step_output_files([self.write("second.txt", "second")])
+                return True
+
+            def report(self) -> bool:
+                # No declared outputs, so this always runs.
+                Tool.ran.append("report")
+                return True
+
+        run_dir = tempfile.mkdtemp()
+        database = hammer_config.HammerDatabase()
+        database.update_project([{"vlsi.core.incremental_steps": True, "test.value": 1}])
+
+        def run() -> List[str]:
+            Tool.ran = []
+            tool = Tool()
+            tool.logger = HammerVLSILogging.context("")
+            tool.run_dir = run_dir
+            tool.set_database(database)
+            self.assertTrue(tool.run())
+            return Tool.ran
+
+        self.assertEqual(run(), ["first", "second", "report"])
+        self.assertEqual(run(), ["report"])
+        # Changing a setting the first step read makes every step run again.
+        database.update_project([{"vlsi.core.incremental_steps": True, "test.value": 2}])
+        self.assertEqual(run(), ["first", "second", "report"])
+        self.assertEqual(run(), ["report"])
+        # Modified or deleted outputs make the step which wrote them run again.
+        with open(os.path.join(run_dir, "second.txt"), "w") as f:
+            f.write("edited")
+        self.assertEqual(run(), ["second", "report"])
+        os.remove(os.path.join(run_dir, "first.txt"))
+        # The first step writes the same contents again, so the second step can still be skipped.
+        self.assertEqual(run(), ["first", "report"])
+        # Without the setting, nothing is skipped.
+        database.update_project([{"vlsi.core.incremental_steps": False, "test.value": 2}])
+        self.assertEqual(run(), ["first", "second", "report"])
+
+        shutil.rmtree(run_dir)
+
+    def test_process_telemetry(self) -> None:
+        """
+        Test that the processes launched by steps are sampled.
+        """
+        if not hammer_vlsi.ProcessTreeSampler.supported():
+            self.skipTest("Process sampling needs /proc")
+
+        class Tool(SingleStepTool):
+            def step(self) -> bool:
+                self.run_executable([sys.executable, "-c", "import time\nx = b\"x\" * (32 << 20)\n"
+                                     "end = time.time() + 0.5\nwhile time.time() < end: pass"])
+                return True
+
+        tool = Tool()
+        tool.logger = HammerVLSILogging.context("")
+        tool.run_dir = tempfile.mkdtemp()
+        tool.submit_command = hammer_vlsi.HammerLocalSubmitCommand()
+        database = hammer_config.HammerDatabase()
+        database.update_project([{"vlsi.core.process_sample_interval": 0.05}])
+        tool.set_database(database)
+        self.assertTrue(tool.run())
+
+        telemetry = tool.process_telemetry_output()
+        self.assertEqual(len(telemetry), 1)
+        self.assertEqual(telemetry[0]["step"], "step")
+        self.assertGreater(telemetry[0]["samples"], 2)
+        self.assertEqual(telemetry[0]["peak_processes"], 1)
+        self.assertGreaterEqual(telemetry[0]["peak_threads"], 1)
+        self.assertGreater(telemetry[0]["peak_rss_kb"], 32 << 10)
+        self.assertGreater(telemetry[0]["peak_cpu_percent"], 0)
+        with open(os.path.join(tool.run_dir, "hammer-telemetry.json"), "r") as f:
+            series = json.load(f)
+        self.assertEqual(len(series[0]["times"]), telemetry[0]["samples"])
+        shutil.rmtree(tool.run_dir)
+
+        # Long series are thinned out to stay within max_samples.
+        times = hammer_vlsi.ProcessTimeSeries("step", 0.0, max_samples=8)
+        for i in range(100):
+            times.append(float(i), 0.0, i, 1, 1, 10 * i, 0)
+        self.assertLess(len(times), 8)
+        self.assertEqual(times.times[0], 0.0)
+        self.assertEqual(times.summary().peak_rss_kb, times.rss_kb[-1])
+        self.assertEqual(times.summary().read_bytes, 10 * times.rss_kb[-1])
+
+    def test_step_report_errors(self) -> None:
+        """
+        Test that failing to write the step reports does not hide the error of a step.
+        """
+        class Tool(SingleStepTool):
+            def step(self) -> bool:
+                shutil.rmtree(self.run_dir)
+                raise ValueError("step failed")
+
+        tool = Tool()
+        tool.logger = HammerVLSILogging.context("")
+        tool.run_dir = tempfile.mkdtemp()
+        tool.set_database(hammer_config.HammerDatabase())
+        with HammerLoggingCaptureContext() as log:
+            with self.assertRaisesRegex(ValueError, "step failed"):
+                tool.run()
+        self.assertTrue(log.log_contains("Unable to write the step trace"))
+
     def test_read_libs(self) -> None:
         """
         Test that HammerTool can read technology IP libraries and filter/process them.
@@ -247,6 +469,213 @@ class HammerToolTest(HasGetTech, unittest.TestCase):
         shutil.rmtree(tech_dir_base)
         shutil.rmtree(test.run_dir)
 
+    def create_mmmc_tech(self) -> Tuple[str, str, hammer_tech.HammerTechnology]:
+        """
+        Create a technology with libraries for several operating conditions.
+        :return: Tuple of tech_dir, tech_dir_base (which the caller must delete) and the technology.
+        """
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        tech_json_filename = os.path.join(tech_dir, "dummy28.tech.json")
+
+        def make_lib(name: str, voltage: str, temp: str) -> Dict[str, Any]:
+            for ext in ("lib", "qrc"):
+                with open(os.path.join(tech_dir, "{n}.{e}".format(n=name, e=ext)), "w") as f:
+                    f.write("")
+            return {
+                "nldm liberty file": "test/{n}.lib".format(n=name),
+                "qrc techfile": "test/{n}.qrc".format(n=name),
+                "corner": {"nmos": "typical", "pmos": "typical", "temperature": temp},
+                "supplies": {"VDD": voltage, "GND": "0 V"}
+            }
+
+        tech_json = {
+            "name": "dummy28",
+            "installs": [
+                {
+                    "path": "test",
+                    "base var": ""  # means relative to tech dir
+                }
+            ],
+            "libraries": [
+                make_lib("slow", "0.81 V", "125 C"),
+                make_lib("slow_sram", "810 mV", "125.0 C"),
+                make_lib("fast", "0.99 V", "-40 C"),
+                {"nldm liberty file": "test/no_corner.lib"}
+            ]
+        }
+        with open(tech_json_filename, "w") as f:
+            f.write(json.dumps(tech_json, indent=4))
+        tech = self.get_tech(hammer_tech.HammerTechnology.load_from_dir("dummy28", tech_dir))
+        tech.cache_dir = tech_dir
+        tech.logger = HammerVLSILogging.context("")
+        return tech_dir, tech_dir_base, tech
+
+    def test_read_libs_for_mmmc_corners(self) -> None:
+        """
+        Test that libraries are resolved for several MMMC corners at once.
+        """
+        import hammer_config
+
+        tech_dir, tech_dir_base, tech = self.create_mmmc_tech()
+
+        database = hammer_config.HammerDatabase()
+        database.update_project([{"vlsi.inputs.mmmc_corners": [
+            {"name": "ss", "type": "setup", "voltage": "0.81 V", "temp": "125 C"}
+        ]}])
+        tool = DummyTool()
+        tool.technology = tech
+        tool.set_database(database)
+        tech.set_database(database)
+
+        table = tool.get_mmmc_library_table()
+        self.assertEqual(len(table), 2)
+        self.assertEqual(len(table[(0.81, 125.0)]), 2)
+
+        corners = [
+            hammer_vlsi.MMMCCorner(name="ss", type=hammer_vlsi.MMMCCornerType.Setup, voltage=hammer_vlsi.units.VoltageValue("0.81 V"), temp=hammer_vlsi.units.TemperatureValue("125 C")),
+            hammer_vlsi.MMMCCorner(name="ff", type=hammer_vlsi.MMMCCornerType.Hold, voltage=hammer_vlsi.units.VoltageValue("0.99 V"), temp=hammer_vlsi.units.TemperatureValue("-40 C")),
+            hammer_vlsi.MMMCCorner(name="tt", type=hammer_vlsi.MMMCCornerType.Extra, voltage=hammer_vlsi.units.VoltageValue("0.9 V"), temp=hammer_vlsi.units.TemperatureValue("25 C")),
+            hammer_vlsi.MMMCCorner(name="ss2", type=hammer_vlsi.MMMCCornerType.Extra, voltage=hammer_vlsi.units.VoltageValue("810 mV"), temp=hammer_vlsi.units.TemperatureValue("125 C"))
+        ]
+        libs = tool.read_libs_for_mmmc_corners(corners, [hammer_tech.filters.timing_lib_filter,
+                                                         hammer_tech.filters.qrc_tech_filter],
+                                               hammer_tech.HammerTechnologyUtils.to_plain_item, must_exist=False)
+        slow = ["{0}/slow.lib".format(tech_dir), "{0}/slow_sram.lib".format(tech_dir),
+                "{0}/slow.qrc".format(tech_dir), "{0}/slow_sram.qrc".format(tech_dir)]
+        self.assertEqual(libs, [
+            slow,
+            ["{0}/fast.lib".format(tech_dir), "{0}/fast.qrc".format(tech_dir)],
+            [],
+            slow
+        ])
+
+        # The batch API must agree with the per-corner filter.
+        for corner, corner_libs in zip(corners, libs):
+            self.assertEqual(corner_libs, tech.read_libs(
+                [hammer_tech.filters.timing_lib_filter, hammer_tech.filters.qrc_tech_filter],
+                hammer_tech.HammerTechnologyUtils.to_plain_item,
+                extra_pre_filters=[tool.filter_for_mmmc(voltage=corner.voltage, temp=corner.temp)],
+                must_exist=False))
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+
+    def test_mmmc_script(self) -> None:
+        """
+        Test that the MMMC script covers every corner and shares library sets.
+        """
+        tech_dir, tech_dir_base, tech = self.create_mmmc_tech()
+
+        class Tool(hammer_vlsi.CadenceTool, DummyTool):
+            @property
+            def post_synth_sdc(self) -> Optional[str]:
+                return None
+
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        corners = {"vlsi.inputs.mmmc_corners": [
+            {"name": "ss", "type": "setup", "voltage": "0.81 V", "temp": "125 C"},
+            {"name": "ss_sram", "type": "setup", "voltage": "810 mV", "temp": "125 C"},
+            {"name": "ff", "type": "hold", "voltage": "0.99 V", "temp": "-40 C"},
+            {"name": "ss", "type": "extra", "voltage": "0.81 V", "temp": "125 C"}
+        ]}  # type: Dict[str, Any]
+        database.update_project([corners])
+        tool = Tool()
+        tool.technology = tech
+        tool.set_database(database)
+        tech.set_database(database)
+        tool.run_dir = tempfile.mkdtemp()
+
+        cmds = list(filter(lambda l: not l.startswith("puts"), tool.generate_mmmc_script().split("\n")))
+        library_sets = list(filter(lambda l: l.startswith("create_library_set"), cmds))
+        self.assertEqual(len(library_sets), 2)
+        self.assertTrue(library_sets[0].startswith("create_library_set -name ss.setup_set "))
+        self.assertTrue(library_sets[1].startswith("create_library_set -name ff.hold_set "))
+        self.assertTrue("create_timing_condition -name ss_sram.setup_cond -library_sets [list ss.setup_set]" in cmds)
+        self.assertTrue("create_timing_condition -name ss.extra_cond -library_sets [list ss.setup_set]" in cmds)
+        self.assertTrue("create_rc_corner -name ff.hold_rc -temperature -40.0 -qrc_tech {0}/fast.qrc".format(tech_dir)
+                        in cmds)
+        for view in ["ss.setup", "ss_sram.setup", "ff.hold", "ss.extra"]:
+            self.assertTrue(
+                "create_delay_corner -name {v}_delay -timing_condition {v}_cond -rc_corner {v}_rc".format(v=view)
+                in cmds)
+        self.assertEqual(cmds[-1], "set_analysis_view -setup { ss.setup_view ss_sram.setup_view } "
+                                   "-hold { ff.hold_view }")
+
+        # Extra views are only analyzed with the hold views if requested.
+        database.update_project([corners, {"vlsi.inputs.mmmc_extra_views_in_hold": True}])
+        cmds = tool.generate_mmmc_script().split("\n")
+        self.assertEqual(cmds[-1], "set_analysis_view -setup { ss.setup_view ss_sram.setup_view } "
+                                   "-hold { ff.hold_view ss.extra_view }")
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+        shutil.rmtree(tool.run_dir)
+
+    def test_mmmc_script_incremental(self) -> None:
+        """
+        Test that incremental runs skip writing the MMMC script and its SDC fragments if nothing changed.
+        """
+        tech_dir, tech_dir_base, tech = self.create_mmmc_tech()
+
+        class Tool(hammer_vlsi.CadenceTool, SingleStepTool):
+            runs = 0
+
+            @property
+            def post_synth_sdc(self) -> Optional[str]:
+                return None
+
+            def step(self) -> bool:
+                Tool.runs += 1
+                self.write_mmmc_script()
+                return True
+
+        run_dir = tempfile.mkdtemp()
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        corners = {"vlsi.inputs.mmmc_corners": [
+            {"name": "ss", "type": "setup", "voltage": "0.81 V", "temp": "125 C"},
+            {"name": "ff", "type": "hold", "voltage": "0.99 V", "temp": "-40 C"}
+        ]}  # type: Dict[str, Any]
+        database.update_project([corners, {"vlsi.core.incremental_steps": True}])
+        tech.set_database(database)
+
+        def run() -> int:
+            Tool.runs = 0
+            tool = Tool()
+            tool.logger = HammerVLSILogging.context("")
+            tool.technology = tech
+            tool.run_dir = run_dir
+            tool.set_database(database)
+            self.assertTrue(tool.run())
+            return Tool.runs
+
+        mmmc_path = os.path.join(run_dir, "mmmc.tcl")
+        self.assertEqual(run(), 1)
+        with open(mmmc_path) as f:
+            mmmc = f.read()
+        self.assertTrue("create_delay_corner -name ff.hold_delay" in mmmc)
+        # Nothing changed, so the step is skipped.
+        self.assertEqual(run(), 0)
+        # Deleted fragments, changed settings and a changed tech JSON make it run again.
+        os.remove(os.path.join(run_dir, "pin_constraints_fragment.sdc"))
+        self.assertEqual(run(), 1)
+        self.assertTrue(os.path.isfile(os.path.join(run_dir, "pin_constraints_fragment.sdc")))
+        self.assertEqual(run(), 0)
+        database.update_project([corners, {"vlsi.core.incremental_steps": True,
+                                           "vlsi.inputs.mmmc_extra_views_in_hold": True}])
+        self.assertEqual(run(), 1)
+        self.assertEqual(run(), 0)
+        with open(os.path.join(tech_dir, "dummy28.tech.json"), "a") as f:
+            f.write("\n")
+        self.assertEqual(run(), 1)
+        with open(mmmc_path) as f:
+            self.assertEqual(f.read(), mmmc)
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+        shutil.rmtree(run_dir)
+
     def test_read_extra_libs(self) -> None:
         """
         Test that HammerTool can read/process extra IP libraries in addition to those of the technology.
@@ -500,7 +929,8 @@ export lol=abc"cat"
                          {"name": "VSS", "x": 1, "y": 1},
                          {"name": "VSS", "no_connect": true, "x": 2, "y": 2},
                          {"x": 3, "y": 3},
-                         {"name": "VSS", "x": 14, "y": 14}
+                         {"name": "VSS", "x": 14, "y": 14},
+                         {"name": "VDDA", "x": 4.5, "y": 7}
                      ]
                  }
  }
@@ -512,8 +942,15 @@ export lol=abc"cat"
              my_bumps = test.get_bumps()
          self.assertTrue(c.log_contains("Invalid bump assignment"))
          assert my_bumps is not None
-         # Only one of the assignments is invalid so the above 7 becomes 6
-         self.assertEqual(len(my_bumps.assignments), 6)
+         # Only one of the assignments is invalid so the above 8 becomes 7
+         self.assertEqual(len(my_bumps.assignments), 7)
+         vss = my_bumps.assignments.get(14, 14)
+         assert vss is not None
+         self.assertEqual(vss.name, "VSS")
+         # Half-pitch bumps are kept.
+         vdda = my_bumps.assignments.get(Decimal("4.5"), 7)
+         assert vdda is not None
+         self.assertEqual((vdda.name, vdda.x, vdda.y), ("VDDA", Decimal("4.5"), Decimal(7)))
 
          # Cleanup
          shutil.rmtree(tech_dir_base)
@@ -649,6 +1086,70 @@ export lol=abc"cat"
         shutil.rmtree(tech_dir_base)
         shutil.rmtree(test.run_dir)
 
+    def test_pin_expansion(self) -> None:
+        """
+        Test that pin patterns are expanded against the top-level ports and merged.
+        """
+        import hammer_config
+
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        tech_json_filename = os.path.join(tech_dir, "dummy28.tech.json")
+        def add_stackup(in_dict: Dict[str, Any]) -> Dict[str, Any]:
+            out_dict = deepdict(in_dict)
+            out_dict["stackups"] = [StackupTestHelper.create_test_stackup_dict(8)]
+            return out_dict
+        HammerToolTestHelpers.write_tech_json(tech_json_filename, add_stackup)
+        tech = self.get_tech(hammer_tech.HammerTechnology.load_from_dir("dummy28", tech_dir))
+        tech.cache_dir = tech_dir
+        tech.logger = HammerVLSILogging.context("")
+
+        test = DummyTool()
+        test.logger = HammerVLSILogging.context("")
+        test.run_dir = tempfile.mkdtemp()
+        test.technology = tech
+        database = hammer_config.HammerDatabase()
+        settings = """
+{
+    "technology.core.stackup": "StackupWith8Metals",
+    "vlsi.inputs.pin_mode": "generated",
+    "vlsi.inputs.pin.assignments": [
+        {"pins": "data[*]", "side": "top", "layers": ["M5"]},
+        {"pins": "valid ready rdy", "side": "top", "layers": ["M5"]},
+        {"pins": "clock", "side": "left", "layers": ["M4"]},
+        {"pins": "data[3]", "side": "left", "layers": ["M4"]},
+        {"pins": "tx_n", "preplaced": true},
+        {"pins": "tx_n", "preplaced": true},
+        {"pins": "missing* data_out[7:4]", "side": "right", "layers": ["M4"]}
+    ]
+}
+"""
+        database.update_project([hammer_config.load_config_from_string(settings, is_yaml=False)])
+        test.set_database(database)
+
+        # Without a port list, patterns are kept and only duplicates are removed.
+        with HammerLoggingCaptureContext() as c:
+            my_pins = test.get_pin_assignments()
+        self.assertEqual(len(c.logs), 0)
+        self.assertEqual(len(my_pins), 6)
+
+        ports = ["clock", "data[0]", "data[1]", "data[2]", "data[3]", "data3", "valid", "ready", "tx_n"]
+        with HammerLoggingCaptureContext() as c:
+            my_pins = test.get_pin_assignments(ports)
+        # Patterns which match no port are reported one by one and left to the CAD tool.
+        for pattern in ["rdy", "missing*", "data_out[7:4]"]:
+            self.assertTrue(c.log_contains("Pins {p} do not match any top-level port".format(p=pattern)))
+        self.assertTrue(c.log_contains("1 pins have conflicting assignments (e.g. data[3])"))
+        self.assertEqual(my_pins, [
+            hammer_vlsi.PinAssignment(pins="data[0] data[1] data[2] valid ready rdy", side="top", layers=["M5"], preplaced=False),
+            hammer_vlsi.PinAssignment(pins="data[3] clock", side="left", layers=["M4"], preplaced=False),
+            hammer_vlsi.PinAssignment(pins="tx_n", side=None, layers=[], preplaced=True),
+            hammer_vlsi.PinAssignment(pins="missing* data_out[7:4]", side="right", layers=["M4"], preplaced=False)
+        ])
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+        shutil.rmtree(test.run_dir)
+
 
 T = TypeVar('T')
 
@@ -714,6 +1215,29 @@ class HammerToolHooksTest(unittest.TestCase):
             for i in range(1, 5):
                 self.assertEqual(self.read(os.path.join(c.temp_dir, "step{}.txt".format(i))), "step{}".format(i))
 
+    def test_step_timings(self) -> None:
+        """Test that steps and hooks are timed and exported."""
+        with self.create_context() as c:
+            success, syn_output = c.driver.run_synthesis()
+            self.assertTrue(success)
+
+            timings = syn_output["synthesis.outputs.step_timings"]
+            self.assertEqual([t["name"] for t in timings], [
+                "pre_steps", "step1", "between_steps", "step2", "between_steps", "step3",
+                "between_steps", "step4", "post_steps"])
+            self.assertEqual(set(t["category"] for t in timings[1::2]), {"step"})
+            for timing in timings:
+                self.assertGreaterEqual(timing["wall_time"], 0)
+                self.assertGreater(timing["max_rss_kb"], 0)
+            syn_tool = c.driver.syn_tool
+            assert syn_tool is not None
+            self.assertEqual(timings, [t._asdict() for t in syn_tool.step_timings])
+
+            trace = json.loads(self.read(os.path.join(syn_tool.run_dir, "hammer-trace.json")))
+            events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+            self.assertEqual([e["name"] for e in events], [t["name"] for t in timings])
+            self.assertEqual(events[1]["dur"], int(timings[1]["wall_time"] * 1e6))
+
     def test_replacement_hooks(self) -> None:
         """Test that replacement hooks work."""
         with self.create_context() as c:
@@ -916,6 +1440,85 @@ class HammerToolHooksTest(unittest.TestCase):
                 else:
                     self.assertFalse(os.path.exists(file))
 
+    def test_parallel_steps(self) -> None:
+        """Test that steps which declare their dependencies run concurrently, and that hooks still work."""
+        # Both branches must be inside the barrier at the same time, so it breaks if they run sequentially.
+        barrier = threading.Barrier(2, timeout=10)
+        order = []  # type: List[str]
+        timings = []  # type: List[hammer_vlsi.StepTiming]
+
+        class Tool(hammer_vlsi.DummyHammerTool):
+            @property
+            def steps(self) -> List[hammer_vlsi.HammerToolStep]:
+                return [
+                    self.make_step_from_method(self.setup),
+                    self.make_step_from_method(self.left, depends_on=["setup"]),
+                    self.make_step_from_method(self.right, depends_on=["setup"]),
+                    self.make_step_from_method(self.finish)
+                ]
+
+            def setup(self) -> bool:
+                order.append("setup")
+                return True
+
+            def left(self) -> bool:
+                barrier.wait()
+                order.append("left")
+                return True
+
+            def right(self) -> bool:
+                barrier.wait()
+                order.append("right")
+                return True
+
+            def finish(self) -> bool:
+                order.append("finish")
+                return True
+
+        def before_right(x: hammer_vlsi.HammerTool) -> bool:
+            order.append("before_right")
+            return True
+
+        def run(max_threads: int, hooks: List[hammer_vlsi.HammerToolHookAction]) -> bool:
+            order.clear()
+            barrier.reset()
+            tool = Tool()
+            tool.logger = HammerVLSILogging.context("")
+            tool.run_dir = tempfile.mkdtemp()
+            database = hammer_config.HammerDatabase()
+            database.update_project([{"vlsi.core.max_threads": max_threads}])
+            tool.set_database(database)
+            try:
+                return tool.run(hooks)
+            finally:
+                timings[:] = tool.step_timings
+                shutil.rmtree(tool.run_dir)
+
+        self.assertTrue(run(2, []))
+        self.assertEqual(order[0], "setup")
+        self.assertEqual(set(order[1:3]), {"left", "right"})
+        self.assertEqual(order[3], "finish")
+        # Concurrent steps show up on separate threads in the trace.
+        threads = {t.name: t.to_trace_event(pid=1)["tid"] for t in timings}
+        self.assertNotEqual(threads["left"], threads["right"])
+
+        # The inserted step runs before its target without serializing the branches.
+        self.assertTrue(run(2, [hammer_vlsi.HammerTool.make_pre_insertion_hook("right", before_right)]))
+        self.assertLess(order.index("before_right"), order.index("right"))
+        self.assertEqual(order[-1], "finish")
+
+        # Resume and pause hooks still apply in list order.
+        barrier = threading.Barrier(1)
+        self.assertTrue(run(2, hammer_vlsi.HammerTool.make_from_to_hooks("right", "right")))
+        self.assertEqual(order, ["right"])
+
+        # Dependencies must refer to earlier steps.
+        with self.assertRaises(ValueError):
+            hammer_vlsi.HammerTool.get_step_dependencies([
+                hammer_vlsi.HammerToolStep(before_right, "a", ("b",)),
+                hammer_vlsi.HammerToolStep(before_right, "b")
+            ])
+
 
 class HammerSubmitCommandTestContext:
 
@@ -925,7 +1528,7 @@ class HammerSubmitCommandTestContext:
         self.test = test  # type unittest.TestCase
         self.logger = HammerVLSILogging.context("")
         self._driver = None  # type: Optional[hammer_vlsi.HammerDriver]
-        if cmd_type not in ["lsf", "local"]:
+        if cmd_type not in ["lsf", "slurm", "sge", "ssh", "local", "pool"]:
             raise NotImplementedError("Have not built a test for %s yet" % cmd_type)
         self._cmd_type = cmd_type
         self._submit_command = None  # type: Optional[hammer_vlsi.HammerSubmitCommand]
@@ -955,7 +1558,7 @@ class HammerSubmitCommandTestContext:
             "synthesis.inputs.input_files": ("/dev/null",),
             "synthesis.mocksynth.temp_folder": temp_dir,
             "synthesis.submit.command": self._cmd_type
-        }
+        }  # type: Dict[str, Any]
         if self._cmd_type is "lsf":
             json_content.update({
                 "synthesis.submit.settings": [{"lsf": {
@@ -973,6 +1576,54 @@ class HammerSubmitCommandTestContext:
                 "vlsi.submit.settings_meta": "lazyappend"
             })
 
+        test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test")
+        if self._cmd_type == "slurm":
+            json_content.update({
+                "synthesis.submit.settings": [{"slurm": {
+                    "srun_binary": os.path.join(test_dir, "mock_srun.sh"),
+                    "sbatch_binary": os.path.join(test_dir, "mock_sbatch.sh"),
+                    "squeue_binary": os.path.join(test_dir, "mock_squeue.sh"),
+                    "partition": "mypartition",
+                    "num_cpus": 4,
+                    "memory_mb": 2048,
+                    "extra_args": ("--exclusive",),
+                    "poll_interval": 0.05
+                }}],
+                "synthesis.submit.settings_meta": "lazyappend"
+            })
+
+        if self._cmd_type == "sge":
+            json_content.update({
+                "synthesis.submit.settings": [{"sge": {
+                    "qsub_binary": os.path.join(test_dir, "mock_qsub.sh"),
+                    "queue": "myqueue",
+                    "num_cpus": 4,
+                    "memory_mb": 2048
+                }}],
+                "synthesis.submit.settings_meta": "lazyappend"
+            })
+
+        if self._cmd_type == "ssh":
+            json_content.update({
+                "synthesis.submit.settings": [{"ssh": {
+                    "hosts": ["busy", "idle", "down"],
+                    "ssh_binary": os.path.join(test_dir, "mock_ssh.sh"),
+                    "load_probe": "case $MOCK_SSH_HOST in busy) printf '8.0 7.5 7.0\\n2\\n';; "
+                                  "*) printf '0.5 0.5 0.5\\n4\\n';; esac"
+                }}],
+                "synthesis.submit.settings_meta": "lazyappend"
+            })
+
+        if self._cmd_type == "pool":
+            json_content.update({
+                "synthesis.submit.settings": [{"pool": {
+                    "state_dir": os.path.join(temp_dir, "pool"),
+                    "slots": 2,
+                    "poll_interval": 0.05
+                }}],
+                "synthesis.submit.settings_meta": "lazyappend"
+            })
+
         with open(json_path, "w") as f:
             f.write(json.dumps(json_content, indent=4))
 
@@ -1038,6 +1689,295 @@ class HammerSubmitCommandTest(unittest.TestCase):
             self.assertEqual(output[4 + has_resource], "COMMAND is: %s" % ' '.join(c.echo_command))
             self.assertEqual(output[5 + has_resource], ' '.join(c.echo_command_args))
 
+    def test_pool_submit(self) -> None:
+        """ Test that the job pool limits the number of concurrent jobs """
+        with self.create_context("pool") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerPoolSubmitCommand)
+            output = cmd.submit(c.echo_command, c.env, c.logger).splitlines()
+            self.assertEqual(output[0], ' '.join(c.echo_command_args))
+            self.assertEqual(len(cmd.queue_wait_times), 1)
+
+            # Jobs start in the order they were queued, one at a time if each one takes the whole pool.
+            # Each job appends the pool state it sees to a file.
+            state_path = os.path.join(c.temp_dir, "pool", "pool.json")
+            seen_path = os.path.join(c.temp_dir, "seen.txt")
+            job = ["sh", "-c", "cat {state} >> {seen}; echo '###' >> {seen}".format(state=state_path, seen=seen_path)]
+            cmd.settings = cmd.settings._replace(num_cpus=2)
+            # Hold the whole pool until all jobs are queued.
+            with open(state_path, "w") as f:
+                json.dump({"running": {"blocker": {"id": "blocker", "host": socket.gethostname(), "pid": os.getpid(),
+                                                   "slots": 2, "memory_mb": 0}}, "queue": []}, f)
+
+            async def four() -> List[str]:
+                jobs = [asyncio.ensure_future(cmd.submit_async(job, c.env, c.logger)) for _ in range(4)]
+                while True:
+                    with open(state_path, "r") as f:
+                        queue = [j["id"] for j in json.load(f)["queue"]]
+                    if len(queue) == 4:
+                        break
+                    await asyncio.sleep(0.05)
+                cmd.release("blocker")
+                await asyncio.gather(*jobs)
+                return queue
+            queue = self.run_async(four())
+            with open(seen_path, "r") as f:
+                seen = [json.loads(s) for s in f.read().split("###")[:-1]]
+            self.assertEqual([list(s["running"].keys()) for s in seen], [[job_id] for job_id in queue])
+            self.assertEqual([[j["id"] for j in s["queue"]] for s in seen], [queue[i + 1:] for i in range(4)])
+            self.assertEqual(len(cmd.queue_wait_times), 5)
+            cmd.settings = cmd.settings._replace(num_cpus=1)
+
+            # Reservations of processes which died are dropped.
+            dead = subprocess.Popen(["true"])
+            dead.wait()
+            with open(state_path, "r") as f:
+                state = json.load(f)
+            self.assertEqual(state, {"running": {}, "queue": []})
+            with open(state_path, "w") as f:
+                json.dump({"running": {"dead": {"id": "dead", "host": socket.gethostname(), "pid": dead.pid,
+                                                "slots": 2, "memory_mb": 0}}, "queue": []}, f)
+            with HammerLoggingCaptureContext() as log:
+                cmd.submit(["true"], c.env, c.logger)
+            self.assertFalse(log.log_contains("Waiting for"))
+
+        with self.assertRaises(ValueError):
+            hammer_vlsi.HammerPoolSettings.from_setting({"slots": 2, "num_cpus": 4})
+
+    def test_output_capture(self) -> None:
+        """ Test that long outputs are logged to a file and only their end is kept """
+        with self.create_context("local") as c:
+            c.driver.update_project_configs(c.driver.project_configs + [{
+                "vlsi.submit.log_dir": os.path.join(c.temp_dir, "logs"),
+                "vlsi.submit.output_tail_bytes": 1000
+            }])
+            cmd = hammer_vlsi.HammerSubmitCommand.get("synthesis", c.database)
+            output = cmd.submit(["seq", "20000"], c.env, c.logger)
+            lines = output.splitlines()
+            self.assertTrue(lines[0].startswith("... ("))
+            # The tail starts at a line boundary.
+            self.assertEqual(lines[1:], [str(i) for i in range(20001 - len(lines) + 1, 20001)])
+            self.assertLessEqual(len("\n".join(lines[1:])), 1000)
+
+            logs = os.listdir(os.path.join(c.temp_dir, "logs"))
+            self.assertEqual(len(logs), 1)
+            self.assertTrue(logs[0].endswith("-seq.log"))
+            with open(os.path.join(c.temp_dir, "logs", logs[0]), "r") as f:
+                self.assertEqual(f.read(), "".join("{}\n".format(i) for i in range(1, 20001)))
+
+        # Lines forwarded to the log are rate limited.
+        with HammerLoggingCaptureContext() as log:
+            capture = hammer_vlsi.HammerOutputCapture(HammerVLSILogging.context("capture"), lines_per_second=10)
+            for i in range(100):
+                capture.feed("line {}\n".format(i).encode("utf-8"))
+            capture.feed(b"no newline")
+            self.assertEqual(capture.close(), "".join("line {}\n".format(i) for i in range(100)) + "no newline")
+        self.assertTrue(log.log_contains("line 9"))
+        self.assertFalse(log.log_contains("line 10"))
+        self.assertTrue(log.log_contains("(91 lines not shown)"))
+
+    @staticmethod
+    def overlap_job(markers_path: str, name: str, jobs: int) -> List[str]:
+        """
+        Get a command which logs its start to the given file, waits (up to 10 s) until the given
+        number of jobs have started, logs its end, and prints its name.
+        If the jobs run concurrently, all of their starts are logged before any of their ends.
+        """
+        script = "echo start >> {f}; n=0; while [ $(grep -c start {f}) -lt {jobs} ] && [ $n -lt 200 ]; do " \
+                 "sleep 0.05; n=$((n+1)); done; echo end >> {f}; echo {name}".format(f=markers_path, jobs=jobs,
+                                                                                     name=name)
+        return ["sh", "-c", script]
+
+    def assert_overlapped(self, markers_path: str, jobs: int) -> None:
+        """Check that the jobs of overlap_job all started before any of them ended."""
+        with open(markers_path, "r") as f:
+            markers = f.read().split()
+        self.assertEqual(markers, ["start"] * jobs + ["end"] * jobs)
+
+    @staticmethod
+    def run_async(coroutine: Any) -> Any:
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_submit_async(self) -> None:
+        """ Test that asynchronous submissions capture output and can run concurrently """
+        with self.create_context("local") as c:
+            cmd = c.submit_command
+            output = self.run_async(cmd.submit_async(c.echo_command, c.env, c.logger)).splitlines()
+            self.assertEqual(output[0], ' '.join(c.echo_command_args))
+
+            # Long lines and output without a final newline are captured whole.
+            output = self.run_async(cmd.submit_async(
+                ["sh", "-c", "printf 'a%.0s' $(seq 100000); echo; printf end"], c.env, c.logger))
+            self.assertEqual(output, "a" * 100000 + "\nend")
+
+            # Jobs run concurrently.
+            markers = os.path.join(c.temp_dir, "markers.txt")
+
+            async def three() -> List[str]:
+                jobs = [cmd.submit_async(self.overlap_job(markers, str(i), 3), c.env, c.logger) for i in range(3)]
+                return list(await asyncio.gather(*jobs))
+            self.assertEqual(self.run_async(three()), ["0\n", "1\n", "2\n"])
+            self.assert_overlapped(markers, 3)
+
+            # Timeouts and cancellation terminate the job.
+            start = time.time()
+            with self.assertRaises(asyncio.TimeoutError):
+                self.run_async(cmd.submit_async(["sleep", "10"], c.env, c.logger, timeout=0.2))
+            self.assertLess(time.time() - start, 5)
+
+            async def cancelled() -> None:
+                task = asyncio.ensure_future(cmd.submit_async(["sleep", "10"], c.env, c.logger))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                await task
+            start = time.time()
+            with self.assertRaises(asyncio.CancelledError):
+                self.run_async(cancelled())
+            self.assertLess(time.time() - start, 5)
+
+            # Nonzero exit codes are reported.
+            with HammerLoggingCaptureContext() as log:
+                self.run_async(cmd.submit_async(["sh", "-c", "exit 3"], c.env, c.logger))
+            self.assertTrue(log.log_contains("exited with code 3"))
+
+        # Submit commands without a local command-line fall back to running submit in a worker thread.
+        class BlockingSubmitCommand(hammer_vlsi.HammerSubmitCommand):
+            def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:
+                pass
+
+            def submit(self, args: List[str], env: Dict[str, str],
+                       logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+                return "submitted " + " ".join(args)
+
+        output = self.run_async(BlockingSubmitCommand().submit_async(
+            ["echo", "hi"], {}, HammerVLSILogging.context()))
+        self.assertEqual(output, "submitted echo hi")
+
+    def test_lsf_submit_async(self) -> None:
+        """ Test that an asynchronous LSF submission goes through bsub """
+        with self.create_context("lsf") as c:
+            cmd = c.submit_command
+            output = self.run_async(cmd.submit_async(c.echo_command, c.env, c.logger)).splitlines()
+            self.assertEqual(output[0], "BLOCKING is: 1")
+            self.assertEqual(output[-2], "COMMAND is: %s" % ' '.join(c.echo_command))
+            self.assertEqual(output[-1], ' '.join(c.echo_command_args))
+
+    def test_slurm_submit(self) -> None:
+        """ Test that a Slurm submission goes through srun, or through sbatch and squeue when not blocking """
+        with self.create_context("slurm") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerSlurmSubmitCommand)
+            output = cmd.submit(c.echo_command, c.env, c.logger).splitlines()
+            self.assertEqual(output, [
+                "PARTITION is: mypartition",
+                "NUMCPU is: 4",
+                "MEMORY is: 2048M",
+                "EXTRA is: --exclusive",
+                "COMMAND is: %s" % ' '.join(c.echo_command),
+                ' '.join(c.echo_command_args)
+            ])
+
+            cmd.settings = cmd.settings._replace(blocking=False)
+            cmd.log_dir = c.temp_dir
+            # Jobs of a batch run concurrently and their outputs come back in order.
+            markers = os.path.join(c.temp_dir, "markers.txt")
+            outputs = cmd.submit_batch([self.overlap_job(markers, "job%d" % i, 3) for i in range(3)] + [["pwd"]],
+                                       c.env, c.logger, cwd=c.temp_dir)
+            self.assert_overlapped(markers, 3)
+            self.assertEqual([o.strip() for o in outputs[:3]], ["job0", "job1", "job2"])
+            self.assertEqual(os.path.realpath(outputs[3].strip()), os.path.realpath(c.temp_dir))
+
+            output = self.run_async(cmd.submit_async(c.echo_command, c.env, c.logger))
+            self.assertEqual(output.splitlines(), [' '.join(c.echo_command_args)])
+
+    def test_sge_submit(self) -> None:
+        """ Test that an SGE submission goes through qsub -sync y """
+        with self.create_context("sge") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerSGESubmitCommand)
+            cmd.log_dir = c.temp_dir
+            expected = [
+                "QUEUE is: myqueue",
+                "PE is: smp 4",
+                "RESOURCE is: h_vmem=512M",
+                "COMMAND is: %s" % ' '.join(c.echo_command),
+                ' '.join(c.echo_command_args)
+            ]
+            self.assertEqual(cmd.submit(c.echo_command, c.env, c.logger).splitlines(), expected)
+            output = self.run_async(cmd.submit_async(c.echo_command, c.env, c.logger))
+            self.assertEqual(output.splitlines(), expected)
+
+    def test_ssh_submit(self) -> None:
+        """ Test that SSH submissions go to the least loaded host with the same environment and directory """
+        with self.create_context("ssh") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerSSHSubmitCommand)
+            output = cmd.submit(c.echo_command, c.env, c.logger).splitlines()
+            self.assertEqual(output, [' '.join(c.echo_command_args)])
+
+            env = {"HAMMER_TEST_VAR": "go 'bears'", "SSH_CONNECTION": "local only"}
+            output = cmd.submit(["sh", "-c", 'echo "$MOCK_SSH_HOST $HAMMER_TEST_VAR $SSH_CONNECTION"; pwd'], env,
+                                c.logger, cwd=c.temp_dir).splitlines()
+            self.assertEqual(output[0], "idle go 'bears' ")
+            self.assertEqual(os.path.realpath(output[1]), os.path.realpath(c.temp_dir))
+
+            # Jobs which are already running count towards the load of a host.
+            cmd.settings = cmd.settings._replace(hosts=["idle1", "idle2"])
+
+            async def two() -> List[str]:
+                return await asyncio.gather(*[cmd.submit_async(["sh", "-c", "sleep 0.3; echo $MOCK_SSH_HOST"],
+                                                               c.env, c.logger) for _ in range(2)])
+            self.assertEqual(sorted(o.strip() for o in self.run_async(two())), ["idle1", "idle2"])
+
+            cmd.settings = cmd.settings._replace(hosts=["down1", "down2"])
+            with self.assertRaises(ValueError):
+                cmd.submit(c.echo_command, c.env, c.logger)
+
+    def test_lsf_nonblocking_submit(self) -> None:
+        """ Test that non-blocking LSF submissions run as job arrays and are polled with bjobs """
+        with self.create_context("lsf") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerLSFSubmitCommand)
+            test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test")
+            cmd.settings = cmd.settings._replace(
+                blocking=False,
+                bsub_binary=os.path.join(test_dir, "mock_bsub_array.sh"),
+                bjobs_binary=os.path.join(test_dir, "mock_bjobs.sh"),
+                poll_interval=0.05
+            )
+            cmd.log_dir = c.temp_dir
+
+            output = cmd.submit(c.echo_command, c.env, c.logger)
+            self.assertEqual(output.splitlines(), [' '.join(c.echo_command_args)])
+
+            # Jobs of a batch run concurrently and their outputs come back in order.
+            # Each job waits (up to 10 s) until bjobs has been called, so the first poll must see all of them running.
+            bjobs_log = os.path.join(c.temp_dir, "bjobs.log")
+            script = os.path.join(c.temp_dir, "job.sh")
+            with open(script, "w") as f:
+                f.write("n=0; while [ ! -f {log} ] && [ $n -lt 200 ]; do sleep 0.05; n=$((n+1)); done; "
+                        "echo job $1\n".format(log=bjobs_log))
+            env = dict(c.env, MOCK_BJOBS_LOG=bjobs_log)
+            outputs = cmd.submit_batch([["sh", script, str(i)] for i in range(3)], env, c.logger, cwd=c.temp_dir)
+            self.assertEqual([o.strip() for o in outputs], ["job 0", "job 1", "job 2"])
+            with open(bjobs_log, "r") as f:
+                polls = [[line.split()[1:] for line in poll.strip().splitlines()] for poll in f.read().split("---")[:-1]]
+            self.assertEqual(polls[0], [["1", "RUN"], ["2", "RUN"], ["3", "RUN"]])
+            self.assertEqual(polls[-1], [["1", "DONE", "-"], ["2", "DONE", "-"], ["3", "DONE", "-"]])
+
+            # Failed jobs still return their output.
+            outputs = cmd.submit_batch([["sh", "-c", "echo failed; exit 3"], ["pwd"]], c.env, c.logger,
+                                       cwd=c.temp_dir)
+            self.assertEqual(outputs[0].strip(), "failed")
+            self.assertEqual(os.path.realpath(outputs[1].strip()), os.path.realpath(c.temp_dir))
+
+            output = self.run_async(cmd.submit_async(c.echo_command, c.env, c.logger))
+            self.assertEqual(output.splitlines(), [' '.join(c.echo_command_args)])
+
 
 class HammerSignoffToolTestContext:
 
@@ -1507,6 +2447,243 @@ class HammerPowerStrapsTest(HasGetTech, unittest.TestCase):
                 else:
                     assert False, "Got the wrong layer_name: {}".format(layer_name)
 
+    def test_power_strap_geometry(self) -> None:
+        """ Tests the concrete power strap geometry against the generated power straps """
+        track_width = 8
+        straps_options = {
+            "vlsi.inputs.supplies": {
+                "power": [{"name": "VDD", "pin": "VDD"}, {"name": "VDD2", "pin": "VDD2"}],
+                "ground": [{"name": "VSS", "pin": "VSS"}],
+                "VDD": "1.00 V",
+                "GND": "0 V"
+            },
+            "par.power_straps_mode": "generate",
+            "par.generate_power_straps_method": "by_tracks",
+            "par.generate_power_straps_options.by_tracks": {
+                "strap_layers": ["M4", "M5", "M8"],
+                "pin_layers": ["M8"],
+                "track_width": track_width,
+                "track_spacing": 0,
+                "power_utilization": 0.2,
+                "power_utilization_M8": 1.0
+            }
+        }
+
+        with HammerPowerStrapsTestContext(self, straps_options) as c:
+            success, par_output = c.driver.run_par()
+            self.assertTrue(success)
+
+            par_tool = c.driver.par_tool
+            assert isinstance(par_tool, hammer_vlsi.HammerPlaceAndRouteTool)
+            stackup = par_tool.get_stackup()
+            entries = par_tool.parse_mock_power_straps_file()  # type: ignore
+            entries  # type: List[Dict[str, Any]]
+
+            # The groups should match the parameters handed to specify_power_straps
+            groups = par_tool.get_power_strap_groups()
+            strap_entries = [e for e in entries if e["layer_name"] != "M1"]
+            self.assertEqual(len(groups), len(strap_entries))
+            for group, entry in zip(groups, strap_entries):
+                metal = stackup.get_metal(group.layer)
+                self.assertEqual(group.layer, entry["layer_name"])
+                self.assertEqual(list(group.nets), entry["nets"])
+                self.assertEqual(metal.from_grid_units(group.pitch), Decimal(entry["pitch"]))
+                self.assertEqual(metal.from_grid_units(group.width), Decimal(entry["width"]))
+                self.assertEqual(metal.from_grid_units(group.spacing), Decimal(entry["spacing"]))
+                self.assertEqual(metal.from_grid_units(group.offset), Decimal(entry["offset"]))
+
+            bbox = [Decimal(0), Decimal(0), Decimal(200), Decimal(100)]
+            geometry = par_tool.get_power_strap_geometry(bbox)
+            # The geometry is cached
+            self.assertIs(geometry, par_tool.get_power_strap_geometry(bbox))
+            grid_bbox = tuple(to_grid_units(x, stackup.grid_unit) for x in bbox)
+
+            self.assertEqual(sorted(geometry.layers.keys()), ["M4", "M5", "M8"])
+            for layer_name, layer in geometry.layers.items():
+                self.assertEqual(sorted(layer.nets), ["VDD", "VDD2", "VSS"])
+                for net in layer.nets:
+                    rects = layer.rects(net)
+                    self.assertEqual(len(rects), 4 * layer.strap_count(net))
+                    for rect in layer.iter_rects(net):
+                        self.assertGreaterEqual(rect[0], grid_bbox[0])
+                        self.assertGreaterEqual(rect[1], grid_bbox[1])
+                        self.assertLessEqual(rect[2], grid_bbox[2])
+                        self.assertLessEqual(rect[3], grid_bbox[3])
+
+            # First VSS strap on M5 starts at the group offset and has the group width
+            m5 = geometry["M5"]
+            first_group = [g for g in groups if g.layer == "M5"][0]
+            first = next(m5.iter_rects("VSS"))
+            if m5.direction == hammer_tech.RoutingDirection.Vertical:
+                self.assertEqual((first[0], first[2]), (first_group.offset, first_group.offset + first_group.width))
+            else:
+                self.assertEqual((first[1], first[3]), (first_group.offset, first_group.offset + first_group.width))
+            # Each VSS/VDD pair consumes 2 * track_width tracks
+            self.assertEqual(m5.used_tracks, 2 * track_width * m5.strap_count("VSS"))
+            self.assertAlmostEqual(m5.track_utilization, m5.used_tracks / m5.total_tracks)
+            # The 100% utilization layer has (almost) no tracks left for signals
+            self.assertGreater(geometry["M8"].track_utilization, 0.9)
+            self.assertEqual(len(geometry.resource_report()), 3)
+
+            # Blockage interaction
+            hits = geometry.query(first)
+            self.assertIn(("M5", "VSS", first), hits)
+            self.assertEqual(geometry.query((grid_bbox[2], grid_bbox[3], grid_bbox[2] + 10, grid_bbox[3] + 10)), [])
+
+    def test_power_strap_sweep(self) -> None:
+        """ Tests sweeping power strap configurations against generating them one at a time """
+        straps_options = {
+            "vlsi.inputs.supplies": {
+                "power": [{"name": "VDD", "pin": "VDD"}],
+                "ground": [{"name": "VSS", "pin": "VSS"}],
+                "VDD": "1.00 V",
+                "GND": "0 V"
+            },
+            "par.power_straps_mode": "generate",
+            "par.generate_power_straps_method": "by_tracks",
+            "par.generate_power_straps_options.by_tracks": {
+                "strap_layers": ["M4", "M5", "M6", "M7", "M8"],
+                "pin_layers": ["M8"],
+                "track_width": 4,
+                "track_width_M8": 10,
+                "track_spacing": 0,
+                "power_utilization": 0.2,
+                "power_utilization_M8": 1.0
+            }
+        }  # type: Dict[str, Any]
+        configs = [
+            {},
+            {"track_width": 6},
+            {"power_utilization_M5": 0.5, "track_spacing_M6": 1},
+            {"strap_layers": ["M4", "M5"]},
+            # Illegal: M4 and M6 run in the same direction
+            {"strap_layers": ["M4", "M6"]},
+            # Illegal: utilization above 100%
+            {"power_utilization_M5": 1.5}
+        ]  # type: List[Dict[str, Any]]
+
+        with HammerPowerStrapsTestContext(self, straps_options) as c:
+            par_tool = c.driver.par_tool
+            assert isinstance(par_tool, hammer_vlsi.HammerPlaceAndRouteTool)
+            results = par_tool.sweep_power_straps(configs)
+            self.assertEqual(len(results), len(configs))
+
+            # Each valid configuration matches generating it on its own
+            for config, result in zip(configs[:4], results[:4]):
+                self.assertIsNone(result.error)
+                self.assertEqual(result.config, config)
+                by_tracks = dict(straps_options["par.generate_power_straps_options.by_tracks"])
+                by_tracks.update(config)
+                c.driver.update_project_configs(c.driver.project_configs + [{
+                    "par.generate_power_straps_options.by_tracks." + k: v for k, v in by_tracks.items()}])
+                self.assertEqual(result.groups, par_tool.get_power_strap_groups())
+                self.assertEqual([r.layer for r in result.rows], by_tracks["strap_layers"])
+                c.driver.update_project_configs(c.driver.project_configs[:-1])
+
+            default = {r.layer: r for r in results[0].rows}
+            self.assertAlmostEqual(default["M5"].track_utilization, 0.2)
+            self.assertEqual(default["M8"].track_utilization, 1.0)
+            self.assertEqual(default["M8"].track_pitch, 20)
+            self.assertGreater(default["M8"].utilization, 0.5)
+            wider = {r.layer: r for r in results[1].rows}
+            self.assertGreater(wider["M5"].width, default["M5"].width)
+            self.assertEqual(wider["M8"].width, default["M8"].width)
+            overridden = {r.layer: r for r in results[2].rows}
+            self.assertLess(overridden["M5"].pitch, default["M5"].pitch)
+            self.assertGreater(overridden["M6"].spacing, default["M6"].spacing)
+            self.assertEqual(overridden["M7"], default["M7"])
+
+            self.assertIsNotNone(results[4].error)
+            self.assertEqual(results[4].rows, [])
+            self.assertIn("Power utilization on M5", str(results[5].error))
+            self.assertEqual(results[5].rows, [])
+
+    def test_all_power_strap_start(self) -> None:
+        """ Checks that all-power straps with an odd spacing start on the grid """
+        grid = hammer_tech.MetalGrid(name="M8", min_width=100, pitch=200, offset=5, widths_and_spacings=((0, 101),))
+        pitch, width, spacing, offset = hammer_vlsi.by_tracks_strap_dimensions(grid, 4, 2, 0, 1, 1000, True)
+        self.assertEqual((pitch, width, spacing), (800, 299, 101))
+        # Half of the spacing (50.5) is rounded down to 50.
+        self.assertEqual(offset, 1000 + 200 + 50 + 5)
+
+    def test_ir_drop_estimate_analytic(self) -> None:
+        """ Checks the IR drop estimate against a hand-calculated mesh """
+        # One horizontal strap on M2 fed by one vertical strap on M3 through a via, in a 100x100um box
+        m2 = hammer_tech.MetalGrid(name="M2", min_width=100, pitch=200, offset=0, widths_and_spacings=((0, 100),))
+        m3 = hammer_tech.MetalGrid(name="M3", min_width=100, pitch=200, offset=0, widths_and_spacings=((0, 100),))
+        groups = (
+            hammer_vlsi.PowerStrapGroup(grid=m2, direction=hammer_tech.RoutingDirection.Horizontal, pitch=200000,
+                                        width=2000, spacing=1000, offset=29000, nets=("VDD",)),
+            hammer_vlsi.PowerStrapGroup(grid=m3, direction=hammer_tech.RoutingDirection.Vertical, pitch=200000,
+                                        width=4000, spacing=1000, offset=20000, nets=("VDD",))
+        )
+        geometry = hammer_vlsi.compute_power_strap_geometry(groups, (0, 0, 100000, 100000))
+        result = hammer_vlsi.estimate_ir_drop(geometry, "VDD", Decimal("0.001"), {"M2": 0.1, "M3": 0.05},
+                                              via_resistance=2.0, current_density=10.0)
+        # All of the current is drawn at the via, 30um from the bottom of the M3 strap
+        current = 10.0 * 100 * 100 * 1e-6
+        bottom = 0.05 * 30 / 4
+        top = 0.05 * 70 / 4
+        expected = current * (2.0 + bottom * top / (bottom + top))
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.total_current, current)
+        self.assertAlmostEqual(result.worst_drop, expected)
+        self.assertEqual(result.worst_location, (22.0, 30.0))
+        self.assertAlmostEqual(result.layer_drops["M2"], expected)
+        self.assertAlmostEqual(result.layer_drops["M3"], current * bottom * top / (bottom + top))
+        self.assertEqual(result.unconnected_current, 0.0)
+
+        # Extra current in a region adds to the drop linearly
+        region = hammer_vlsi.CurrentRegion(x=0, y=0, width=50, height=100, current_density=10.0)
+        hot = hammer_vlsi.estimate_ir_drop(geometry, "VDD", Decimal("0.001"), {"M2": 0.1, "M3": 0.05},
+                                           via_resistance=2.0, current_density=10.0, regions=[region])
+        self.assertAlmostEqual(hot.worst_drop, expected * 1.5)
+
+        with self.assertRaises(ValueError):
+            hammer_vlsi.estimate_ir_drop(geometry, "VDD", Decimal("0.001"), {"M2": 0.1},
+                                         via_resistance=2.0, current_density=10.0)
+
+    def test_ir_drop_estimate(self) -> None:
+        """ Tests the IR drop estimate of generated power straps """
+        straps_options = {
+            "vlsi.inputs.supplies": {
+                "power": [{"name": "VDD", "pin": "VDD"}],
+                "ground": [{"name": "VSS", "pin": "VSS"}],
+                "VDD": "1.00 V",
+                "GND": "0 V"
+            },
+            "par.power_straps_mode": "generate",
+            "par.generate_power_straps_method": "by_tracks",
+            "par.generate_power_straps_options.by_tracks": {
+                "strap_layers": ["M4", "M5", "M6"],
+                "pin_layers": ["M6"],
+                "track_width": 4,
+                "track_spacing": 0,
+                "power_utilization": 0.2
+            }
+        }
+
+        with HammerPowerStrapsTestContext(self, straps_options) as c:
+            par_tool = c.driver.par_tool
+            assert isinstance(par_tool, hammer_vlsi.HammerPlaceAndRouteTool)
+            bbox = [Decimal(0), Decimal(0), Decimal(100), Decimal(100)]
+            results = par_tool.estimate_ir_drop(bbox)
+            self.assertEqual(list(results.keys()), ["VSS", "VDD"])
+            for net, result in results.items():
+                self.assertTrue(result.converged)
+                self.assertAlmostEqual(result.total_current, 0.5 * 100 * 100 * 1e-6)
+                self.assertGreater(result.worst_drop, 0.0)
+                self.assertGreaterEqual(result.worst_drop, result.average_drop)
+                self.assertEqual(set(result.layer_drops.keys()), {"M4", "M5", "M6"})
+                # The drop grows from the pins at the top down to the loads at the bottom
+                self.assertLessEqual(result.layer_drops["M6"], result.layer_drops["M5"])
+                self.assertLessEqual(result.layer_drops["M5"], result.layer_drops["M4"])
+
+            # Doubling the current doubles the drop
+            c.driver.update_project_configs(c.driver.project_configs + [{"par.ir_drop_estimate.current_density": 1.0}])
+            doubled = par_tool.estimate_ir_drop(bbox)
+            self.assertAlmostEqual(doubled["VDD"].worst_drop, 2 * results["VDD"].worst_drop)
+
 
 
 if __name__ == '__main__':
@@ -149,5 +149,44 @@ class TemperatureValueTest(unittest.TestCase):
         self.assertEqual(t25.str_value_in_units("C"), "25 C")
 
 
+class ValueWithUnitArrayTest(unittest.TestCase):
+    def test_time_array(self) -> None:
+        """
+        Test that arrays parse and emit values like the scalar classes.
+        """
+        strings = ["1000 ns", "250 ps", "0.5", "-12 ps", "3 us"]
+        arr = hammer_vlsi.units.TimeValueArray(strings)
+        self.assertEqual(len(arr), 5)
+        self.assertEqual(arr.values_in_units("ns"),
+                         [hammer_vlsi.units.TimeValue(s).value_in_units("ns") for s in strings])
+        self.assertEqual(arr.str_values_in_units("ps"),
+                         [hammer_vlsi.units.TimeValue(s).str_value_in_units("ps") for s in strings])
+        self.assertAlmostEqual(arr.values[1], 250e-12)
+        self.assertEqual(arr[2], hammer_vlsi.units.TimeValue("500 ps"))
+        self.assertEqual(list(arr)[4], hammer_vlsi.units.TimeValue("3000 ns"))
+
+        # Default prefix can be overridden like the scalar classes.
+        self.assertEqual(hammer_vlsi.units.TimeValueArray(["42"], "m").values_in_units("ms"), [42])
+
+    def test_from_values(self) -> None:
+        """
+        Test that arrays can be built from scalar values of the same type.
+        """
+        volts = [hammer_vlsi.units.VoltageValue("900 mV"), hammer_vlsi.units.VoltageValue("1.1 V")]
+        arr = hammer_vlsi.units.VoltageValueArray.from_values(volts)
+        self.assertEqual(arr.str_values_in_units("mV"), ["900 mV", "1100 mV"])
+        with self.assertRaises(TypeError):
+            hammer_vlsi.units.TimeValueArray.from_values(volts)
+
+    def test_errors(self) -> None:
+        """
+        Test that malformed values in arrays get caught.
+        """
+        with self.assertRaises(ValueError):
+            hammer_vlsi.units.TimeValueArray(["1 ns", "1.1.1.1 ps"])
+        with self.assertRaises(ValueError):
+            hammer_vlsi.units.TemperatureValueArray(["25 C", "12 noobs"])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -9,7 +9,8 @@ from typing import Dict, Tuple, List, Optional, Union
 from decimal import Decimal
 
 from hammer_utils import (topological_sort, get_or_else, optional_map, assert_function_type,
-                          gcd, lcm, lcm_grid, coerce_to_grid, check_on_grid)
+                          gcd, lcm, lcm_grid, coerce_to_grid, check_on_grid,
+                          to_grid_units, from_grid_units)
 
 import unittest
 
@@ -57,6 +58,19 @@ class UtilsTest(unittest.TestCase):
         self.assertEqual(coerce_to_grid(1.227, Decimal("0.01")), Decimal("1.23"))
         self.assertEqual(coerce_to_grid(200, Decimal("10")), Decimal("200"))
         self.assertEqual(coerce_to_grid(1.0/3.0, Decimal("0.001")), Decimal("0.333"))
+        self.assertEqual(coerce_to_grid(Decimal("1.2345"), Decimal("0.001")), Decimal("1.234"))
+        self.assertEqual(coerce_to_grid("0.09", Decimal("0.001")), Decimal("0.090"))
+
+    def test_grid_units(self) -> None:
+        self.assertEqual(to_grid_units(Decimal("0.09"), Decimal("0.001")), 90)
+        self.assertEqual(to_grid_units("1.23", Decimal("0.01")), 123)
+        self.assertEqual(to_grid_units(0.09, Decimal("0.001")), 90)
+        self.assertEqual(to_grid_units(200, Decimal("10")), 20)
+        self.assertEqual(from_grid_units(90, Decimal("0.001")), Decimal("0.09"))
+        self.assertEqual(from_grid_units(-7, Decimal("0.005")), Decimal("-0.035"))
+        # Round trips are exact.
+        for units in range(0, 100000, 997):
+            self.assertEqual(to_grid_units(from_grid_units(units, Decimal("0.001")), Decimal("0.001")), units)
 
     def test_check_on_grid(self) -> None:
         self.assertTrue(check_on_grid(Decimal("1.23"), Decimal("0.01")))
@@ -564,11 +564,20 @@ class HammerDatabase:
 
         self.__config_cache = {}  # type: dict
         self.__config_cache_dirty = False  # type: bool
+        self.__version = 0  # type: int
 
     @property
     def runtime(self) -> List[dict]:
         return [self._runtime]
 
+    @property
+    def version(self) -> int:
+        """
+        Version of this database, which changes whenever a setting or config is changed.
+        Use this to cache values derived from settings.
+        """
+        return self.__version
+
     @staticmethod
     def internal_keys() -> Set[str]:
         """Internal keys that shouldn't show up in any final config."""
@@ -625,6 +634,7 @@ class HammerDatabase:
         """
         self._runtime[key] = value
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def has_setting(self, key: str) -> bool:
         """
@@ -641,6 +651,7 @@ class HammerDatabase:
         """
         self.core = core_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def update_tools(self, tools_config: List[dict]) -> None:
         """
@@ -648,6 +659,7 @@ class HammerDatabase:
         """
         self.tools = tools_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def update_technology(self, technology_config: List[dict]) -> None:
         """
@@ -655,6 +667,7 @@ class HammerDatabase:
         """
         self.technology = technology_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def update_environment(self, environment_config: List[dict]) -> None:
         """
@@ -662,6 +675,7 @@ class HammerDatabase:
         """
         self.environment = environment_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def update_project(self, project_config: List[dict]) -> None:
         """
@@ -669,6 +683,7 @@ class HammerDatabase:
         """
         self.project = project_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
     def update_builtins(self, builtins_config: List[dict]) -> None:
         """
@@ -676,6 +691,7 @@ class HammerDatabase:
         """
         self.builtins = builtins_config
         self.__config_cache_dirty = True
+        self.__version += 1
 
 
 def load_config_from_string(contents: str, is_yaml: bool, path: str = "unspecified") -> dict:
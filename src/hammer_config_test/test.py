@@ -70,6 +70,23 @@ a.b.c_meta: append
         db.update_environment([])
         self.assertEqual(db.get_setting("a.b.c"), ["test"])
 
+    def test_version(self) -> None:
+        """
+        Test that the database version changes whenever the database does.
+        """
+        db = hammer_config.HammerDatabase()
+        versions = [db.version]
+        db.update_core([{"a": 1}])
+        versions.append(db.version)
+        db.update_project([{"a": 2}])
+        versions.append(db.version)
+        db.set_setting("a", 3)
+        versions.append(db.version)
+        self.assertEqual(len(set(versions)), len(versions))
+        # Reading settings does not change the version.
+        self.assertEqual(db.get_setting("a"), 3)
+        self.assertEqual(db.version, versions[-1])
+
     def test_meta_json2list(self) -> None:
         """
         Test that the meta attribute "json2list" works.
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  grid_benchmark.py
+#  Benchmark the integer grid-unit stackup calculations against the old Decimal implementation.
+#  Run with the usual hammer environment (see sourceme.sh).
+#
+#  See LICENSE for licence details.
+
+import argparse
+import sys
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from hammer_tech import Metal
+
+
+def create_metal(index: int) -> Dict[str, Any]:
+    """
+    Create a metal layer dict like the ones in the tech JSON (same as the test stackups in tech_test.py).
+    """
+    min_width = 0.05 * (1 if (index < 3) else (2 if (index < 5) else 5))
+    pitch = (min_width * 9) / 5
+    return {
+        "name": "M{}".format(index),
+        "index": index,
+        "direction": "vertical" if (index % 2 == 1) else "horizontal",
+        "min_width": min_width,
+        "pitch": pitch,
+        "offset": 0.04,
+        "power_strap_widths_and_spacings": [{"width_at_least": x * min_width * 3,
+                                             "min_spacing": (x + 1) * (pitch - min_width)} for x in range(5)]
+    }
+
+
+def decimal_twwt(m: Metal, tracks: int, force_even: bool = False) -> Tuple[Decimal, Decimal, Decimal]:
+    """
+    Reference Decimal implementation of Metal.get_width_spacing_start_twwt (before the integer grid engine).
+    """
+    widths_and_spacings = m.power_strap_widths_and_spacings
+    spacing = widths_and_spacings[0].min_spacing
+    s3w2 = ((2 * tracks) + 1) * m.pitch - m.min_width
+    width = (s3w2 - spacing * 3) / 2
+    for first, second in zip(widths_and_spacings[:-1], widths_and_spacings[1:]):
+        if s3w2 >= second.min_spacing * 3 + second.width_at_least * 2:
+            spacing = second.min_spacing
+            width = (s3w2 - spacing * 3) / 2
+        elif s3w2 >= first.min_spacing * 3 + second.width_at_least * 2:
+            width = second.width_at_least - (m.grid_unit * 1)
+            spacing = (s3w2 - width * 2) / 3
+    start = m.min_width / 2 + spacing
+    if force_even and int(width / m.grid_unit) % 2 == 1:
+        width = width - m.grid_unit
+        start = start + m.grid_unit
+    return (width, spacing, start)
+
+
+def time_sweep(name: str, sweep: Callable[[], List[Any]], runs: int) -> float:
+    """
+    Time the given sweep and print the best time of the given number of runs.
+
+    :return: Best time in seconds.
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        sweep()
+        best = min(best, time.perf_counter() - start)
+    print("{name:<40} {time:8.2f} ms".format(name=name, time=best * 1000))
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark integer grid-unit strap calculations against Decimal.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs (default: 5)")
+    parser.add_argument("--tracks", type=int, default=200, help="Number of track counts to sweep per layer (default: 200)")
+    args = parser.parse_args()
+
+    grid_unit = Decimal("0.001")
+    metals = [Metal.from_setting(grid_unit, create_metal(i)) for i in range(1, 8)]
+    track_range = range(1, args.tracks + 1)
+
+    # Check that the engines agree wherever the Decimal result was on-grid.
+    mismatches = 0
+    for m in metals:
+        for tracks in track_range:
+            reference = decimal_twwt(m, tracks, force_even=True)
+            if all(x % grid_unit == 0 for x in reference) and reference != m.get_width_spacing_start_twwt(tracks, force_even=True):
+                mismatches += 1
+    if mismatches > 0:
+        print("WARNING: {n} on-grid results differ from the Decimal implementation".format(n=mismatches), file=sys.stderr)
+
+    grids = [m.grid for m in metals]
+    decimal_time = time_sweep("Decimal (reference)", lambda: [decimal_twwt(m, t, True) for m in metals for t in track_range], args.runs)
+    metal_time = time_sweep("Metal (Decimal API, grid engine)", lambda: [m.get_width_spacing_start_twwt(t, True) for m in metals for t in track_range], args.runs)
+    grid_time = time_sweep("MetalGrid (integer grid units)", lambda: [g.get_width_spacing_start_twwt(t, True) for g in grids for t in track_range], args.runs)
+    print("{name:<40} {speedup:8.1f}x".format(name="MetalGrid speedup over Decimal", speedup=decimal_time / grid_time))
+    print("{name:<40} {speedup:8.1f}x".format(name="Metal speedup over Decimal", speedup=decimal_time / metal_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
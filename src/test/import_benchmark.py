@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  import_benchmark.py
+#  Benchmark the time taken by "import hammer_vlsi".
+#  Run with the usual hammer environment (see sourceme.sh).
+#
+#  See LICENSE for licence details.
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+
+def time_command(code: str, runs: int) -> List[float]:
+    """
+    Time running the given Python code in a fresh interpreter.
+
+    :param code: Python code to run.
+    :param runs: Number of runs.
+    :return: List of wall-clock times in seconds, one per run.
+    """
+    times = []  # type: List[float]
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", code])
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of hammer_vlsi.")
+    parser.add_argument("--runs", type=int, default=20, help="Number of runs (default: 20)")
+    args = parser.parse_args()
+
+    interpreter = time_command("pass", args.runs)
+    hammer_vlsi = time_command("import hammer_vlsi", args.runs)
+    hammer_tech = time_command("import hammer_tech", args.runs)
+
+    def report(name: str, times: List[float]) -> None:
+        print("{name:<32} median {median:8.1f} ms  min {min:8.1f} ms".format(
+            name=name, median=statistics.median(times) * 1000, min=min(times) * 1000))
+
+    report("python (interpreter only)", interpreter)
+    report("import hammer_vlsi", hammer_vlsi)
+    report("import hammer_tech", hammer_tech)
+    print("{name:<32} median {median:8.1f} ms".format(
+        name="hammer_vlsi import overhead",
+        median=(statistics.median(hammer_vlsi) - statistics.median(interpreter)) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Mock of bjobs -a -noheader -o "jobid jobindex stat exit_code" <jobid>
+# for jobs submitted with mock_bsub_array.sh.
+
+JOBID="${@: -1}"
+STATE="${TMPDIR:-/tmp}/hammer-mock-lsf-$(id -u)/$JOBID"
+if [ ! -d "$STATE" ]; then
+    echo "Job <$JOBID> is not found"
+    exit 255
+fi
+OUTPUT=$(for f in "$STATE"/*; do echo "$JOBID $(basename "$f") $(cat "$f")"; done)
+# Optionally log every call, for tests.
+if [ -n "$MOCK_BJOBS_LOG" ]; then
+    printf '%s\n---\n' "$OUTPUT" >> "$MOCK_BJOBS_LOG"
+fi
+echo "$OUTPUT"
@@ -0,0 +1,54 @@
+#!/bin/bash
+# Mock of a non-blocking bsub which submits job arrays (-J "name[1-N]").
+# Each element runs in the background with LSB_JOBINDEX set. Its state is kept
+# for mock_bjobs.sh, and its output is written to the -o file (with %I replaced
+# by the index) once it finishes, like LSF does.
+
+POSITIONAL=()
+while [[ $# -gt 0 ]]
+do
+key="$1"
+case $key in
+    -J)
+    NAME="$2"
+    shift
+    shift
+    ;;
+    -o)
+    OUTPUT="$2"
+    shift
+    shift
+    ;;
+    -q|-n|-R)
+    shift
+    shift
+    ;;
+    -K)
+    echo "mock_bsub_array.sh does not support -K"
+    exit 1
+    ;;
+    *)
+    POSITIONAL+=("$1")
+    shift
+    ;;
+esac
+done
+
+JOBID=$$
+COUNT=1
+if [[ "$NAME" =~ \[1-([0-9]+)\]$ ]]; then COUNT="${BASH_REMATCH[1]}"; fi
+STATE="${TMPDIR:-/tmp}/hammer-mock-lsf-$(id -u)/$JOBID"
+mkdir -p "$STATE"
+
+for ((i = 1; i <= COUNT; i++)); do
+    LOG="${OUTPUT//%I/$i}"
+    echo "RUN" > "$STATE/$i"
+    (
+        LSB_JOBINDEX=$i sh -c "${POSITIONAL[*]}" > "$LOG.running" 2>&1
+        CODE=$?
+        mv "$LOG.running" "$LOG"
+        if [ $CODE -eq 0 ]; then echo "DONE -" > "$STATE/$i"; else echo "EXIT $CODE" > "$STATE/$i"; fi
+    ) < /dev/null > /dev/null 2>&1 &
+done
+
+echo "Job <$JOBID> is submitted to default queue <normal>."
@@ -0,0 +1,55 @@
+#!/bin/bash
+# Mock of qsub -sync y -b y which runs the command locally, writes its output
+# to the -o file and prints the resource options it was given.
+
+POSITIONAL=()
+while [[ $# -gt 0 ]]
+do
+key="$1"
+case $key in
+    -sync|-b|-j|-N)
+    shift
+    shift
+    ;;
+    -cwd|-V)
+    shift
+    ;;
+    -o)
+    OUTPUT="$2"
+    shift
+    shift
+    ;;
+    -q)
+    QUEUE="$2"
+    shift
+    shift
+    ;;
+    -pe)
+    PE="$2 $3"
+    shift
+    shift
+    shift
+    ;;
+    -l)
+    RESOURCE="$2"
+    shift
+    shift
+    ;;
+    *)
+    POSITIONAL+=("$@")
+    break
+    ;;
+esac
+done
+
+echo "Your job $$ (\"${POSITIONAL[0]}\") has been submitted"
+{
+    if [ ! -z "$QUEUE" ]; then echo "QUEUE is: $QUEUE"; fi
+    if [ ! -z "$PE" ]; then echo "PE is: $PE"; fi
+    if [ ! -z "$RESOURCE" ]; then echo "RESOURCE is: $RESOURCE"; fi
+    echo "COMMAND is: ${POSITIONAL[@]}"
+    "${POSITIONAL[@]}"
+} > "$OUTPUT" 2>&1
+CODE=$?
+echo "Job $$ exited with exit code $CODE."
+exit $CODE
@@ -0,0 +1,32 @@
+#!/bin/bash
+# Mock of sbatch --parsable --wrap=... which runs the job locally in the background.
+# Its state is kept for mock_squeue.sh and its output goes to the --output file.
+
+while [[ $# -gt 0 ]]
+do
+key="$1"
+case $key in
+    --output=*)
+    OUTPUT="${key#*=}"
+    ;;
+    --chdir=*)
+    CHDIR="${key#*=}"
+    ;;
+    --wrap=*)
+    WRAP="${key#*=}"
+    ;;
+esac
+shift
+done
+
+JOBID=$$
+STATE="${TMPDIR:-/tmp}/hammer-mock-slurm-$(id -u)"
+mkdir -p "$STATE"
+echo "RUNNING" > "$STATE/$JOBID"
+(
+    if [ ! -z "$CHDIR" ]; then cd "$CHDIR"; fi
+    sh -c "$WRAP" > "$OUTPUT" 2>&1
+    if [ $? -eq 0 ]; then echo "COMPLETED" > "$STATE/$JOBID"; else echo "FAILED" > "$STATE/$JOBID"; fi
+) < /dev/null > /dev/null 2>&1 &
+
+echo "$JOBID"
@@ -0,0 +1,14 @@
+#!/bin/bash
+# Mock of squeue --noheader --format="%i %T" --jobs=<ids> for jobs submitted with mock_sbatch.sh.
+
+STATE="${TMPDIR:-/tmp}/hammer-mock-slurm-$(id -u)"
+for arg in "$@"; do
+    case $arg in
+        --jobs=*)
+        JOBS="${arg#*=}"
+        ;;
+    esac
+done
+for job in ${JOBS//,/ }; do
+    if [ -f "$STATE/$job" ]; then echo "$job $(cat "$STATE/$job")"; fi
+done
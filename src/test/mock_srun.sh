@@ -0,0 +1,37 @@
+#!/bin/bash
+# Mock of srun which prints the options it was given and runs the command locally.
+
+POSITIONAL=()
+while [[ $# -gt 0 ]]
+do
+key="$1"
+case $key in
+    --partition=*)
+    PARTITION="${key#*=}"
+    shift
+    ;;
+    --cpus-per-task=*)
+    NUMCPU="${key#*=}"
+    shift
+    ;;
+    --mem=*)
+    MEMORY="${key#*=}"
+    shift
+    ;;
+    --*)
+    EXTRA+=("$1")
+    shift
+    ;;
+    *)
+    POSITIONAL+=("$@")
+    break
+    ;;
+esac
+done
+
+if [ ! -z "$PARTITION" ]; then echo "PARTITION is: $PARTITION"; fi
+if [ ! -z "$NUMCPU" ]; then echo "NUMCPU is: $NUMCPU"; fi
+if [ ! -z "$MEMORY" ]; then echo "MEMORY is: $MEMORY"; fi
+if [ ! -z "$EXTRA" ]; then echo "EXTRA is: ${EXTRA[@]}"; fi
+echo "COMMAND is: ${POSITIONAL[@]}"
+exec "${POSITIONAL[@]}"
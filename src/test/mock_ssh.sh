@@ -0,0 +1,30 @@
+#!/bin/bash
+# Stand-in for ssh which runs the remote command on this host, in a clean
+# environment like a fresh login, with MOCK_SSH_HOST set to the host name.
+# Hosts whose name starts with "down" are unreachable.
+
+while [[ $# -gt 0 ]]
+do
+key="$1"
+case $key in
+    -o|-p|-i|-l|-F)
+    shift
+    shift
+    ;;
+    -*)
+    shift
+    ;;
+    *)
+    break
+    ;;
+esac
+done
+
+HOST="$1"
+shift
+if [[ "$HOST" == down* ]]; then
+    echo "ssh: connect to host $HOST port 22: Connection refused" >&2
+    exit 255
+fi
+cd "$HOME" 2> /dev/null || cd /
+exec env -i PATH="${PATH:-/usr/bin:/bin}" HOME="$HOME" MOCK_SSH_HOST="$HOST" sh -c "$*"